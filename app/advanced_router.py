@@ -6,21 +6,56 @@ strategy for a given query or task.
 import asyncio
 import logging
 import time
-from collections import defaultdict
-from typing import Any, Dict, List, Optional
-
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+import numpy as np
+
+from app.python.helpers.answer_scorer import score_answer
+from app.python.helpers.circuit_breaker import CircuitBreakerRegistry
+from app.python.helpers.history_window import HistoryWindow
+from app.python.helpers.response_cache import ResponseCache
+from app.python.helpers.semantic_cache import SemanticCache, SemanticLookup
+from app.python.helpers.single_flight import SingleFlight, coalesce_key
+from app.python.helpers.keyword_classifier import load_keyword_classifier
+from app.python.helpers.llm_scheduler import llm_call_context
+from app.python.helpers.learned_router import (
+    LearnedRouter,
+    RouteLogWriter,
+    featurize_many,
+)
+from app.python.helpers.model_rate_limits import admit
+from app.python.helpers.performance_tracker import PerformanceTracker
+from app.python.helpers.query_features import (
+    QueryFeatureCache,
+    QueryFeatures,
+    feature_cache,
+)
 from app.python.helpers.rag_system import RAGSystem
-from app.python.helpers.rate_limiter import RateLimiter
-from app.python.helpers.model_utils import get_model_list, get_chat_model
+from app.python.helpers.token_estimate import (
+    chars_to_tokens,
+    count_output_tokens,
+    estimate_tokens,
+)
+from app.python.helpers.rate_limiter import create_rate_limiter
+from app.models import (
+    get_model_list,
+    get_chat_model,
+    get_embedding_model,
+    get_equivalent_models,
+    get_llm_scheduler,
+    get_model_rate_limiters,
+    get_provider,
+)
 from app.python.helpers.redis_cache import RedisCache
 
-nltk.download("punkt")
-nltk.download("stopwords")
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -28,21 +63,21 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-
-class PerformanceTracker:
-    def __init__(self):
-        self.performance_factors: Dict[str, float] = {
-            "low": 1.0,
-            "mid": 1.0,
-            "high": 1.0,
-        }
-
-    def get_performance_factors(self) -> Dict[str, float]:
-        return self.performance_factors
-
-    def update_performance(self, tier: str, processing_time: float) -> None:
-        # Implement logic to update performance factors based on processing time
-        pass
+# Conversations longer than this (in characters) always go to the high tier
+HIGH_TIER_CONTEXT_LENGTH = 4000
+ROUTING_TIERS = ("low", "mid", "high")
+# (tier, reason) pairs in the order _select_model_config checks them,
+# followed by the learned router's picks
+SELECTION_REASONS = (
+    ("high", "complexity"),
+    ("high", "context_length"),
+    ("mid", "default"),
+    ("low", "mid_tier_degraded"),
+    ("low", "learned"),
+    ("mid", "learned"),
+    ("high", "learned"),
+)
+LEARNED_REASON_OFFSET = 4
 
 
 class AdvancedRouter:
@@ -54,7 +89,9 @@ class AdvancedRouter:
     ):
         self.models = get_model_list()
         self.threshold = config.get("ROUTER_THRESHOLD", 0.7)
-        self.rate_limiter = RateLimiter(
+        self.rate_limiter = create_rate_limiter(
+            config,
+            "router",
             max_calls=config.get("rate_limit_requests", 120),
             max_input_tokens=config.get("rate_limit_input_tokens", 200000),
             max_output_tokens=config.get("rate_limit_output_tokens", 200000),
@@ -68,18 +105,64 @@ class AdvancedRouter:
             "superior": "claude-3-opus-20240229",
         }
         self.rag_system = rag_system or RAGSystem()
-        self.model_performance: Dict[str, Dict[str, float]] = defaultdict(
-            lambda: {"total_time": 0.0, "count": 0, "avg_time": 0.0}
+        self.performance_tracker = PerformanceTracker(
+            alpha=config.get("performance_ewma_alpha", 0.2),
+            min_samples=config.get("performance_min_samples", 5),
+        )
+        self.hedging_enabled = config.get("router_hedging_enabled", False)
+        self.hedge_margin = config.get("router_hedge_margin", 0.1)
+        self.hedge_percentile = config.get("router_hedge_percentile", 0.95)
+        self.hedge_default_delay = config.get("router_hedge_delay", 2.0)
+        self.cascade_enabled = config.get("router_cascade_enabled", False)
+        self.cascade_threshold = config.get("router_cascade_threshold", 0.6)
+        self.history_window = HistoryWindow.from_config(config)
+        self.response_cache = ResponseCache.from_config(config)
+        self.single_flight = SingleFlight("router")
+        self.circuit_breakers = CircuitBreakerRegistry.from_config(config)
+        self.model_rate_limiters = get_model_rate_limiters()
+        self.llm_scheduler = get_llm_scheduler()
+        self.min_model_headroom = config.get("router_min_model_headroom", 0.0)
+        self.semantic_cache = (
+            SemanticCache(
+                get_embedding_model(
+                    config.get(
+                        "semantic_cache_embedding_model",
+                        "text-embedding-ada-002",
+                    )
+                ).embed_query,
+                threshold=config.get("semantic_cache_threshold", 0.95),
+                ttl=config.get("semantic_cache_ttl", 3600),
+                max_entries=config.get("semantic_cache_max_entries", 10000),
+            )
+            if config.get("semantic_cache_enabled", False)
+            else None
+        )
+        model_file = config.get("router_model_file")
+        self.learned_router = (
+            LearnedRouter.load(model_file) if model_file else None
+        )
+        self.learned_min_confidence = config.get(
+            "router_model_min_confidence", 0.5
+        )
+        log_file = config.get("router_log_file")
+        self.route_log = RouteLogWriter(log_file) if log_file else None
+        keywords_file = config.get("router_keywords_file")
+        self.feature_cache = (
+            QueryFeatureCache(
+                classifier=load_keyword_classifier(keywords_file)
+            )
+            if keywords_file
+            else feature_cache
         )
-        self.performance_tracker = PerformanceTracker()
 
     async def route(
         self, query: str, conversation_history: List[Dict[str, str]]
     ) -> Dict[str, Any]:
-        complexity = self._assess_complexity(query)
+        features = self.feature_cache.get(query)
+        complexity = features.complexity
         context_length = self._calculate_context_length(conversation_history)
-        task_type = self._identify_task_type(query)
-        question_type = self._classify_question(query)
+        task_type = features.task_type
+        question_type = features.question_type
 
         logger.info(f"Query: {query}")
         logger.info(f"Complexity: {complexity}")
@@ -88,7 +171,7 @@ class AdvancedRouter:
         logger.info(f"Question type: {question_type}")
 
         config = self._select_model_config(
-            complexity, context_length, task_type
+            complexity, context_length, task_type, features
         )
 
         config["routing_explanation"] = (
@@ -111,40 +194,268 @@ class AdvancedRouter:
 
         return config
 
-    def _assess_complexity(self, query: str) -> float:
-        # Tokenize the query
-        tokens = word_tokenize(query.lower())
+    def route_many(
+        self,
+        queries: Sequence[str],
+        histories: Optional[Sequence[List[Dict[str, str]]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Route a batch of queries at once.
+
+        Returns the same configs route() would produce for each
+        (query, history) pair, in order, plus a histogram of selected tiers.
+        Features are extracted once per distinct query and scoring, tier
+        selection and history adjustments run on NumPy arrays.
+        """
+        count = len(queries)
+        if histories is None:
+            histories = [[]] * count
+        elif len(histories) != count:
+            raise ValueError(
+                f"Got {count} queries but {len(histories)} histories"
+            )
+        if count == 0:
+            return {
+                "configs": [],
+                "tier_histogram": dict.fromkeys(ROUTING_TIERS, 0),
+            }
 
-        # Remove stopwords
-        stop_words = set(stopwords.words("english"))
-        tokens = [word for word in tokens if word not in stop_words]
+        unique_queries: Dict[str, int] = {}
+        inverse = np.fromiter(
+            (
+                unique_queries.setdefault(q, len(unique_queries))
+                for q in queries
+            ),
+            dtype=np.intp,
+            count=count,
+        )
+        features = [self.feature_cache.get(q) for q in unique_queries]
+
+        token_count = np.array([f.token_count for f in features], float)
+        lexical_diversity = np.array([f.lexical_diversity for f in features])
+        avg_word_length = np.array([f.avg_word_length for f in features])
+        special_chars = np.array([f.special_char_density for f in features])
+        numbers = np.array([f.number_density for f in features])
+        # Same operation order as QueryFeatures.complexity, so the scores
+        # are bit-for-bit identical to route()
+        unique_complexity = np.minimum(
+            (token_count / 100) * 0.3
+            + lexical_diversity * 0.3
+            + (avg_word_length / 10) * 0.2
+            + special_chars * 0.1
+            + numbers * 0.1,
+            1.0,
+        )
+        complexity = unique_complexity[inverse]
 
-        # Calculate lexical diversity
-        lexical_diversity = len(set(tokens)) / len(tokens) if tokens else 0
+        (
+            context_length,
+            history_length,
+            asks_explanation,
+            short_exchange,
+        ) = self._history_arrays(histories)
 
-        # Calculate average word length
-        avg_word_length = (
-            sum(len(word) for word in tokens) / len(tokens) if tokens else 0
+        performance_factor = self.performance_tracker.get_performance_factors()
+        mid_healthy = performance_factor.get("mid", 1.0) <= 1.2
+        reasons = np.select(
+            [
+                complexity >= self.threshold,
+                context_length >= HIGH_TIER_CONTEXT_LENGTH,
+            ],
+            [0, 1],
+            default=2 if mid_healthy else 3,
         )
+        if self.learned_router is not None:
+            rows = featurize_many(
+                [features[i] for i in inverse.tolist()],
+                context_length.tolist(),
+            )
+            proba = self.learned_router.predict_proba(rows)
+            tier_ranks = np.array(
+                [ROUTING_TIERS.index(t) for t in self.learned_router.tiers]
+            )
+            learned = (proba.max(axis=1) >= self.learned_min_confidence) & (
+                context_length < HIGH_TIER_CONTEXT_LENGTH
+            )
+            reasons = np.where(
+                learned,
+                LEARNED_REASON_OFFSET + tier_ranks[proba.argmax(axis=1)],
+                reasons,
+            )
+        tier_index = np.array(
+            [ROUTING_TIERS.index(tier) for tier, _ in SELECTION_REASONS]
+        )[reasons]
+        reason_counts = np.bincount(reasons, minlength=len(SELECTION_REASONS))
+        for (tier, reason), reason_count in zip(
+            SELECTION_REASONS, reason_counts.tolist()
+        ):
+            if reason_count:
+                self.performance_tracker.record_selection(
+                    tier, reason, performance_factor, reason_count
+                )
+
+        tier_builders = {
+            "low": self._get_low_tier_config,
+            "mid": self._get_mid_tier_config,
+            "high": self._get_high_tier_config,
+        }
+        task_types = [f.task_type for f in features]
+        templates: Dict[tuple, Dict[str, Any]] = {}
+        base_temperature = np.empty(count)
+        base_max_tokens = np.empty(count, dtype=np.int64)
+        template_keys = []
+        inverse_list = inverse.tolist()
+        for i, tier in enumerate(tier_index.tolist()):
+            key = (ROUTING_TIERS[tier], task_types[inverse_list[i]])
+            template = templates.get(key)
+            if template is None:
+                template = templates[key] = self._apply_failover(
+                    tier_builders[key[0]](key[1])
+                )
+            template_keys.append(key)
+            base_temperature[i] = template["temperature"]
+            base_max_tokens[i] = template["max_tokens"]
+
+        # Vectorized _adjust_params_based_on_history
+        temperature = np.where(
+            history_length > 5,
+            np.minimum(base_temperature * 1.1, 1.0),
+            base_temperature,
+        )
+        max_tokens = np.where(
+            asks_explanation,
+            np.minimum(np.floor(base_max_tokens * 1.2).astype(np.int64), 8192),
+            base_max_tokens,
+        )
+        max_tokens = np.where(
+            short_exchange,
+            np.maximum(128, np.floor(max_tokens * 0.8).astype(np.int64)),
+            max_tokens,
+        )
+
+        per_query = []
+        for feature, query_complexity in zip(
+            features, unique_complexity.tolist()
+        ):
+            per_query.append(
+                (
+                    f"({query_complexity:.2f}), context length (",
+                    feature.question_type,
+                    self._get_response_strategy(
+                        feature.question_type, feature.task_type
+                    ),
+                    feature.task_type,
+                    query_complexity,
+                    f" chars), and task type ({feature.task_type}). "
+                    f"Threshold: {self.threshold}",
+                )
+            )
+
+        configs = []
+        for template_key, unique, length, temp, tokens in zip(
+            template_keys,
+            inverse_list,
+            context_length.tolist(),
+            temperature.tolist(),
+            max_tokens.tolist(),
+        ):
+            template = templates[template_key]
+            (
+                complexity_text,
+                question_type,
+                strategy,
+                task_type,
+                query_complexity,
+                task_text,
+            ) = per_query[unique]
+            configs.append(
+                {
+                    **template,
+                    "max_tokens": tokens,
+                    "temperature": temp,
+                    "routing_explanation": (
+                        f"Selected {template['model']} based on complexity "
+                        f"{complexity_text}{length}{task_text}"
+                    ),
+                    "question_type": question_type,
+                    "response_strategy": strategy,
+                    "task_type": task_type,
+                    "task_complexity": query_complexity,
+                }
+            )
 
-        # Count special characters and numbers
-        special_chars = sum(
-            1
-            for char in query
-            if not char.isalnum() and char not in [" ", ".", ",", "!", "?"]
+        histogram = np.bincount(tier_index, minlength=len(ROUTING_TIERS))
+        tier_histogram = {
+            tier: int(histogram[i]) for i, tier in enumerate(ROUTING_TIERS)
+        }
+        logger.info(
+            f"Routed {count} queries ({len(unique_queries)} distinct): "
+            f"{tier_histogram}"
         )
-        numbers = sum(1 for char in query if char.isdigit())
 
-        # Calculate complexity score
-        complexity = (
-            (len(tokens) / 100) * 0.3  # Length factor
-            + lexical_diversity * 0.3  # Vocabulary richness
-            + (avg_word_length / 10) * 0.2  # Word complexity
-            + (special_chars / len(query)) * 0.1  # Special character density
-            + (numbers / len(query)) * 0.1  # Number density
+        return {"configs": configs, "tier_histogram": tier_histogram}
+
+    @staticmethod
+    def _history_arrays(
+        histories: Sequence[List[Dict[str, str]]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-history inputs of _calculate_context_length and
+        _adjust_params_based_on_history, computed over all messages at once.
+        """
+        history_length = np.fromiter(
+            map(len, histories), dtype=np.int64, count=len(histories)
+        )
+        contents = [msg["content"] for h in histories for msg in h]
+        if not contents:
+            no_flags = np.zeros(len(histories), dtype=bool)
+            return history_length, history_length, no_flags, no_flags
+        ends = np.cumsum(history_length)
+        starts = ends - history_length
+
+        unique_contents: Dict[str, int] = {}
+        content_ids = np.fromiter(
+            (
+                unique_contents.setdefault(c, len(unique_contents))
+                for c in contents
+            ),
+            dtype=np.intp,
+            count=len(contents),
+        )
+        lengths = np.fromiter(
+            map(len, unique_contents),
+            dtype=np.int64,
+            count=len(unique_contents),
+        )
+        explains = np.fromiter(
+            (c.lower().startswith("please explain") for c in unique_contents),
+            dtype=bool,
+            count=len(unique_contents),
+        )
+        short = np.fromiter(
+            (len(c.split()) < 10 for c in unique_contents),
+            dtype=bool,
+            count=len(unique_contents),
         )
 
-        return min(complexity, 1.0)
+        cumulative = np.concatenate(([0], np.cumsum(lengths[content_ids])))
+        context_length = cumulative[ends] - cumulative[starts]
+
+        # Look back over the last 3 (explanations) / 4 (short) messages
+        asks_explanation = np.zeros(len(histories), dtype=bool)
+        short_exchange = history_length >= 4
+        for back in range(1, 5):
+            position = ends - back
+            present = position >= starts
+            message = content_ids[np.where(present, position, 0)]
+            if back <= 3:
+                asks_explanation |= present & explains[message]
+            short_exchange &= ~present | short[message]
+
+        return context_length, history_length, asks_explanation, short_exchange
+
+    def _assess_complexity(self, query: str) -> float:
+        return self.feature_cache.get(query).complexity
 
     def _calculate_context_length(
         self, conversation_history: List[Dict[str, str]]
@@ -152,54 +463,10 @@ class AdvancedRouter:
         return sum(len(message["content"]) for message in conversation_history)
 
     def _identify_task_type(self, query: str) -> str:
-        query_lower = query.lower()
-        if any(
-            word in query_lower
-            for word in ["code", "program", "function", "debug"]
-        ):
-            return "coding"
-        elif any(
-            word in query_lower for word in ["analyze", "compare", "evaluate"]
-        ):
-            return "analysis"
-        elif any(
-            word in query_lower for word in ["create", "generate", "write"]
-        ):
-            return "creative"
-        elif any(
-            word in query_lower
-            for word in ["hi", "hello", "hey", "how are you"]
-        ):
-            return "casual"
-        elif any(
-            word in query_lower
-            for word in ["news", "current events", "latest", "today"]
-        ):
-            return "current_info"
-        else:
-            return "general"
+        return self.feature_cache.get(query).task_type
 
     def _classify_question(self, query: str) -> str:
-        query_lower = query.lower()
-        if any(word in query_lower for word in ["how", "why", "explain"]):
-            return "problem_solving"
-        elif any(
-            word in query_lower for word in ["what", "who", "where", "when"]
-        ):
-            return "factual"
-        elif query_lower.startswith(("is", "are", "can", "do", "does")):
-            return "yes_no"
-        elif any(
-            word in query_lower for word in ["compare", "contrast", "analyze"]
-        ):
-            return "analysis"
-        elif any(
-            word in query_lower
-            for word in ["hi", "hello", "hey", "how are you"]
-        ):
-            return "casual"
-        else:
-            return "open_ended"
+        return self.feature_cache.get(query).question_type
 
     def _get_response_strategy(
         self, question_type: str, task_type: str
@@ -216,40 +483,117 @@ class AdvancedRouter:
         }
         return strategy_map.get(question_type, "default")
 
-    def _select_model_config(self, complexity, context_length, task_type):
+    def _select_model_config(
+        self,
+        complexity,
+        context_length,
+        task_type,
+        features: Optional[QueryFeatures] = None,
+    ):
         performance_factor = self.performance_tracker.get_performance_factors()
+        learned_tier = (
+            self._learned_tier(features, context_length)
+            if features is not None
+            else None
+        )
 
-        if (
-            complexity >= self.threshold
-            or context_length >= 4000
-            or performance_factor.get("high", 1.0) <= 0.8
-        ):
-            return self._get_high_tier_config(task_type)
-        elif (
-            complexity < self.threshold
-            and context_length < 4000
-            and performance_factor.get("mid", 1.0) <= 1.2
-        ):
-            return self._get_mid_tier_config(task_type)
+        if learned_tier is not None:
+            tier, reason = learned_tier, "learned"
+        elif complexity >= self.threshold:
+            tier, reason = "high", "complexity"
+        elif context_length >= HIGH_TIER_CONTEXT_LENGTH:
+            tier, reason = "high", "context_length"
+        elif performance_factor.get("mid", 1.0) <= 1.2:
+            tier, reason = "mid", "default"
         else:
-            return self._get_low_tier_config(task_type)
+            tier, reason = "low", "mid_tier_degraded"
 
-    def _get_performance_factor(self) -> Dict[str, float]:
-        return {
-            tier: (
-                (
-                    perf["avg_time"]
-                    / min(
-                        self.model_performance.values(),
-                        key=lambda x: x["avg_time"],
-                    )["avg_time"]
+        self.performance_tracker.record_selection(
+            tier, reason, performance_factor
+        )
+        if tier == "high":
+            config = self._get_high_tier_config(task_type)
+        elif tier == "mid":
+            config = self._get_mid_tier_config(task_type)
+        else:
+            config = self._get_low_tier_config(task_type)
+        return self._apply_failover(config)
+
+    def _apply_failover(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Swap in an equivalent model while the circuit of the configured
+        model's provider is open (taking one from another provider) or the
+        model has used up its rate limit.
+        """
+        # Leg configs are built on top of the routed one, which may carry
+        # an earlier substitution
+        config.pop("failover_from", None)
+        model = config["model"]
+        provider = get_provider(model)
+        circuit_open = not self.circuit_breakers.available(provider)
+        if not circuit_open and self._has_headroom(model):
+            return config
+        for substitute in get_equivalent_models(model):
+            substitute_provider = get_provider(substitute)
+            if circuit_open and substitute_provider == provider:
+                continue
+            if self.circuit_breakers.available(
+                substitute_provider
+            ) and self._has_headroom(substitute):
+                logger.warning(
+                    f"{model} is unavailable "
+                    f"({'circuit open' if circuit_open else 'rate limited'}), "
+                    f"using {substitute}"
                 )
-                if perf["count"] > 0
-                else 1.0
-            )
-            for tier, perf in self.model_performance.items()
+                return {**config, "model": substitute, "failover_from": model}
+        return config
+
+    def _has_headroom(self, model: str) -> bool:
+        return (
+            self.model_rate_limiters.headroom(model) > self.min_model_headroom
+        )
+
+    def get_model_headroom(self, models: Optional[Sequence[str]] = None):
+        """Free share (0-1) of each model's tightest rate limit."""
+        return {
+            model: self.model_rate_limiters.headroom(model)
+            for model in (models or self.models)
         }
 
+    def _learned_tier(
+        self, features: QueryFeatures, context_length: int
+    ) -> Optional[str]:
+        """The learned router's tier, if one is loaded and confident."""
+        if (
+            self.learned_router is None
+            or context_length >= HIGH_TIER_CONTEXT_LENGTH
+        ):
+            return None
+        tier, confidence = self.learned_router.predict(
+            features, context_length
+        )
+        return tier if confidence >= self.learned_min_confidence else None
+
+    def tier_model_configs(self) -> List[Tuple[str, float, int]]:
+        """(model, temperature, max_tokens) of every tier, for pre-warming."""
+        return [
+            (config["model"], config["temperature"], config["max_tokens"])
+            for tier_config in (
+                self._get_low_tier_config,
+                self._get_mid_tier_config,
+                self._get_high_tier_config,
+            )
+            for config in [tier_config("general")]
+        ]
+
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """Latency, error and selection statistics behind tier choices."""
+        return self.performance_tracker.snapshot()
+
+    def get_circuit_breaker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """State and recent error/slow-call rates of each provider circuit."""
+        return self.circuit_breakers.snapshot()
+
     def _get_casual_config(self) -> Dict[str, Any]:
         return {
             "model": self.model_tiers["low"],
@@ -262,6 +606,7 @@ class AdvancedRouter:
     def _get_low_tier_config(self, task_type: str) -> Dict[str, Any]:
         config = {
             "model": self.model_tiers["low"],
+            "tier": "low",
             "max_tokens": 256,
             "temperature": 0.5,
         }
@@ -272,6 +617,7 @@ class AdvancedRouter:
     def _get_mid_tier_config(self, task_type: str) -> Dict[str, Any]:
         config = {
             "model": self.model_tiers["mid"],
+            "tier": "mid",
             "max_tokens": 512,
             "temperature": 0.7,
         }
@@ -282,6 +628,7 @@ class AdvancedRouter:
     def _get_high_tier_config(self, task_type: str) -> Dict[str, Any]:
         config = {
             "model": self.model_tiers["high"],
+            "tier": "high",
             "max_tokens": 1024,
             "temperature": 0.9,
         }
@@ -292,6 +639,7 @@ class AdvancedRouter:
     def _get_superior_tier_config(self, task_type: str) -> Dict[str, Any]:
         config = {
             "model": self.model_tiers["superior"],
+            "tier": "superior",
             "max_tokens": 8192,
             "temperature": 0.7,
         }
@@ -332,11 +680,72 @@ class AdvancedRouter:
         return config
 
     async def process(
-        self, query: str, params: Dict[str, Any]
+        self,
+        query: str,
+        params: Dict[str, Any],
+        config: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
+        """
+        Route and answer a query, or answer it with `config` if it was
+        already routed. Concurrent identical requests (same normalized query
+        and history) share one execution and one result. Model calls are
+        queued fairly by params["conversation_id"].
+        """
+        key = coalesce_key(query, params.get("conversation_history", []))
+        with llm_call_context(conversation_id=params.get("conversation_id")):
+            return await self.single_flight.do_async(
+                key, lambda: self._process(query, params, config)
+            )
+
+    async def process_many(
+        self, items: Sequence[Tuple[str, Dict[str, Any]]]
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Answer a batch of (query, params) pairs concurrently.
+
+        The batch is routed at once with route_many, then every query is
+        answered as process() would, its model calls going through the same
+        rate limiters and scheduler. Yields (index, result) as each query
+        finishes; the result of a failed query is its exception.
+        """
+        if not items:
+            return
+        configs = self.route_many(
+            [query for query, _ in items],
+            [params.get("conversation_history", []) for _, params in items],
+        )["configs"]
+
+        async def answer(index, query, params, config):
+            try:
+                return index, await self.process(query, params, config)
+            except Exception as e:
+                return index, e
+
+        tasks = [
+            asyncio.create_task(answer(index, query, params, config))
+            for index, ((query, params), config) in enumerate(
+                zip(items, configs)
+            )
+        ]
         try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # The caller stopped listening: drop the unfinished queries
+            for task in tasks:
+                task.cancel()
+
+    async def _process(
+        self,
+        query: str,
+        params: Dict[str, Any],
+        config: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        try:
+            start_time = time.time()
             conversation_history = params.get("conversation_history", [])
-            config = await self.route(query, conversation_history)
+            if config is None:
+                config = await self.route(query, conversation_history)
 
             if not self.agent.chat_model:
                 self.agent.initialize_models()
@@ -350,50 +759,632 @@ class AdvancedRouter:
             if config["task_type"] == "current_info":
                 return await self.process_online_knowledge_tool(query, config)
 
-            messages = [
+            messages = self._messages_for(
+                query, conversation_history, config["model"]
+            )
+
+            cached, cache_key, semantic = await self._lookup_cached(
+                query, config, messages, conversation_history
+            )
+            if cached:
+                return self._cached_result(cached, config, start_time)
+
+            if self.cascade_enabled:
+                result = await self._process_cascade(
+                    query, conversation_history, config
+                )
+            elif self._should_hedge(config, conversation_history):
+                result = await self._process_hedged(
+                    query, conversation_history, config
+                )
+            else:
+                content, processing_time = await self._invoke_model(
+                    config, messages
+                )
+                result = {
+                    "content": content,
+                    "model_used": config["model"],
+                    "task_type": config["task_type"],
+                    "task_complexity": config["task_complexity"],
+                    "processing_time": processing_time,
+                }
+
+            await self._store_cached(
+                query,
+                cache_key,
+                semantic,
+                {
+                    "content": result["content"],
+                    "model_used": result["model_used"],
+                },
+            )
+            if self.route_log is not None:
+                self._log_outcome(query, conversation_history, config, result)
+            result["response_cache"] = "miss" if cache_key else "bypass"
+            return result
+        except Exception as e:
+            logger.error(
+                f"Error in AdvancedRouter process: {str(e)}", exc_info=True
+            )
+            raise
+
+    async def astream_process(
+        self, query: str, params: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process().
+
+        Yields {"event": "token", "content": ...} as the model produces text,
+        then one {"event": "done", ...} carrying the full content, the
+        routing metadata, the time to first token and the total time (both
+        measured from the start of the request). Tool and current_info
+        requests have no token stream and arrive as a single token event.
+        Hedging and cascading need the complete answer before choosing a
+        winner, so the stream always uses the routed tier.
+        """
+        start_time = time.time()
+        conversation_history = params.get("conversation_history", [])
+        config = await self.route(query, conversation_history)
+
+        if not self.agent.chat_model:
+            self.agent.initialize_models()
+
+        if "use tool" in query.lower() or "access your tools" in query.lower():
+            result = await self.process_tool_request(query, config)
+        elif config["task_type"] == "current_info":
+            result = await self.process_online_knowledge_tool(query, config)
+        else:
+            result = None
+
+        if result is not None:
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            elapsed = time.time() - start_time
+            yield {"event": "token", "content": result["content"]}
+            yield {
+                "event": "done",
+                **result,
+                "time_to_first_token": elapsed,
+                "processing_time": elapsed,
+            }
+            return
+
+        messages = self._messages_for(
+            query, conversation_history, config["model"]
+        )
+        cached, cache_key, semantic = await self._lookup_cached(
+            query, config, messages, conversation_history
+        )
+        if cached:
+            result = self._cached_result(cached, config, start_time)
+            yield {"event": "token", "content": result["content"]}
+            yield {
+                "event": "done",
+                **result,
+                "time_to_first_token": result["processing_time"],
+            }
+            return
+
+        time_to_first_token = None
+        chunks = []
+        async for text in self._astream_model(
+            config, messages, {}, params.get("conversation_id")
+        ):
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+            chunks.append(text)
+            yield {"event": "token", "content": text}
+
+        content = "".join(chunks)
+        await self._store_cached(
+            query,
+            cache_key,
+            semantic,
+            {"content": content, "model_used": config["model"]},
+        )
+        yield {
+            "event": "done",
+            "content": content,
+            "model_used": config["model"],
+            "task_type": config["task_type"],
+            "task_complexity": config["task_complexity"],
+            "time_to_first_token": time_to_first_token,
+            "processing_time": time.time() - start_time,
+            "response_cache": "miss" if cache_key else "bypass",
+        }
+
+    def _response_cache_key(
+        self, config: Dict[str, Any], messages: List[Dict[str, str]]
+    ) -> Optional[str]:
+        if not self.response_cache.accepts(config):
+            return None
+        return self.response_cache.key(config, messages)
+
+    def _log_outcome(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]],
+        config: Dict[str, Any],
+        result: Dict[str, Any],
+    ) -> None:
+        """
+        Record which tier answered and how well, for app/train_router.py.
+        A cascade logs every tier it tried.
+        """
+        base = {
+            "query": query,
+            "context_length": self._calculate_context_length(
+                conversation_history
+            ),
+            "task_type": config["task_type"],
+            "routed_tier": config.get("tier"),
+        }
+        if "cascade" in result:
+            legs = [
+                {
+                    "tier": leg["tier"],
+                    "latency": leg.get("processing_time"),
+                    "quality": leg.get("score", 0.0),
+                }
+                for leg in result["cascade"]["path"]
+            ]
+        else:
+            model_tiers = {
+                self.model_tiers[tier]: tier for tier in ROUTING_TIERS
+            }
+            legs = [
                 {
-                    "role": "user" if msg["role"] == "user" else "assistant",
-                    "content": msg["content"],
+                    "tier": model_tiers.get(
+                        result["model_used"], config.get("tier")
+                    ),
+                    "latency": result.get("processing_time"),
+                    "quality": score_answer(
+                        query, result["content"], config["task_type"]
+                    )[0],
                 }
-                for msg in conversation_history
             ]
-            messages.append({"role": "user", "content": query})
+        try:
+            for leg in legs:
+                self.route_log.write({**base, **leg})
+        except OSError as e:
+            logger.error(f"Error writing route log: {str(e)}")
 
-            chat_model = get_chat_model(config["model"])
+    async def _lookup_cached(
+        self,
+        query: str,
+        config: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        conversation_history: List[Dict[str, str]],
+    ) -> Tuple[
+        Optional[Dict[str, Any]], Optional[str], Optional[SemanticLookup]
+    ]:
+        """
+        Check the exact response cache, then the semantic one. Only queries
+        without prior history are matched semantically: a paraphrase in a
+        different conversation is not the same question. The endpoints
+        append the current question to the history, so a history holding
+        only that question counts as none.
+
+        Returns the cached response (or None), the exact cache key and the
+        semantic lookup, the last two for _store_cached after a miss.
+        """
+        cache_key = self._response_cache_key(config, messages)
+        if not cache_key:
+            return None, None, None
+
+        # The Redis client blocks, so keep it off the event loop
+        cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+        if cached:
+            return {**cached, "response_cache": "hit"}, cache_key, None
+
+        if self.semantic_cache is None or self._prior_history(
+            query, conversation_history
+        ):
+            return None, cache_key, None
+        try:
+            semantic = await asyncio.to_thread(
+                self.semantic_cache.lookup, query
+            )
+        except Exception as e:
+            logger.error(f"Error in semantic cache lookup: {str(e)}")
+            return None, cache_key, None
+        if semantic.hit:
+            return (
+                {
+                    **semantic.answer,
+                    "response_cache": "semantic_hit",
+                    "cache_similarity": semantic.similarity,
+                },
+                cache_key,
+                None,
+            )
+        return None, cache_key, semantic
+
+    @staticmethod
+    def _prior_history(
+        query: str, conversation_history: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """The history before the current question, if it ends with it."""
+        if conversation_history:
+            last = conversation_history[-1]
+            if last.get("role") == "user" and last.get("content") == query:
+                return conversation_history[:-1]
+        return conversation_history
+
+    async def _store_cached(
+        self,
+        query: str,
+        cache_key: Optional[str],
+        semantic: Optional[SemanticLookup],
+        response: Dict[str, Any],
+    ) -> None:
+        if not cache_key:
+            return
+        await asyncio.to_thread(self.response_cache.set, cache_key, response)
+        if semantic is not None:
+            await asyncio.to_thread(
+                self.semantic_cache.store, query, response, semantic
+            )
+
+    @staticmethod
+    def _cached_result(
+        cached: Dict[str, Any], config: Dict[str, Any], start_time: float
+    ) -> Dict[str, Any]:
+        result = {
+            "content": cached["content"],
+            "model_used": cached["model_used"],
+            "task_type": config["task_type"],
+            "task_complexity": config["task_complexity"],
+            "processing_time": time.time() - start_time,
+            "response_cache": cached["response_cache"],
+        }
+        if "cache_similarity" in cached:
+            result["cache_similarity"] = cached["cache_similarity"]
+        return result
+
+    def _messages_for(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]],
+        model: str,
+    ) -> List[Dict[str, str]]:
+        """The prompt for `model`, its history windowed to that model."""
+        return self._build_messages(
+            query,
+            self.history_window.apply(
+                self._prior_history(query, conversation_history), model
+            ),
+        )
+
+    @staticmethod
+    def _build_messages(
+        query: str, conversation_history: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        messages = [
+            {
+                # System messages include the history window's summary
+                "role": (
+                    msg["role"]
+                    if msg["role"] in ("user", "system")
+                    else "assistant"
+                ),
+                "content": msg["content"],
+            }
+            for msg in conversation_history
+        ]
+        messages.append({"role": "user", "content": query})
+        return messages
+
+    async def _invoke_model(
+        self, config: Dict[str, Any], messages: List[Dict[str, str]]
+    ) -> Tuple[str, float]:
+        chat_model = get_chat_model(
+            config["model"], config["temperature"], config["max_tokens"]
+        )
+        provider = get_provider(config["model"])
+        # Waiting for quota is local throttling, not provider latency
+        chat_model = await admit(chat_model, messages)
+        async with self.llm_scheduler.slot():
+            self.circuit_breakers.acquire(provider)
 
             start_time = time.time()
-            response = await chat_model.ainvoke(messages)
-            end_time = time.time()
+            try:
+                response = await chat_model.ainvoke(messages)
+            except asyncio.CancelledError:
+                self.circuit_breakers.release(provider)
+                raise
+            except Exception:
+                elapsed = time.time() - start_time
+                self.circuit_breakers.record(provider, elapsed, error=True)
+                self.performance_tracker.record(
+                    config["model"], config.get("tier"), elapsed, error=True
+                )
+                raise
+            processing_time = time.time() - start_time
+
+            self.circuit_breakers.record(provider, processing_time)
+            self.performance_tracker.record(
+                config["model"],
+                config.get("tier"),
+                processing_time,
+                output_tokens=count_output_tokens(response),
+            )
+            content = (
+                response.content
+                if hasattr(response, "content")
+                else str(response)
+            )
+            return content, processing_time
+
+    async def _astream_model(
+        self,
+        config: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        timing: Dict[str, float],
+        conversation_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield text chunks from astream and record the call in the tracker.
+
+        "ttft" and "processing_time" are written to `timing` once known.
+        The call waits for the model's quota, then holds a scheduler slot
+        for `conversation_id` (default: the one of the current
+        llm_call_context) while it streams.
+        """
+        chat_model = get_chat_model(
+            config["model"], config["temperature"], config["max_tokens"]
+        )
+        provider = get_provider(config["model"])
+        chat_model = await admit(chat_model, messages)
+        async with self.llm_scheduler.slot(conversation_id=conversation_id):
+            self.circuit_breakers.acquire(provider)
+
+            start_time = time.time()
+            output_chars = 0
+            try:
+                async for chunk in chat_model.astream(messages):
+                    if "ttft" not in timing:
+                        timing["ttft"] = time.time() - start_time
+                    text = self._chunk_text(chunk)
+                    output_chars += len(text)
+                    yield text
+            except (asyncio.CancelledError, GeneratorExit):
+                self.circuit_breakers.release(provider)
+                raise
+            except Exception:
+                elapsed = time.time() - start_time
+                self.circuit_breakers.record(provider, elapsed, error=True)
+                self.performance_tracker.record(
+                    config["model"], config.get("tier"), elapsed, error=True
+                )
+                raise
+            timing["processing_time"] = time.time() - start_time
 
-            # Update model performance metrics
-            self._update_model_performance(
-                config["model"], end_time - start_time
+            # A slow provider shows up in the time to first token
+            self.circuit_breakers.record(
+                provider, timing.get("ttft", timing["processing_time"])
+            )
+            self.performance_tracker.record(
+                config["model"],
+                config.get("tier"),
+                timing["processing_time"],
+                output_tokens=chars_to_tokens(output_chars),
+                ttft=timing.get("ttft"),
             )
 
-            return {
-                "content": (
-                    response.content
-                    if hasattr(response, "content")
-                    else str(response)
+    async def _stream_model(
+        self,
+        config: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        first_token: asyncio.Event,
+    ) -> Tuple[str, float]:
+        """Run a model through astream, signalling the first token."""
+        timing: Dict[str, float] = {}
+        chunks = []
+        async for text in self._astream_model(config, messages, timing):
+            first_token.set()
+            chunks.append(text)
+        return "".join(chunks), timing["processing_time"]
+
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        content = getattr(chunk, "content", chunk)
+        if isinstance(content, list):
+            return "".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        return str(content)
+
+    def _should_hedge(
+        self,
+        config: Dict[str, Any],
+        conversation_history: List[Dict[str, str]],
+    ) -> bool:
+        """Hedge only borderline queries that were not forced high by length."""
+        return (
+            self.hedging_enabled
+            and abs(config["task_complexity"] - self.threshold)
+            <= self.hedge_margin
+            and self._calculate_context_length(conversation_history)
+            < HIGH_TIER_CONTEXT_LENGTH
+        )
+
+    def _hedge_delay(self, model: str) -> float:
+        observed = self.performance_tracker.latency_percentile(
+            model, self.hedge_percentile, ttft=True
+        )
+        return self.hedge_default_delay if observed is None else observed
+
+    async def _process_hedged(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]],
+        config: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Start the low/mid tier right away and launch the high tier only if
+        no first token arrived within the hedge delay (p95 time to first
+        token of the primary model). The first leg to answer wins and the
+        other one is cancelled.
+        """
+        task_type = config["task_type"]
+        primary_config = (
+            config
+            if config.get("tier") in ("low", "mid")
+            else self._apply_failover(
+                {**config, **self._get_mid_tier_config(task_type)}
+            )
+        )
+        hedge_config = self._apply_failover(
+            {**config, **self._get_high_tier_config(task_type)}
+        )
+        delay = self._hedge_delay(primary_config["model"])
+
+        start_time = time.time()
+        first_token = asyncio.Event()
+        primary = asyncio.ensure_future(
+            self._stream_model(
+                primary_config,
+                self._messages_for(
+                    query, conversation_history, primary_config["model"]
                 ),
-                "model_used": config["model"],
-                "task_type": config["task_type"],
-                "task_complexity": config["task_complexity"],
-                "processing_time": end_time - start_time,
-            }
-        except Exception as e:
-            logger.error(
-                f"Error in AdvancedRouter process: {str(e)}", exc_info=True
+                first_token,
             )
-            raise
+        )
+        first_token_wait = asyncio.ensure_future(first_token.wait())
+        legs = {primary: ("primary", primary_config)}
+        winner = None
+        try:
+            await asyncio.wait(
+                {primary, first_token_wait},
+                timeout=delay,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            primary_failed = primary.done() and primary.exception()
+            if not first_token.is_set() and (
+                not primary.done() or primary_failed
+            ):
+                hedge = asyncio.ensure_future(
+                    self._stream_model(
+                        hedge_config,
+                        self._messages_for(
+                            query, conversation_history, hedge_config["model"]
+                        ),
+                        asyncio.Event(),
+                    )
+                )
+                legs[hedge] = ("hedge", hedge_config)
 
-    def _update_model_performance(
-        self, model: str, processing_time: float
-    ) -> None:
-        perf = self.model_performance[model]
-        perf["total_time"] += processing_time
-        perf["count"] += 1
-        perf["avg_time"] = perf["total_time"] / perf["count"]
+            pending = set(legs)
+            error: Optional[BaseException] = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+            if winner is None:
+                raise error
+        finally:
+            first_token_wait.cancel()
+            losers = [task for task in legs if not task.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+
+        content, _ = winner.result()
+        leg, winner_config = legs[winner]
+        hedge_info = {
+            "hedged": len(legs) > 1,
+            "winner": leg,
+            "delay": delay,
+            "primary_model": primary_config["model"],
+            "hedge_model": (hedge_config["model"] if len(legs) > 1 else None),
+        }
+        logger.info(f"Hedged execution: {hedge_info}")
+
+        return {
+            "content": content,
+            "model_used": winner_config["model"],
+            "task_type": task_type,
+            "task_complexity": config["task_complexity"],
+            "processing_time": time.time() - start_time,
+            "hedge": hedge_info,
+        }
+
+    async def _process_cascade(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]],
+        config: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Answer on the low tier first and escalate to mid, then high, only
+        while the local answer score stays below the cascade threshold.
+        """
+        task_type = config["task_type"]
+        tiers = [
+            ("low", self._get_low_tier_config),
+            ("mid", self._get_mid_tier_config),
+            ("high", self._get_high_tier_config),
+        ]
+        path = []
+        start_time = time.time()
+        for tier, tier_config in tiers:
+            leg_config = self._apply_failover(
+                {**config, **tier_config(task_type)}
+            )
+            try:
+                content, leg_time = await self._invoke_model(
+                    leg_config,
+                    self._messages_for(
+                        query, conversation_history, leg_config["model"]
+                    ),
+                )
+            except Exception as e:
+                if tier == "high":
+                    raise
+                path.append(
+                    {
+                        "tier": tier,
+                        "model": leg_config["model"],
+                        "error": str(e),
+                    }
+                )
+                continue
+
+            score, reasons = score_answer(query, content, task_type)
+            path.append(
+                {
+                    "tier": tier,
+                    "model": leg_config["model"],
+                    "score": score,
+                    "reasons": reasons,
+                    "processing_time": leg_time,
+                }
+            )
+            if score >= self.cascade_threshold:
+                break
+
+        cascade_info = {
+            "threshold": self.cascade_threshold,
+            "escalated": len(path) > 1,
+            "path": path,
+        }
+        logger.info(f"Cascade decision path: {cascade_info}")
+
+        return {
+            "content": content,
+            "model_used": leg_config["model"],
+            "task_type": task_type,
+            "task_complexity": config["task_complexity"],
+            "processing_time": time.time() - start_time,
+            "cascade": cascade_info,
+        }
 
     async def process_tool_request(
         self, query: str, config: Dict[str, Any]
@@ -417,18 +1408,21 @@ class AdvancedRouter:
     async def process_chat_model(
         self, query: str, params: Dict[str, Any]
     ) -> Dict[str, Any]:
+        # Waits for quota without blocking other requests on the loop
+        record = await self.rate_limiter.acquire(estimate_tokens(query))
+        messages = [{"role": "user", "content": query}]
+        output_tokens = 0
         try:
-            await self.rate_limiter.acquire()
-            try:
-                messages = [{"role": "user", "content": query}]
-                return await self.agent.chat_model.ainvoke(messages)
-            finally:
-                self.rate_limiter.release()
-        except AttributeError as e:
-            logger.error(f"Rate limiter not properly initialized: {str(e)}")
-            raise RuntimeError(
-                "Rate limiter is not properly initialized"
-            ) from e
+            chat_model = await admit(self.agent.chat_model, messages)
+            async with self.llm_scheduler.slot(
+                conversation_id=params.get("conversation_id")
+            ):
+                response = await chat_model.ainvoke(messages)
+            output_tokens = count_output_tokens(response)
+        finally:
+            # A failed call still settles its admitted record
+            await self.rate_limiter.arelease(output_tokens, record)
+        return response
 
     async def process_knowledge_tool(
         self, query: str, params: Dict[str, Any]
@@ -439,7 +1433,10 @@ class AdvancedRouter:
             return {"error": "Knowledge tool not found"}
 
         try:
-            response = knowledge_tool.execute(question=query)
+            # Tools are synchronous and may wait on their rate limiter
+            response = await asyncio.to_thread(
+                knowledge_tool.execute, question=query
+            )
             return {"content": response.content, "tool_used": "knowledge_tool"}
         except Exception as e:
             logger.error(
@@ -458,8 +1455,14 @@ class AdvancedRouter:
         try:
             count = params.get("count", 3)
             threshold = params.get("threshold", 0.5)
-            response = memory_tool.search(
-                self.agent, query, count=count, threshold=threshold
+            # Blocking Pinecone calls (and their rate limiter) stay off
+            # the event loop
+            response = await asyncio.to_thread(
+                memory_tool.search,
+                self.agent,
+                query,
+                count=count,
+                threshold=threshold,
             )
             return {"content": response, "tool_used": "memory_tool"}
         except Exception as e:
@@ -481,7 +1484,9 @@ class AdvancedRouter:
                 f"Processing query with online knowledge tool: {query}"
             )
 
-            hybrid_response = self.rag_system.hybrid_query(query)
+            hybrid_response = await asyncio.to_thread(
+                self.rag_system.hybrid_query, query
+            )
 
             logger.info(f"Hybrid query response: {hybrid_response}")
 
@@ -1,9 +1,17 @@
 from typing import Dict, Any, Optional, List, TypedDict, Tuple
+import asyncio
 import json
 import re
 from app.python.helpers.tool import Tool
-from app.models import get_chat_model, get_embedding_model
+from app.models import get_chat_model, get_embedding_model, get_llm_scheduler
+from app.python.helpers.llm_scheduler import (
+    TOOL_LOOP,
+    current_priority,
+    lower_priority,
+)
+from app.python.helpers.model_rate_limits import admit
 from app.python.helpers.vdb import VectorDB
+from app.python.helpers.history_window import HistoryWindow
 from app.python.helpers.message import HumanMessage, SystemMessage, AIMessage
 
 
@@ -37,6 +45,7 @@ class Agent:
         self.vector_db: Optional[VectorDB] = None
         self.intervention_status: bool = False
         self.data: Dict[str, Any] = {}
+        self.history_window = HistoryWindow.from_config(config.__dict__)
 
     def set_tools(self, tools: Dict[str, Tool]) -> None:
         self.tools = tools
@@ -60,6 +69,8 @@ class Agent:
             self.initialize_models()
 
         chat_model = get_chat_model(model_name)
+        scheduler = get_llm_scheduler()
+        priority = current_priority()
 
         self.conversation_history.append(
             {"role": "user", "content": input_text}
@@ -80,7 +91,9 @@ class Agent:
                         else SystemMessage(content=msg["content"])
                     )
                 )
-                for msg in self.conversation_history
+                for msg in self.history_window.apply(
+                    self.conversation_history, model_name
+                )
             ]
 
             # Add a system message to ensure the model knows its identity
@@ -89,7 +102,10 @@ class Agent:
             )
             messages.insert(0, system_message)
 
-            response = await chat_model.ainvoke(messages)
+            # Wait for quota before taking a slot, not while holding one
+            admitted = await admit(chat_model, messages)
+            async with scheduler.slot(priority):
+                response = await admitted.ainvoke(messages)
 
             if isinstance(response, dict):
                 response_content = response.get("content", "")
@@ -100,8 +116,15 @@ class Agent:
 
             if tool_call := self.extract_tool_call(str(response_content)):
                 tool_name, tool_args = tool_call
+                # Follow-up calls on tool results must not crowd out
+                # other users' first calls
+                priority = lower_priority(priority, TOOL_LOOP)
                 if tool_name in self.tools:
-                    tool_result = self.tools[tool_name].execute(**tool_args)
+                    # Tools are synchronous (and may wait on a rate
+                    # limiter), so keep them off the event loop
+                    tool_result = await asyncio.to_thread(
+                        self.tools[tool_name].execute, **tool_args
+                    )
                     self.conversation_history.append(
                         {"role": "assistant", "content": str(response_content)}
                     )
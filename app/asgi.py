@@ -0,0 +1,399 @@
+"""
+ASGI version of the app, serving /, /upload, /query, /query/stream,
+/query/batch and /metrics.
+
+The Flask app (app/main.py) runs every request on a WSGI worker thread and
+hands router coroutines to a side event loop, so each in-flight query holds
+a thread. Here the server's event loop runs the router directly: a query
+waiting on a model is just a suspended coroutine, and the pooled async
+chat-model clients live on the loop that serves the requests. Redis
+conversation storage runs in worker threads and uploads are ingested by the
+background IngestionQueue.
+
+Redis, MongoDB and Pinecone connect when their modules are imported, so the
+app imports them in its startup hook, not at import time, and closes them in
+its shutdown hook. Run it with
+
+    hypercorn app.asgi:app --bind 0.0.0.0:5000
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from quart import Quart, Response, jsonify, render_template, request
+from quart_cors import cors
+from werkzeug.utils import secure_filename
+
+from app.bootstrap import (
+    UPLOAD_FOLDER,
+    allowed_file,
+    append_to_conversation,
+    batch_item_result,
+    check_environment,
+    create_agent,
+    download_nltk_data,
+    ingest_file,
+    load_conversation,
+    parse_query_batch,
+    project_root,
+    query_metadata,
+    save_conversation,
+    sse_event,
+    static_dir,
+    stream_metadata,
+    submit_upload,
+    template_dir,
+    upload_path,
+)
+from app.config import load_config
+from app.models import clear_chat_model_pool, prewarm_chat_models
+from app.python.helpers.ingestion_queue import IngestionQueue
+from app.python.helpers.single_flight import single_flight_stats
+
+sys.path.append(project_root)
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def open_backends() -> None:
+    """Connect to Redis, MongoDB and Pinecone (blocking)."""
+    from app.python.helpers import mongodb_client, pinecone_db, redis_cache
+
+    logger.info(
+        "Backends ready: redis=%s mongodb=%s pinecone=%s",
+        redis_cache.RedisCache.check_redis_health(),
+        mongodb_client.check_mongodb_health(),
+        pinecone_db.check_pinecone_health(),
+    )
+
+
+def close_backends() -> None:
+    from app.python.helpers import mongodb_client, pinecone_db, redis_cache
+
+    for close in (
+        redis_cache.close_connections,
+        mongodb_client.close_connection,
+        pinecone_db.close_connection,
+    ):
+        try:
+            close()
+        except Exception as e:
+            logger.error(f"Error closing backend connection: {str(e)}")
+
+
+def create_app(
+    router: Any = None,
+    rag_system: Any = None,
+    manage_backends: bool = True,
+) -> Quart:
+    """
+    Build the ASGI app. Without `router` and `rag_system`, the startup hook
+    creates them (with the agent) from load_config(); `manage_backends`
+    controls whether it also opens and closes the backend connections.
+    """
+    app = cors(
+        Quart(__name__, template_folder=template_dir, static_folder=static_dir)
+    )
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    config = load_config()
+    state: Dict[str, Optional[Any]] = {
+        "router": router,
+        "rag_system": rag_system,
+        "ingestion_queue": None,
+    }
+
+    @app.before_serving
+    async def startup():
+        if manage_backends:
+            await asyncio.to_thread(download_nltk_data)
+            check_environment()
+            await asyncio.to_thread(open_backends)
+        if state["rag_system"] is None:
+            from app.python.helpers.rag_system import RAGSystem
+
+            state["rag_system"] = await asyncio.to_thread(RAGSystem)
+        state["ingestion_queue"] = IngestionQueue.from_config(
+            config,
+            lambda job, path: ingest_file(state["rag_system"], job, path),
+        )
+        if state["router"] is None:
+            from app.advanced_router import AdvancedRouter
+
+            agent = await asyncio.to_thread(create_agent, config)
+            state["router"] = AdvancedRouter(
+                config, agent, state["rag_system"]
+            )
+            if config.get("prewarm_chat_models"):
+                prewarm_chat_models(state["router"].tier_model_configs())
+
+    @app.after_serving
+    async def shutdown():
+        # Pooled clients hold connections bound to this event loop
+        clear_chat_model_pool()
+        # Let accepted uploads finish before their backends go away
+        await asyncio.to_thread(state["ingestion_queue"].shutdown)
+        if manage_backends:
+            await asyncio.to_thread(close_backends)
+
+    @app.route("/")
+    async def index():
+        return await render_template("index.html")
+
+    @app.route("/upload", methods=["POST"])
+    async def upload_file():
+        files = await request.files
+        if "file" not in files:
+            return jsonify({"error": "No file part"}), 400
+        file = files["file"]
+        if file.filename == "":
+            return jsonify({"error": "No selected file"}), 400
+        if not allowed_file(file.filename):
+            return jsonify({"error": "File type not allowed"}), 400
+
+        filename = secure_filename(file.filename)
+        filepath = upload_path(app.config["UPLOAD_FOLDER"], filename)
+        await file.save(filepath)
+        body, status, headers = await asyncio.to_thread(
+            submit_upload,
+            state["ingestion_queue"],
+            filepath,
+            filename,
+            config.get("ingestion_retry_after_seconds", 5),
+        )
+        return jsonify(body), status, headers
+
+    @app.route("/upload/<job_id>", methods=["GET"])
+    async def upload_status(job_id):
+        job = state["ingestion_queue"].get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job id"}), 404
+        return jsonify(job)
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        router = state["router"]
+        return jsonify(
+            {
+                "performance": router.get_performance_stats(),
+                "circuit_breakers": router.get_circuit_breaker_stats(),
+                "model_rate_limits": router.model_rate_limiters.snapshot(),
+                "llm_scheduler": router.llm_scheduler.stats(),
+                "ingestion": state["ingestion_queue"].stats(),
+                "response_cache": router.response_cache.stats(),
+                "semantic_cache": (
+                    router.semantic_cache.stats()
+                    if router.semantic_cache is not None
+                    else None
+                ),
+                "single_flight": {
+                    "router": router.single_flight.stats(),
+                    **single_flight_stats(),
+                },
+            }
+        )
+
+    @app.route("/query", methods=["POST"])
+    async def query():
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid JSON data"}), 400
+        user_input = data.get("query", "")
+        conversation_id = data.get("conversation_id", str(uuid.uuid4()))
+
+        logger.info(f"Processing advanced query: {user_input[:20]}...")
+
+        conversation_history = await asyncio.to_thread(
+            load_conversation, conversation_id
+        )
+        conversation_history.append({"role": "user", "content": user_input})
+
+        try:
+            result = await state["router"].process(
+                user_input,
+                {
+                    "conversation_history": conversation_history,
+                    "conversation_id": conversation_id,
+                },
+            )
+            response_content = result.get("content", "No response")
+            conversation_history.append(
+                {"role": "assistant", "content": response_content}
+            )
+            await asyncio.to_thread(
+                save_conversation, conversation_id, conversation_history
+            )
+            return jsonify(
+                {
+                    "response": response_content,
+                    "metadata": query_metadata(result, conversation_id),
+                }
+            )
+        except Exception as e:
+            logger.error(
+                f"Unexpected error in query processing: {str(e)}",
+                exc_info=True,
+            )
+            return (
+                jsonify(
+                    {
+                        "error": "An unexpected error occurred",
+                        "details": str(e),
+                    }
+                ),
+                500,
+            )
+
+    @app.route("/query/stream", methods=["POST"])
+    async def query_stream():
+        """Same contract as /query/stream in app/main.py."""
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid JSON data"}), 400
+        user_input = data.get("query", "")
+        conversation_id = data.get("conversation_id", str(uuid.uuid4()))
+
+        logger.info(f"Streaming advanced query: {user_input[:20]}...")
+
+        conversation_history = await asyncio.to_thread(
+            load_conversation, conversation_id
+        )
+        conversation_history.append({"role": "user", "content": user_input})
+
+        async def generate():
+            try:
+                async for event in state["router"].astream_process(
+                    user_input,
+                    {
+                        "conversation_history": list(conversation_history),
+                        "conversation_id": conversation_id,
+                    },
+                ):
+                    if event["event"] == "token":
+                        yield sse_event("token", {"content": event["content"]})
+                        continue
+
+                    conversation_history.append(
+                        {"role": "assistant", "content": event["content"]}
+                    )
+                    await asyncio.to_thread(
+                        save_conversation,
+                        conversation_id,
+                        conversation_history,
+                    )
+                    logger.info(
+                        f"Streamed {event['model_used']} response, "
+                        f"ttft {event['time_to_first_token']}s, "
+                        f"total {event['processing_time']:.2f}s"
+                    )
+                    yield sse_event(
+                        "done", stream_metadata(event, conversation_id)
+                    )
+            except Exception as e:
+                logger.error(
+                    f"Unexpected error in streaming query: {str(e)}",
+                    exc_info=True,
+                )
+                yield sse_event(
+                    "error",
+                    {
+                        "error": "An unexpected error occurred",
+                        "details": str(e),
+                    },
+                )
+
+        response = Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        # A long answer may stream for longer than RESPONSE_TIMEOUT
+        response.timeout = None
+        return response
+
+    @app.route("/query/batch", methods=["POST"])
+    async def query_batch():
+        """Same contract as /query/batch in app/main.py."""
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid JSON data"}), 400
+        try:
+            items = parse_query_batch(
+                data, config.get("query_batch_max_items", 50)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        logger.info(f"Processing batch of {len(items)} queries")
+
+        histories = await asyncio.gather(
+            *(
+                asyncio.to_thread(load_conversation, item["conversation_id"])
+                for item in items
+            )
+        )
+        batch = [
+            (
+                item["query"],
+                {
+                    "conversation_history": history
+                    + [{"role": "user", "content": item["query"]}],
+                    "conversation_id": item["conversation_id"],
+                },
+            )
+            for item, history in zip(items, histories)
+        ]
+
+        async def results():
+            async for index, result in state["router"].process_many(batch):
+                item = items[index]
+                if isinstance(result, Exception):
+                    logger.error(
+                        f"Error in batch query {index}: {str(result)}",
+                        exc_info=result,
+                    )
+                else:
+                    await asyncio.to_thread(
+                        append_to_conversation,
+                        item["conversation_id"],
+                        [
+                            {"role": "user", "content": item["query"]},
+                            {
+                                "role": "assistant",
+                                "content": result.get(
+                                    "content", "No response"
+                                ),
+                            },
+                        ],
+                    )
+                yield batch_item_result(index, item, result)
+
+        if data.get("stream"):
+
+            async def lines():
+                async for result in results():
+                    yield json.dumps(result) + "\n"
+
+            return Response(
+                lines(),
+                mimetype="application/x-ndjson",
+                headers={"Cache-Control": "no-cache"},
+            )
+        finished = [result async for result in results()]
+        return jsonify(
+            {"results": sorted(finished, key=lambda result: result["index"])}
+        )
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,323 @@
+"""
+Setup shared by the WSGI (app/main.py) and ASGI (app/asgi.py) servers: the
+agent and its tools, file uploads and conversation storage.
+"""
+
+import importlib
+import inspect
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Tuple
+
+import nltk
+
+from app.agent import Agent, AgentConfig
+from app.python.helpers.chunked_ingestion import file_document_id
+from app.python.helpers.document_extractor import iter_blocks
+from app.python.helpers.ingestion_queue import (
+    QueueClosedError,
+    QueueFullError,
+)
+from app.python.helpers.tool import Tool
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+template_dir = os.path.join(project_root, "app", "templates")
+static_dir = os.path.join(project_root, "app", "static")
+
+UPLOAD_FOLDER = os.path.join(project_root, "uploads")
+ALLOWED_EXTENSIONS = {"pdf", "txt", "docx"}
+
+
+def download_nltk_data():
+    nltk.download("punkt_tab", quiet=True)
+    nltk.download("punkt", quiet=True)
+    nltk.download("stopwords", quiet=True)
+
+
+def check_environment():
+    perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
+    pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    pinecone_environment = os.getenv("PINECONE_ENVIRONMENT")
+    pinecone_index_name = os.getenv("PINECONE_INDEX_NAME")
+
+    logger.info(
+        f"Perplexity API Key: {'Set' if perplexity_api_key else 'Not set'}"
+    )
+    logger.info(
+        f"Pinecone API Key: {'Set' if pinecone_api_key else 'Not set'}"
+    )
+    logger.info(f"Pinecone Environment: {pinecone_environment}")
+    logger.info(f"Pinecone Index Name: {pinecone_index_name}")
+
+    if not perplexity_api_key:
+        logger.warning(
+            "Perplexity API key is not set. Some features may not work properly."
+        )
+
+    if (
+        not pinecone_api_key
+        or not pinecone_environment
+        or not pinecone_index_name
+    ):
+        logger.warning(
+            "One or more Pinecone configuration variables are not set. RAG system may not work properly."
+        )
+
+
+def load_tools(agent):
+    tools_dir = os.path.join(os.path.dirname(__file__), "python", "tools")
+    tools = {
+        obj(agent).name: obj(agent)
+        for filename in os.listdir(tools_dir)
+        if filename.endswith(".py") and filename != "__init__.py"
+        for module_name in [f"app.python.tools.{filename[:-3]}"]
+        for module in [importlib.import_module(module_name)]
+        for _, obj in inspect.getmembers(module)
+        if inspect.isclass(obj) and issubclass(obj, Tool) and obj != Tool
+    }
+    return list(tools.values())
+
+
+def build_agent_config(config: Dict[str, Any]) -> AgentConfig:
+    return AgentConfig(
+        **{
+            "chat_model": config["chat_model"],
+            "utility_model": config["utility_model"],
+            "backup_utility_model": config["backup_utility_model"],
+            "embeddings_model": config["embeddings_model"],
+            "perplexity_api_key": os.getenv("PERPLEXITY_API_KEY"),
+            "pinecone_api_key": os.getenv("PINECONE_API_KEY"),
+            "pinecone_environment": os.getenv("PINECONE_ENVIRONMENT"),
+            "pinecone_index_name": os.getenv("PINECONE_INDEX_NAME"),
+            "pinecone_dimension": int(os.getenv("PINECONE_DIMENSION", 1536)),
+            "pinecone_cloud": os.getenv("PINECONE_CLOUD", "aws"),
+            **{
+                key: config.get(key, default)
+                for key, default in [
+                    ("memory_subdir", ""),
+                    ("auto_memory_count", 3),
+                    ("auto_memory_skip", 2),
+                    ("rate_limit_seconds", 60),
+                    ("rate_limit_requests", 120),
+                    ("rate_limit_input_tokens", 200000),
+                    ("rate_limit_output_tokens", 200000),
+                    ("msgs_keep_max", 25),
+                    ("msgs_keep_start", 5),
+                    ("msgs_keep_end", 10),
+                    ("history_token_budget", None),
+                    ("history_summary_tokens", 300),
+                    ("response_timeout_seconds", 60),
+                    ("max_tool_response_length", 3000),
+                    ("code_exec_docker_enabled", True),
+                    ("code_exec_docker_name", "agent-zero-exe"),
+                    (
+                        "code_exec_docker_image",
+                        "frdel/agent-zero-exe:latest",
+                    ),
+                    ("code_exec_docker_ports", {"22/tcp": 50022}),
+                    ("code_exec_docker_volumes", {}),
+                    ("code_exec_ssh_enabled", True),
+                    ("code_exec_ssh_addr", "localhost"),
+                    ("code_exec_ssh_port", 50022),
+                    ("code_exec_ssh_user", "root"),
+                    ("code_exec_ssh_pass", "toor"),
+                ]
+            },
+        }
+    )
+
+
+def create_agent(config: Dict[str, Any]) -> Agent:
+    """Agent number 1 with every tool in app/python/tools."""
+    agent = Agent(1, build_agent_config(config))
+    agent.set_tools({tool.name: tool for tool in load_tools(agent)})
+
+    # Set use_tools attribute if it exists in the Agent class
+    if hasattr(agent, "use_tools"):
+        setattr(agent, "use_tools", True)
+    if hasattr(agent, "use_memory"):
+        setattr(agent, "use_memory", True)
+    return agent
+
+
+def allowed_file(filename):
+    return (
+        "." in filename
+        and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    )
+
+
+def iter_file_blocks(file_path, on_page=None):
+    """
+    TextBlocks of a PDF, TXT or DOCX file; calls on_page() per PDF page
+    parsed, or once for the other types.
+    """
+    on_page = on_page or (lambda: None)
+    pages = 0
+    for block in iter_blocks(file_path):
+        if block.page is not None:
+            pages += 1
+            on_page()
+        yield block
+    if not pages:
+        on_page()
+
+
+def extract_text_from_file(file_path, on_page=None):
+    """Text of a PDF, TXT or DOCX file; see iter_file_blocks()."""
+    return "\n".join(
+        block.text for block in iter_file_blocks(file_path, on_page)
+    )
+
+
+def ingest_file(rag_system, job, file_path):
+    """
+    Extract, embed and upsert an uploaded file for an IngestionJob. The
+    text is chunked as it is extracted, never held whole.
+    """
+    rag_system.add_blocks(
+        iter_file_blocks(
+            file_path, on_page=lambda: job.advance("pages_parsed")
+        ),
+        file_document_id(file_path),
+        metadata={"filename": job.filename},
+        progress=job.advance,
+    )
+
+
+def upload_path(folder, filename):
+    # Queued uploads of the same name must not overwrite each other
+    return os.path.join(folder, f"{uuid.uuid4().hex}_{filename}")
+
+
+def submit_upload(
+    ingestion_queue, file_path, filename, retry_after
+) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """
+    Queue a saved upload for ingestion; returns the /upload response as
+    (body, status, headers). A full queue answers 429 with Retry-After and
+    a shut down one 503; either way the file is removed again.
+    """
+    try:
+        job = ingestion_queue.submit(file_path, filename)
+    except (QueueFullError, QueueClosedError) as e:
+        os.remove(file_path)
+        logger.warning(f"Rejected upload of {filename}: {str(e)}")
+        if isinstance(e, QueueClosedError):
+            return {"error": str(e)}, 503, {}
+        return (
+            {"error": f"Too many documents are being processed: {str(e)}"},
+            429,
+            {"Retry-After": str(retry_after)},
+        )
+    return (
+        {
+            "message": "File uploaded and queued for processing",
+            "filename": filename,
+            "job_id": job.id,
+            "status_url": f"/upload/{job.id}",
+        },
+        202,
+        {},
+    )
+
+
+# RedisCache connects when imported; the servers decide when that happens
+def load_conversation(conversation_id):
+    from app.python.helpers.redis_cache import RedisCache
+
+    try:
+        return RedisCache.get(f"conversation:{conversation_id}") or []
+    except Exception as e:
+        logger.error(
+            f"Error retrieving conversation history from Redis: {str(e)}"
+        )
+        return []
+
+
+def save_conversation(conversation_id, conversation_history):
+    from app.python.helpers.redis_cache import RedisCache
+
+    try:
+        RedisCache.set(f"conversation:{conversation_id}", conversation_history)
+    except Exception as e:
+        logger.error(f"Error saving conversation history to Redis: {str(e)}")
+
+
+def append_to_conversation(conversation_id, messages):
+    save_conversation(
+        conversation_id, load_conversation(conversation_id) + messages
+    )
+
+
+def query_metadata(result: Dict[str, Any], conversation_id: str):
+    """The "metadata" of a /query response for a router result."""
+    return {
+        "model_used": result.get("model_used", "Unknown"),
+        "task_type": result.get("task_type", "Unknown"),
+        "task_complexity": result.get("task_complexity", "Unknown"),
+        "conversation_id": conversation_id,
+        "response_cache": result.get("response_cache", "bypass"),
+    }
+
+
+def stream_metadata(event: Dict[str, Any], conversation_id: str):
+    """The data of the "done" event of /query/stream."""
+    return {
+        **query_metadata(event, conversation_id),
+        "time_to_first_token": event["time_to_first_token"],
+        "processing_time": event["processing_time"],
+    }
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_query_batch(data: Any, max_items: int) -> List[Dict[str, str]]:
+    """
+    The {"query", "conversation_id"} items of a /query/batch body, with a
+    new conversation id for items without one. Raises ValueError if the
+    body is malformed or holds more than `max_items` items.
+    """
+    items = data.get("queries") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('Expected a non-empty "queries" list')
+    if len(items) > max_items:
+        raise ValueError(f"At most {max_items} queries per batch")
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(
+            item.get("query"), str
+        ):
+            raise ValueError('Every item needs a "query" string')
+        parsed.append(
+            {
+                "query": item["query"],
+                "conversation_id": item.get("conversation_id")
+                or str(uuid.uuid4()),
+            }
+        )
+    return parsed
+
+
+def batch_item_result(
+    index: int, item: Dict[str, str], result: Any
+) -> Dict[str, Any]:
+    """One /query/batch result; `result` is an exception if it failed."""
+    if isinstance(result, Exception):
+        return {
+            "index": index,
+            "error": "An unexpected error occurred",
+            "details": str(result),
+            "conversation_id": item["conversation_id"],
+        }
+    return {
+        "index": index,
+        "response": result.get("content", "No response"),
+        "metadata": query_metadata(result, item["conversation_id"]),
+    }
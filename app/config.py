@@ -12,8 +12,135 @@ ROUTER_THRESHOLD = 0.7
 def load_config() -> Dict[str, Any]:
     return {
         "ROUTER_THRESHOLD": ROUTER_THRESHOLD,
+        "router_keywords_file": os.getenv("ROUTER_KEYWORDS_FILE"),
+        "router_model_file": os.getenv("ROUTER_MODEL_FILE"),
+        "router_model_min_confidence": float(
+            os.getenv("ROUTER_MODEL_MIN_CONFIDENCE", 0.5)
+        ),
+        "router_log_file": os.getenv("ROUTER_LOG_FILE"),
+        "router_hedging_enabled": os.getenv(
+            "ROUTER_HEDGING_ENABLED", "False"
+        ).lower()
+        == "true",
+        "router_hedge_margin": float(os.getenv("ROUTER_HEDGE_MARGIN", 0.1)),
+        "router_hedge_percentile": float(
+            os.getenv("ROUTER_HEDGE_PERCENTILE", 0.95)
+        ),
+        "router_hedge_delay": float(os.getenv("ROUTER_HEDGE_DELAY", 2.0)),
+        "router_cascade_enabled": os.getenv(
+            "ROUTER_CASCADE_ENABLED", "False"
+        ).lower()
+        == "true",
+        "router_cascade_threshold": float(
+            os.getenv("ROUTER_CASCADE_THRESHOLD", 0.6)
+        ),
+        "circuit_breaker_enabled": os.getenv(
+            "CIRCUIT_BREAKER_ENABLED", "True"
+        ).lower()
+        == "true",
+        "circuit_breaker_failure_rate": float(
+            os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", 0.5)
+        ),
+        "circuit_breaker_slow_call_rate": float(
+            os.getenv("CIRCUIT_BREAKER_SLOW_CALL_RATE", 0.8)
+        ),
+        "circuit_breaker_slow_call_seconds": float(
+            os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 30.0)
+        ),
+        "circuit_breaker_min_calls": int(
+            os.getenv("CIRCUIT_BREAKER_MIN_CALLS", 10)
+        ),
+        "circuit_breaker_window_seconds": float(
+            os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", 60.0)
+        ),
+        "circuit_breaker_open_seconds": float(
+            os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", 30.0)
+        ),
+        "router_min_model_headroom": float(
+            os.getenv("ROUTER_MIN_MODEL_HEADROOM", 0.0)
+        ),
+        "llm_scheduler_enabled": os.getenv(
+            "LLM_SCHEDULER_ENABLED", "True"
+        ).lower()
+        == "true",
+        "llm_max_concurrent_calls": int(
+            os.getenv("LLM_MAX_CONCURRENT_CALLS", 16)
+        ),
+        "llm_scheduler_max_wait_seconds": float(
+            os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", 30.0)
+        ),
+        "query_batch_max_items": int(os.getenv("QUERY_BATCH_MAX_ITEMS", 50)),
+        "ingestion_workers": int(os.getenv("INGESTION_WORKERS", 2)),
+        "ingestion_max_queued": int(os.getenv("INGESTION_MAX_QUEUED", 16)),
+        "ingestion_retry_after_seconds": int(
+            os.getenv("INGESTION_RETRY_AFTER_SECONDS", 5)
+        ),
+        "performance_ewma_alpha": float(
+            os.getenv("PERFORMANCE_EWMA_ALPHA", 0.2)
+        ),
+        "performance_min_samples": int(
+            os.getenv("PERFORMANCE_MIN_SAMPLES", 5)
+        ),
+        "response_cache_enabled": os.getenv(
+            "RESPONSE_CACHE_ENABLED", "True"
+        ).lower()
+        == "true",
+        "response_cache_ttl": int(os.getenv("RESPONSE_CACHE_TTL", 3600)),
+        "response_cache_strategies": [
+            strategy.strip()
+            for strategy in os.getenv(
+                "RESPONSE_CACHE_STRATEGIES", "direct_answer"
+            ).split(",")
+            if strategy.strip()
+        ],
+        "response_cache_max_temperature": float(
+            os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", 0.7)
+        ),
+        "semantic_cache_enabled": os.getenv(
+            "SEMANTIC_CACHE_ENABLED", "False"
+        ).lower()
+        == "true",
+        "semantic_cache_threshold": float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95)
+        ),
+        "semantic_cache_ttl": int(os.getenv("SEMANTIC_CACHE_TTL", 3600)),
+        "semantic_cache_max_entries": int(
+            os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000)
+        ),
+        "semantic_cache_embedding_model": os.getenv(
+            "OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002"
+        ),
+        "prewarm_chat_models": os.getenv(
+            "PREWARM_CHAT_MODELS", "False"
+        ).lower()
+        == "true",
         "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),
+        "rate_limit_backend": os.getenv("RATE_LIMIT_BACKEND", "local"),
+        "rate_limit_redis_url": os.getenv(
+            "RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"
+        ),
+        "rate_limit_redis_timeout": float(
+            os.getenv("RATE_LIMIT_REDIS_TIMEOUT", 0.5)
+        ),
+        "rate_limit_redis_retry_seconds": float(
+            os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", 30)
+        ),
+        "rate_limit_redis_headroom_ttl": float(
+            os.getenv("RATE_LIMIT_REDIS_HEADROOM_TTL", 1)
+        ),
         "rate_limit_requests": int(os.getenv("RATE_LIMIT_REQUESTS", 120)),
+        "rate_limit_adaptive": os.getenv("RATE_LIMIT_ADAPTIVE", "True").lower()
+        == "true",
+        "rate_limit_backoff_factor": float(
+            os.getenv("RATE_LIMIT_BACKOFF_FACTOR", 0.5)
+        ),
+        "rate_limit_increase": float(os.getenv("RATE_LIMIT_INCREASE", 0.05)),
+        "model_rate_limits_enabled": os.getenv(
+            "MODEL_RATE_LIMITS_ENABLED", "True"
+        ).lower()
+        == "true",
+        "model_rate_limits_file": os.getenv("MODEL_RATE_LIMITS_FILE"),
+        "model_rate_limits": os.getenv("MODEL_RATE_LIMITS"),
         "rate_limit_seconds": int(os.getenv("RATE_LIMIT_SECONDS", 60)),
         "rate_limit_input_tokens": int(
             os.getenv("RATE_LIMIT_INPUT_TOKENS", 200000)
@@ -24,6 +151,12 @@ def load_config() -> Dict[str, Any]:
         "msgs_keep_max": int(os.getenv("MSGS_KEEP_MAX", 25)),
         "msgs_keep_start": int(os.getenv("MSGS_KEEP_START", 5)),
         "msgs_keep_end": int(os.getenv("MSGS_KEEP_END", 10)),
+        # Unset (0) means the per-model budgets in history_window
+        "history_token_budget": int(os.getenv("HISTORY_TOKEN_BUDGET", 0))
+        or None,
+        "history_summary_tokens": int(
+            os.getenv("HISTORY_SUMMARY_TOKENS", 300)
+        ),
         "response_timeout_seconds": int(
             os.getenv("RESPONSE_TIMEOUT_SECONDS", 60)
         ),
@@ -1,31 +1,54 @@
-import os
-import importlib
+import asyncio
+import json
 import sys
-import inspect
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import threading
+from flask import (
+    Flask,
+    Response,
+    render_template,
+    request,
+    jsonify,
+    send_from_directory,
+    stream_with_context,
+)
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from app.advanced_router import AdvancedRouter
-from app.agent import Agent, AgentConfig
+from app.bootstrap import (
+    UPLOAD_FOLDER,
+    allowed_file,
+    append_to_conversation,
+    batch_item_result,
+    check_environment,
+    create_agent,
+    download_nltk_data,
+    ingest_file,
+    load_conversation,
+    load_tools,
+    parse_query_batch,
+    project_root,
+    query_metadata,
+    save_conversation,
+    sse_event,
+    static_dir,
+    stream_metadata,
+    submit_upload,
+    template_dir,
+    upload_path,
+)
 from app.config import load_config
-from app.python.helpers.tool import Tool
+from app.models import prewarm_chat_models
+from app.python.helpers.ingestion_queue import IngestionQueue
 from app.python.helpers.rag_system import RAGSystem
 import logging
 from dotenv import load_dotenv
 import uuid
-from app.python.helpers.redis_cache import RedisCache
-import PyPDF2
-import docx
-import io
-import nltk
+from app.python.helpers.single_flight import single_flight_stats
 
 # Download NLTK resources
-nltk.download("punkt_tab", quiet=True)
-nltk.download("punkt", quiet=True)
-nltk.download("stopwords", quiet=True)
+download_nltk_data()
 
 # Add the project root to the Python path
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(project_root)
 
 load_dotenv()
@@ -36,147 +59,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load and check environment variables
-perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-pinecone_environment = os.getenv("PINECONE_ENVIRONMENT")
-pinecone_index_name = os.getenv("PINECONE_INDEX_NAME")
-
-logger.info(
-    f"Perplexity API Key: {'Set' if perplexity_api_key else 'Not set'}"
-)
-logger.info(f"Pinecone API Key: {'Set' if pinecone_api_key else 'Not set'}")
-logger.info(f"Pinecone Environment: {pinecone_environment}")
-logger.info(f"Pinecone Index Name: {pinecone_index_name}")
-
-if not perplexity_api_key:
-    logger.warning(
-        "Perplexity API key is not set. Some features may not work properly."
-    )
-
-if not pinecone_api_key or not pinecone_environment or not pinecone_index_name:
-    logger.warning(
-        "One or more Pinecone configuration variables are not set. RAG system may not work properly."
-    )
-
-
-def load_tools(agent):
-    tools_dir = os.path.join(os.path.dirname(__file__), "python", "tools")
-    tools = {
-        obj(agent).name: obj(agent)
-        for filename in os.listdir(tools_dir)
-        if filename.endswith(".py") and filename != "__init__.py"
-        for module_name in [f"app.python.tools.{filename[:-3]}"]
-        for module in [importlib.import_module(module_name)]
-        for _, obj in inspect.getmembers(module)
-        if inspect.isclass(obj) and issubclass(obj, Tool) and obj != Tool
-    }
-    return list(tools.values())
-
+check_environment()
 
 # Load configuration
 config = load_config()
 
-# Set the template folder path
-template_dir = os.path.join(project_root, "app", "templates")
-static_dir = os.path.join(project_root, "app", "static")
-
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 CORS(app)
 
 # Set up file upload configuration
-UPLOAD_FOLDER = os.path.join(project_root, "uploads")
-ALLOWED_EXTENSIONS = {"pdf", "txt", "docx"}
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# Prepare the configuration for AgentConfig
-agent_config_dict = {
-    "chat_model": config["chat_model"],
-    "utility_model": config["utility_model"],
-    "backup_utility_model": config["backup_utility_model"],
-    "embeddings_model": config["embeddings_model"],
-    "perplexity_api_key": perplexity_api_key,
-    "pinecone_api_key": pinecone_api_key,
-    "pinecone_environment": pinecone_environment,
-    "pinecone_index_name": pinecone_index_name,
-    "pinecone_dimension": int(os.getenv("PINECONE_DIMENSION", 1536)),
-    "pinecone_cloud": os.getenv("PINECONE_CLOUD", "aws"),
-    **{
-        key: config.get(key, default)
-        for key, default in [
-            ("memory_subdir", ""),
-            ("auto_memory_count", 3),
-            ("auto_memory_skip", 2),
-            ("rate_limit_seconds", 60),
-            ("rate_limit_requests", 120),
-            ("rate_limit_input_tokens", 200000),
-            ("rate_limit_output_tokens", 200000),
-            ("msgs_keep_max", 25),
-            ("msgs_keep_start", 5),
-            ("msgs_keep_end", 10),
-            ("response_timeout_seconds", 60),
-            ("max_tool_response_length", 3000),
-            ("code_exec_docker_enabled", True),
-            ("code_exec_docker_name", "agent-zero-exe"),
-            ("code_exec_docker_image", "frdel/agent-zero-exe:latest"),
-            ("code_exec_docker_ports", {"22/tcp": 50022}),
-            ("code_exec_docker_volumes", {}),
-            ("code_exec_ssh_enabled", True),
-            ("code_exec_ssh_addr", "localhost"),
-            ("code_exec_ssh_port", 50022),
-            ("code_exec_ssh_user", "root"),
-            ("code_exec_ssh_pass", "toor"),
-        ]
-    },
-}
-
-# Initialize the Agent with a number (1) and the AgentConfig
-agent_config = AgentConfig(**agent_config_dict)
-agent = Agent(1, agent_config)
-
-# Load tools and set them for the agent
-tools = load_tools(agent)
-agent.set_tools({tool.name: tool for tool in tools})
-
-# Set use_tools attribute if it exists in the Agent class
-if hasattr(agent, "use_tools"):
-    setattr(agent, "use_tools", True)
-if hasattr(agent, "use_memory"):
-    setattr(agent, "use_memory", True)
+agent = create_agent(config)
 
 # Initialize RAGSystem
 rag_system = RAGSystem()
 
+# Uploads are extracted, embedded and upserted by background workers
+ingestion_queue = IngestionQueue.from_config(
+    config, lambda job, path: ingest_file(rag_system, job, path)
+)
+
 # Initialize AdvancedRouter with config, agent, and RAGSystem
 router = AdvancedRouter(config, agent, rag_system)
 
+# All router coroutines run on one long-lived event loop: pooled chat-model
+# clients keep async connections that are bound to the loop that opened them
+router_loop = asyncio.new_event_loop()
+threading.Thread(
+    target=router_loop.run_forever, name="router-loop", daemon=True
+).start()
 
-def allowed_file(filename):
-    return (
-        "." in filename
-        and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-    )
 
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, router_loop).result()
+
+
+async def prewarm_router_models():
+    # Pooled clients belong to the loop they are created on
+    return prewarm_chat_models(router.tier_model_configs())
+
+
+if config.get("prewarm_chat_models"):
+    run_async(prewarm_router_models())
 
-def extract_text_from_file(file_path):
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension == ".pdf":
-        with open(file_path, "rb") as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-    elif file_extension == ".txt":
-        with open(file_path, "r", encoding="utf-8") as txt_file:
-            text = txt_file.read()
-    elif file_extension == ".docx":
-        doc = docx.Document(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-    else:
-        raise ValueError(f"Unsupported file type: {file_extension}")
 
-    return text
+def iterate_async(agen):
+    """Drive an async generator on the router loop from a sync generator."""
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_async(agen.aclose())
 
 
 @app.route("/")
@@ -193,31 +130,54 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+        filepath = upload_path(app.config["UPLOAD_FOLDER"], filename)
         file.save(filepath)
 
-        try:
-            text = extract_text_from_file(filepath)
-            rag_system.add_document(text, metadata={"filename": filename})
-
-            return (
-                jsonify(
-                    {
-                        "message": "File uploaded and processed successfully",
-                        "filename": filename,
-                    }
-                ),
-                200,
-            )
-        except Exception as e:
-            logger.error(f"Error processing file: {str(e)}")
-            return jsonify({"error": f"Error processing file: {str(e)}"}), 500
+        body, status, headers = submit_upload(
+            ingestion_queue,
+            filepath,
+            filename,
+            config.get("ingestion_retry_after_seconds", 5),
+        )
+        return jsonify(body), status, headers
     else:
         return jsonify({"error": "File type not allowed"}), 400
 
 
+@app.route("/upload/<job_id>", methods=["GET"])
+def upload_status(job_id):
+    """Status and progress of a queued upload."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify(
+        {
+            "performance": router.get_performance_stats(),
+            "circuit_breakers": router.get_circuit_breaker_stats(),
+            "model_rate_limits": router.model_rate_limiters.snapshot(),
+            "llm_scheduler": router.llm_scheduler.stats(),
+            "ingestion": ingestion_queue.stats(),
+            "response_cache": router.response_cache.stats(),
+            "semantic_cache": (
+                router.semantic_cache.stats()
+                if router.semantic_cache is not None
+                else None
+            ),
+            "single_flight": {
+                "router": router.single_flight.stats(),
+                **single_flight_stats(),
+            },
+        }
+    )
+
+
 @app.route("/query", methods=["POST"])
-async def query():
+def query():
     data = request.json
     if data is None:
         return jsonify({"error": "Invalid JSON data"}), 400
@@ -226,53 +186,33 @@ async def query():
 
     logger.info(f"Processing advanced query: {user_input[:20]}...")
 
-    try:
-        conversation_history = (
-            RedisCache.get(f"conversation:{conversation_id}") or []
-        )
-    except Exception as e:
-        logger.error(
-            f"Error retrieving conversation history from Redis: {str(e)}"
-        )
-        conversation_history = []
-
+    conversation_history = load_conversation(conversation_id)
     conversation_history.append({"role": "user", "content": user_input})
 
     try:
-        result = await router.process(
-            user_input, "chat", {"conversation_history": conversation_history}
+        result = run_async(
+            router.process(
+                user_input,
+                {
+                    "conversation_history": conversation_history,
+                    "conversation_id": conversation_id,
+                },
+            )
         )
         logger.info(f"Router process result: {result}")
 
-        selected_model = result.get("model_used", "Unknown")
         response_content = result.get("content", "No response")
-        task_type = result.get("task_type", "Unknown")
-        task_complexity = result.get("task_complexity", "Unknown")
+        response_metadata = query_metadata(result, conversation_id)
 
-        logger.info(f"Selected model: {selected_model}")
-        logger.info(f"Task type: {task_type}")
-        logger.info(f"Task complexity: {task_complexity}")
+        logger.info(f"Selected model: {response_metadata['model_used']}")
+        logger.info(f"Task type: {response_metadata['task_type']}")
+        logger.info(f"Task complexity: {response_metadata['task_complexity']}")
         logger.info(f"Response content: {response_content[:100]}...")
 
         conversation_history.append(
             {"role": "assistant", "content": response_content}
         )
-
-        try:
-            RedisCache.set(
-                f"conversation:{conversation_id}", conversation_history
-            )
-        except Exception as e:
-            logger.error(
-                f"Error saving conversation history to Redis: {str(e)}"
-            )
-
-        response_metadata = {
-            "model_used": selected_model,
-            "task_type": task_type,
-            "task_complexity": task_complexity,
-            "conversation_id": conversation_id,
-        }
+        save_conversation(conversation_id, conversation_history)
 
         return jsonify(
             {
@@ -292,6 +232,138 @@ async def query():
         )
 
 
+@app.route("/query/stream", methods=["POST"])
+def query_stream():
+    """
+    Server-Sent Events version of /query: "token" events carry text as the
+    model produces it, a final "done" event carries the metadata with time
+    to first token and total time. The conversation is saved once the
+    stream completes.
+    """
+    data = request.json
+    if data is None:
+        return jsonify({"error": "Invalid JSON data"}), 400
+    user_input = data.get("query", "")
+    conversation_id = data.get("conversation_id", str(uuid.uuid4()))
+
+    logger.info(f"Streaming advanced query: {user_input[:20]}...")
+
+    conversation_history = load_conversation(conversation_id)
+    conversation_history.append({"role": "user", "content": user_input})
+
+    def generate():
+        try:
+            for event in iterate_async(
+                router.astream_process(
+                    user_input,
+                    {
+                        "conversation_history": list(conversation_history),
+                        "conversation_id": conversation_id,
+                    },
+                )
+            ):
+                if event["event"] == "token":
+                    yield sse_event("token", {"content": event["content"]})
+                    continue
+
+                conversation_history.append(
+                    {"role": "assistant", "content": event["content"]}
+                )
+                save_conversation(conversation_id, conversation_history)
+                logger.info(
+                    f"Streamed {event['model_used']} response, "
+                    f"ttft {event['time_to_first_token']}s, "
+                    f"total {event['processing_time']:.2f}s"
+                )
+                yield sse_event(
+                    "done", stream_metadata(event, conversation_id)
+                )
+        except Exception as e:
+            logger.error(
+                f"Unexpected error in streaming query: {str(e)}",
+                exc_info=True,
+            )
+            yield sse_event(
+                "error",
+                {"error": "An unexpected error occurred", "details": str(e)},
+            )
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/query/batch", methods=["POST"])
+def query_batch():
+    """
+    Answer a batch of {"query", "conversation_id"} items in one request.
+    The batch is routed at once and its model calls run concurrently under
+    the usual rate limits. Results, or per-item errors, come back in
+    request order under "results"; with "stream": true each one is sent as
+    an NDJSON line as soon as it finishes, tagged with its "index".
+    """
+    data = request.json
+    if data is None:
+        return jsonify({"error": "Invalid JSON data"}), 400
+    try:
+        items = parse_query_batch(
+            data, config.get("query_batch_max_items", 50)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    logger.info(f"Processing batch of {len(items)} queries")
+
+    batch = [
+        (
+            item["query"],
+            {
+                "conversation_history": load_conversation(
+                    item["conversation_id"]
+                )
+                + [{"role": "user", "content": item["query"]}],
+                "conversation_id": item["conversation_id"],
+            },
+        )
+        for item in items
+    ]
+
+    def results():
+        for index, result in iterate_async(router.process_many(batch)):
+            item = items[index]
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Error in batch query {index}: {str(result)}",
+                    exc_info=result,
+                )
+            else:
+                append_to_conversation(
+                    item["conversation_id"],
+                    [
+                        {"role": "user", "content": item["query"]},
+                        {
+                            "role": "assistant",
+                            "content": result.get("content", "No response"),
+                        },
+                    ],
+                )
+            yield batch_item_result(index, item, result)
+
+    if data.get("stream"):
+        return Response(
+            stream_with_context(
+                json.dumps(result) + "\n" for result in results()
+            ),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return jsonify(
+        {"results": sorted(results(), key=lambda result: result["index"])}
+    )
+
+
 if __name__ == "__main__":
     logger.info("Loading tools...")
     loaded_tools = load_tools(agent)
@@ -1,14 +1,44 @@
+import asyncio
+from collections import OrderedDict
 from dotenv import load_dotenv
+from app.config import load_config
+from app.python.helpers.llm_scheduler import LLMScheduler
+from app.python.helpers.model_rate_limits import (
+    ModelRateLimiterRegistry,
+    RateLimitedChatModel,
+)
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_anthropic import ChatAnthropic
 from langchain_groq import ChatGroq
+from typing import Any, Iterable, List, Optional, Tuple
+import hashlib
 import logging
+import os
+import threading
 
 # Load environment variables
 load_dotenv()
 
 # Configuration
 DEFAULT_TEMPERATURE = 0.7
+CHAT_MODEL_POOL_SIZE = int(os.getenv("CHAT_MODEL_POOL_SIZE", 32))
+
+# Environment variables that change how a provider client connects
+PROVIDER_ENV = {
+    "openai": ("OPENAI_API_KEY", "OPENAI_BASE_URL", "OPENAI_ORGANIZATION"),
+    "anthropic": ("ANTHROPIC_API_KEY", "ANTHROPIC_API_URL"),
+    "groq": ("GROQ_API_KEY", "GROQ_API_BASE"),
+}
+
+# Reused clients keep their HTTP keep-alive connections and TLS sessions
+_chat_model_pool: "OrderedDict[Tuple, Any]" = OrderedDict()
+_chat_model_pool_lock = threading.Lock()
+
+_model_rate_limiters: Optional[ModelRateLimiterRegistry] = None
+_model_rate_limiters_lock = threading.Lock()
+
+_llm_scheduler: Optional[LLMScheduler] = None
+_llm_scheduler_lock = threading.Lock()
 
 
 def get_model_list():
@@ -27,14 +57,112 @@ def get_model_list():
     ]
 
 
-def get_chat_model(model_name_or_instance, temperature=DEFAULT_TEMPERATURE):
-    logging.info(
-        "get_chat_model called with model_name_or_instance: "
-        f"{model_name_or_instance}"
+# Models of comparable capability, most preferred first. A model can stand
+# in for any other model of its group while that one's provider is down.
+EQUIVALENT_MODELS = (
+    ("llama-3.1-8b-instant", "gpt-4o-mini"),
+    ("llama-3.1-70b-versatile", "gpt-4o", "claude-3-5-sonnet-20240620"),
+    ("claude-3-opus-20240229", "gpt-4o", "claude-3-5-sonnet-20240620"),
+    (
+        "llama3-groq-70b-8192-tool-use-preview",
+        "gpt-4o",
+        "claude-3-5-sonnet-20240620",
+    ),
+    ("llama3-groq-8b-8192-tool-use-preview", "gpt-4o-mini"),
+)
+
+
+def get_equivalent_models(model_name: str) -> List[str]:
+    """Models from get_model_list() that can replace `model_name`."""
+    available = set(get_model_list())
+    equivalents: List[str] = []
+    for group in EQUIVALENT_MODELS:
+        if model_name in group:
+            equivalents.extend(
+                model
+                for model in group
+                if model != model_name
+                and model in available
+                and model not in equivalents
+            )
+    return equivalents
+
+
+def get_model_rate_limiters() -> ModelRateLimiterRegistry:
+    """The process-wide per-model limiters, configured on first use."""
+    global _model_rate_limiters
+    with _model_rate_limiters_lock:
+        if _model_rate_limiters is None:
+            _model_rate_limiters = ModelRateLimiterRegistry.from_config(
+                load_config()
+            )
+        return _model_rate_limiters
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """The process-wide scheduler of model calls, configured on first use."""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler.from_config(load_config())
+        return _llm_scheduler
+
+
+def get_provider(model_name: str) -> str:
+    if model_name.startswith("gpt-"):
+        return "openai"
+    elif model_name.startswith("claude-"):
+        return "anthropic"
+    elif model_name.startswith("llama-") or model_name.startswith(
+        "llama3-groq-"
+    ):
+        return "groq"
+    raise ValueError(f"Unsupported chat model: {model_name}")
+
+
+def _provider_config(provider: str) -> Tuple:
+    # Secrets are only kept as a fingerprint in the pool key
+    return tuple(
+        hashlib.sha256(os.getenv(name, "").encode()).hexdigest()[:16]
+        for name in PROVIDER_ENV[provider]
     )
 
+
+def _create_chat_model(
+    model_name: str,
+    provider: str,
+    temperature: float,
+    max_tokens: Optional[int],
+):
+    kwargs = {"model": model_name, "temperature": temperature}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if provider == "openai":
+        # The rate-limit headers feed the model's adaptive limiter
+        return ChatOpenAI(include_response_headers=True, **kwargs)
+    elif provider == "anthropic":
+        return ChatAnthropic(**kwargs)
+    else:
+        return ChatGroq(**kwargs)
+
+
+def get_chat_model(
+    model_name_or_instance,
+    temperature=DEFAULT_TEMPERATURE,
+    max_tokens: Optional[int] = None,
+):
+    """
+    Return a chat model client, reusing a pooled instance when one exists
+    for the same model, temperature, max_tokens and provider settings.
+    Models with rate limits come wrapped so every call waits for quota.
+
+    Async clients keep connections bound to the event loop they first ran
+    on, so coroutines get the clients of their own running loop; clients
+    of loops that have been closed are dropped.
+    """
     if isinstance(
-        model_name_or_instance, (ChatOpenAI, ChatAnthropic, ChatGroq)
+        model_name_or_instance,
+        (ChatOpenAI, ChatAnthropic, ChatGroq, RateLimitedChatModel),
     ):
         logging.info("Returning existing model instance")
         return model_name_or_instance
@@ -48,27 +176,79 @@ def get_chat_model(model_name_or_instance, temperature=DEFAULT_TEMPERATURE):
         )
 
     model_name = model_name_or_instance
-    logging.info(f"Creating new model instance for: {model_name}")
+    try:
+        provider = get_provider(model_name)
+    except ValueError:
+        logging.error(f"Unsupported chat model: {model_name}")
+        raise
 
     try:
-        if model_name.startswith("gpt-"):
-            return ChatOpenAI(model=model_name, temperature=temperature)
-        elif model_name.startswith("claude-"):
-            return ChatAnthropic(model=model_name, temperature=temperature)
-        elif model_name.startswith("llama-") or model_name.startswith(
-            "llama3-groq-"
-        ):
-            return ChatGroq(model=model_name, temperature=temperature)
-        else:
-            logging.error(f"Unsupported chat model: {model_name}")
-            raise ValueError(f"Unsupported chat model: {model_name}")
-    except Exception as e:
-        logging.error(
-            f"Error creating model instance for {model_name}: {str(e)}"
-        )
-        raise ValueError(
-            f"Error creating model instance for {model_name}: {str(e)}"
-        ) from e
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = (
+        (model_name, temperature, max_tokens, provider)
+        + _provider_config(provider)
+        + (loop,)
+    )
+    # The lock is never held across an await, so this is safe to call from
+    # both worker threads and coroutines
+    with _chat_model_pool_lock:
+        model = _chat_model_pool.get(key)
+        if model is not None:
+            _chat_model_pool.move_to_end(key)
+            return model
+
+        for stale in [
+            k
+            for k in _chat_model_pool
+            if k[-1] is not None and k[-1].is_closed()
+        ]:
+            del _chat_model_pool[stale]
+
+        logging.info(f"Creating new model instance for: {model_name}")
+        try:
+            model = _create_chat_model(
+                model_name, provider, temperature, max_tokens
+            )
+        except Exception as e:
+            logging.error(
+                f"Error creating model instance for {model_name}: {str(e)}"
+            )
+            raise ValueError(
+                f"Error creating model instance for {model_name}: {str(e)}"
+            ) from e
+        limiter = get_model_rate_limiters().get(model_name)
+        if limiter is not None:
+            model = RateLimitedChatModel(model, limiter)
+
+        _chat_model_pool[key] = model
+        while len(_chat_model_pool) > CHAT_MODEL_POOL_SIZE:
+            _chat_model_pool.popitem(last=False)
+        return model
+
+
+def prewarm_chat_models(
+    configs: Iterable[Tuple[str, float, Optional[int]]],
+) -> int:
+    """
+    Create pooled clients for (model, temperature, max_tokens) triples at
+    startup so the first request does not pay for client construction.
+    Models that cannot be created (e.g. missing API key) are skipped.
+    """
+    warmed = 0
+    for model_name, temperature, max_tokens in configs:
+        try:
+            get_chat_model(model_name, temperature, max_tokens)
+            warmed += 1
+        except ValueError as e:
+            logging.warning(f"Could not pre-warm {model_name}: {str(e)}")
+    return warmed
+
+
+def clear_chat_model_pool() -> None:
+    with _chat_model_pool_lock:
+        _chat_model_pool.clear()
 
 
 def get_tool_use_model(temperature=DEFAULT_TEMPERATURE):
@@ -0,0 +1,345 @@
+"""
+AdaptiveRateLimiter: a RateLimiter whose budgets follow what the provider
+reports instead of only the configured limits.
+
+OpenAI, Groq and Perplexity send x-ratelimit-remaining-requests/-tokens and
+x-ratelimit-reset-requests/-tokens with their responses, Anthropic sends
+anthropic-ratelimit-*-remaining/-reset, and all of them may add retry-after
+to a 429. The limiter
+
+- holds calls until the provider's reset once it reports no requests left,
+  or fewer tokens left than the next call needs,
+- pauses every call for the retry-after hint (or `throttle_seconds`) after
+  a 429,
+- shrinks its budgets multiplicatively on each 429 (down to `min_scale` of
+  the configured limits) and grows them back additively, by `increase` of
+  the configured limits per successful call.
+
+wait_for_provider and stop_if_throttled_for plug the limiter into tenacity
+retries, so a retry waits out the provider's pause instead of hitting it
+again and gives up when the provider asks for a longer pause than allowed;
+ensure_available() turns new calls away during such a pause.
+"""
+
+import email.utils
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from tenacity import RetryCallState
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+from .rate_limiter import CallRecord, RateLimiter
+
+_DURATION = re.compile(r"(?:\d+(?:\.\d+)?(?:ms|h|m|s))+")
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+REMAINING_REQUESTS_HEADERS = (
+    "x-ratelimit-remaining-requests",
+    "anthropic-ratelimit-requests-remaining",
+)
+REQUESTS_RESET_HEADERS = (
+    "x-ratelimit-reset-requests",
+    "anthropic-ratelimit-requests-reset",
+)
+# The tightest of the token budgets is the one that matters
+REMAINING_TOKENS_HEADERS = (
+    "x-ratelimit-remaining-tokens",
+    "anthropic-ratelimit-tokens-remaining",
+    "anthropic-ratelimit-input-tokens-remaining",
+)
+TOKENS_RESET_HEADERS = (
+    "x-ratelimit-reset-tokens",
+    "anthropic-ratelimit-tokens-reset",
+    "anthropic-ratelimit-input-tokens-reset",
+)
+
+
+class ProviderThrottledError(RuntimeError):
+    """Raised instead of calling a provider that asked for a long pause."""
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Seconds until a reset or retry-after value: plain seconds ("7"), Go
+    style durations ("1m30s", "20ms"), RFC 3339 timestamps (Anthropic) or
+    HTTP dates. None if the value cannot be read.
+    """
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    if _DURATION.fullmatch(value):
+        return sum(
+            float(amount) * _UNIT_SECONDS[unit]
+            for amount, unit in _DURATION_PART.findall(value)
+        )
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+@dataclass
+class RateLimitHints:
+    remaining_requests: Optional[int] = None
+    requests_reset: Optional[float] = None
+    remaining_tokens: Optional[int] = None
+    tokens_reset: Optional[float] = None
+    retry_after: Optional[float] = None
+
+
+def _first(
+    headers: Dict[str, str], names: Tuple[str, ...], parse: Callable
+) -> Optional[Any]:
+    values = []
+    for name in names:
+        if name in headers:
+            try:
+                value = parse(headers[name])
+            except ValueError:
+                continue
+            if value is not None:
+                values.append(value)
+    return min(values) if values else None
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> RateLimitHints:
+    headers = {name.lower(): value for name, value in headers.items()}
+    retry_after = None
+    if "retry-after-ms" in headers:
+        try:
+            retry_after = float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if retry_after is None and "retry-after" in headers:
+        retry_after = parse_duration(headers["retry-after"])
+    return RateLimitHints(
+        remaining_requests=_first(headers, REMAINING_REQUESTS_HEADERS, int),
+        requests_reset=_first(headers, REQUESTS_RESET_HEADERS, parse_duration),
+        remaining_tokens=_first(headers, REMAINING_TOKENS_HEADERS, int),
+        tokens_reset=_first(headers, TOKENS_RESET_HEADERS, parse_duration),
+        retry_after=retry_after,
+    )
+
+
+def rate_limit_error_headers(error: BaseException) -> Optional[Mapping]:
+    """The response headers of a 429 error from a provider SDK, else None."""
+    status = getattr(error, "status_code", None) or getattr(
+        error, "status", None
+    )
+    if status != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(
+        error, "headers", None
+    )
+    return headers or {}
+
+
+def response_headers(response: Any) -> Optional[Mapping]:
+    """Headers LangChain kept on a chat response, if it kept any."""
+    metadata = getattr(response, "response_metadata", None) or {}
+    return metadata.get("headers")
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    def __init__(
+        self,
+        max_calls,
+        max_input_tokens,
+        max_output_tokens,
+        window_seconds,
+        backoff_factor: float = 0.5,
+        increase: float = 0.05,
+        min_scale: float = 0.05,
+        throttle_seconds: float = 1.0,
+    ):
+        super().__init__(
+            max_calls, max_input_tokens, max_output_tokens, window_seconds
+        )
+        self.configured_limits = (
+            max_calls,
+            max_input_tokens,
+            max_output_tokens,
+        )
+        self.backoff_factor = backoff_factor
+        self.increase = increase
+        self.min_scale = min_scale
+        self.throttle_seconds = throttle_seconds
+        self.scale = 1.0
+        self.throttled = 0
+        self._paused_until = 0.0
+        # (remaining, valid until) as last reported by the provider
+        self._requests_left: Optional[Tuple[int, float]] = None
+        self._tokens_left: Optional[Tuple[int, float]] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        max_calls: int,
+        max_input_tokens: int,
+        max_output_tokens: int,
+        window_seconds: float,
+    ) -> "AdaptiveRateLimiter":
+        return cls(
+            max_calls,
+            max_input_tokens,
+            max_output_tokens,
+            window_seconds,
+            backoff_factor=config.get("rate_limit_backoff_factor", 0.5),
+            increase=config.get("rate_limit_increase", 0.05),
+        )
+
+    def _set_scale(self, scale: float) -> None:
+        self.scale = min(max(scale, self.min_scale), 1.0)
+        self.max_calls, self.max_input_tokens, self.max_output_tokens = (
+            max(1, int(limit * self.scale)) if limit > 0 else 0
+            for limit in self.configured_limits
+        )
+
+    def _provider_wait(self, current_time: float, input_tokens: int) -> float:
+        wait = self._paused_until - current_time
+        if self._requests_left is not None:
+            remaining, until = self._requests_left
+            if current_time >= until:
+                self._requests_left = None
+            elif remaining < 1:
+                wait = max(wait, until - current_time)
+        if self._tokens_left is not None:
+            remaining, until = self._tokens_left
+            if current_time >= until:
+                self._tokens_left = None
+            elif remaining < max(input_tokens, 1):
+                wait = max(wait, until - current_time)
+        return max(wait, 0.0)
+
+    def _wait_time(self, current_time: float, new_input_tokens: int) -> float:
+        wait = self._provider_wait(current_time, new_input_tokens)
+        if wait > 0:
+            return wait
+        return super()._wait_time(current_time, new_input_tokens)
+
+    def _admit(
+        self, current_time: float, input_tokens: int
+    ) -> Tuple[Optional[CallRecord], float]:
+        record, wait_time = super()._admit(current_time, input_tokens)
+        if record is not None:
+            # Spend the provider's budget until it reports again
+            if self._requests_left is not None:
+                remaining, until = self._requests_left
+                self._requests_left = (remaining - 1, until)
+            if self._tokens_left is not None:
+                remaining, until = self._tokens_left
+                self._tokens_left = (remaining - input_tokens, until)
+        return record, wait_time
+
+    def _apply_hints(self, hints: RateLimitHints, current_time: float) -> None:
+        if hints.remaining_requests is not None:
+            self._requests_left = (
+                hints.remaining_requests,
+                current_time + (hints.requests_reset or self.window_seconds),
+            )
+        if hints.remaining_tokens is not None:
+            self._tokens_left = (
+                hints.remaining_tokens,
+                current_time + (hints.tokens_reset or self.window_seconds),
+            )
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Take in a successful response (and its headers, if known)."""
+        hints = parse_rate_limit_headers(headers or {})
+        with self._lock:
+            self._apply_hints(hints, self.clock())
+            self._set_scale(self.scale + self.increase)
+            # Waiters may fit the grown budget sooner than they planned
+            if self._waiters:
+                self._waiters[0].notify()
+
+    def on_throttled(
+        self,
+        headers: Optional[Mapping[str, str]] = None,
+        retry_after: Optional[float] = None,
+    ) -> float:
+        """Back off after a 429; returns the pause in seconds."""
+        hints = parse_rate_limit_headers(headers or {})
+        pause = retry_after or hints.retry_after or self.throttle_seconds
+        with self._lock:
+            current_time = self.clock()
+            self._apply_hints(hints, current_time)
+            self._paused_until = max(self._paused_until, current_time + pause)
+            self._set_scale(self.scale * self.backoff_factor)
+            self.throttled += 1
+        return pause
+
+    def report(self, error: BaseException) -> bool:
+        """on_throttled() if `error` is a 429; says whether it was one."""
+        headers = rate_limit_error_headers(error)
+        if headers is None:
+            return False
+        self.on_throttled(headers)
+        return True
+
+    def ensure_available(self, max_pause: float) -> None:
+        """Raise ProviderThrottledError if calls are paused for > max_pause."""
+        pause = self.pause_remaining()
+        if pause > max_pause:
+            raise ProviderThrottledError(
+                f"Provider is throttled for another {pause:.1f}s"
+            )
+
+    def pause_remaining(self) -> float:
+        """Seconds until the provider accepts calls again (0: it does)."""
+        with self._lock:
+            return self._provider_wait(self.clock(), 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            current_time = self.clock()
+            return {
+                "scale": self.scale,
+                "max_calls": self.max_calls,
+                "max_input_tokens": self.max_input_tokens,
+                "max_output_tokens": self.max_output_tokens,
+                "throttled": self.throttled,
+                "paused_for": self._provider_wait(current_time, 0),
+                "provider_requests_left": (
+                    self._requests_left[0] if self._requests_left else None
+                ),
+                "provider_tokens_left": (
+                    self._tokens_left[0] if self._tokens_left else None
+                ),
+            }
+
+
+class wait_for_provider(wait_base):
+    """Wait as `fallback` would, but at least until the provider is ready."""
+
+    def __init__(self, limiter: AdaptiveRateLimiter, fallback: wait_base):
+        self.limiter = limiter
+        self.fallback = fallback
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        return max(self.fallback(retry_state), self.limiter.pause_remaining())
+
+
+class stop_if_throttled_for(stop_base):
+    """Stop when the provider asks for a pause longer than `max_pause`."""
+
+    def __init__(self, limiter: AdaptiveRateLimiter, max_pause: float):
+        self.limiter = limiter
+        self.max_pause = max_pause
+
+    def __call__(self, retry_state: RetryCallState) -> bool:
+        return self.limiter.pause_remaining() > self.max_pause
@@ -0,0 +1,84 @@
+"""
+Cheap local confidence heuristics for model answers.
+
+Used by the cascade strategy in AdvancedRouter to decide whether a low-tier
+answer is good enough or the query should be escalated. Nothing here calls a
+model; scoring a reply costs a few regex scans.
+"""
+
+import re
+from typing import List, Tuple
+
+REFUSAL_PATTERNS = re.compile(
+    r"\b(?:"
+    r"i(?:'m| am) (?:sorry|unable|not able)"
+    r"|i can(?:'t|not) (?:help|assist|provide|answer|do that)"
+    r"|as an ai(?: language model)?"
+    r"|i don't have (?:access|the ability)"
+    r"|i do not have (?:access|the ability)"
+    r")\b",
+    re.IGNORECASE,
+)
+
+UNCERTAINTY_PATTERNS = re.compile(
+    r"\b(?:"
+    r"i(?:'m| am) not (?:sure|certain)"
+    r"|i don't know"
+    r"|i do not know"
+    r"|not entirely sure"
+    r"|i(?:'m| am) unsure"
+    r"|i think it might"
+    r"|it(?: is|'s) unclear"
+    r"|i cannot be certain"
+    r")\b",
+    re.IGNORECASE,
+)
+
+CODE_FENCE = re.compile(r"^\s*```", re.MULTILINE)
+
+MIN_ANSWER_CHARS = 20
+
+REFUSAL_PENALTY = 0.6
+UNCERTAINTY_PENALTY = 0.3
+SHORT_ANSWER_PENALTY = 0.4
+MALFORMED_CODE_PENALTY = 0.4
+MISSING_CODE_PENALTY = 0.2
+
+
+def score_answer(
+    query: str, answer: str, task_type: str = "general"
+) -> Tuple[float, List[str]]:
+    """
+    Score an answer between 0 (certainly bad) and 1 (no warning signs).
+
+    Returns the score and the list of heuristics that fired.
+    """
+    reasons: List[str] = []
+    score = 1.0
+    text = answer.strip()
+
+    if not text:
+        return 0.0, ["empty"]
+
+    # Short replies are fine for greetings, suspicious for real questions
+    if task_type != "casual" and len(text) < min(MIN_ANSWER_CHARS, len(query)):
+        score -= SHORT_ANSWER_PENALTY
+        reasons.append("too_short")
+
+    if REFUSAL_PATTERNS.search(text):
+        score -= REFUSAL_PENALTY
+        reasons.append("refusal")
+
+    if UNCERTAINTY_PATTERNS.search(text):
+        score -= UNCERTAINTY_PENALTY
+        reasons.append("uncertain")
+
+    fences = len(CODE_FENCE.findall(text))
+    if fences % 2:
+        score -= MALFORMED_CODE_PENALTY
+        reasons.append("malformed_code_block")
+    elif task_type == "coding" and not fences:
+        score -= MISSING_CODE_PENALTY
+        reasons.append("missing_code_block")
+
+    return max(score, 0.0), reasons
@@ -0,0 +1,246 @@
+"""
+Chunked document ingestion: split a document into overlapping chunks, embed
+them in batches and upsert the vectors in batches.
+
+chunk_blocks() cuts chunks of at most `max_tokens` (estimated at four
+characters per token, as elsewhere) at the best boundary it finds in the
+second half of the window: a paragraph break, then a sentence end, then a
+line break, then a space. Consecutive chunks share about `overlap_tokens`
+so that a passage cut in two is still found whole in one of them. It reads
+the TextBlocks of a document as they are extracted and only keeps the text
+of the chunk being cut, so a large upload is never held whole in memory;
+chunk_text() does the same for a string.
+
+ingest_chunks() sends `embed_batch_size` chunks per embedding request with
+up to `embed_concurrency` requests in flight, and upserts
+`upsert_batch_size` vectors per request as the embeddings come back, in
+chunk order. Every vector's metadata carries the chunk text, its offset in
+the document and the document's own metadata (e.g. the filename).
+"""
+
+import hashlib
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .document_extractor import TextBlock
+from .token_estimate import CHARS_PER_TOKEN
+
+_BREAKS = (
+    re.compile(r"\n\s*\n"),
+    re.compile(r"[.!?][\"')\]]?\s"),
+    re.compile(r"\n"),
+    re.compile(r"\s"),
+)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    text: str
+    # Where the chunk starts in the document text
+    offset: int
+    index: int
+    # 1-based PDF page the chunk starts on, else None
+    page: Optional[int] = None
+
+
+def document_id(text: str) -> str:
+    """Stable id of a document; re-ingesting it replaces its vectors."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def file_document_id(path: str) -> str:
+    """document_id() of a file, from its bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(1 << 20), b""):
+            digest.update(data)
+    return digest.hexdigest()[:24]
+
+
+def _break_before(text: str, low: int, high: int) -> int:
+    """End of the best chunk boundary in text[low:high], else high."""
+    for pattern in _BREAKS:
+        last = None
+        for last in pattern.finditer(text, low, high):
+            pass
+        if last is not None:
+            return last.end()
+    return high
+
+
+def _skip_space(text: str, position: int) -> int:
+    while position < len(text) and text[position].isspace():
+        position += 1
+    return position
+
+
+def chunk_blocks(
+    blocks: Iterable[TextBlock],
+    max_tokens: int = 400,
+    overlap_tokens: int = 50,
+) -> Iterator[Chunk]:
+    """
+    Chunks of the text of `blocks` ("\\n".join of the block texts, as
+    extract_text() builds it), cut as the blocks arrive. Offsets are in
+    that text; each chunk carries the page of the block it starts in.
+    """
+    if max_tokens <= 0 or not 0 <= overlap_tokens * 2 < max_tokens:
+        raise ValueError(
+            "Chunks need max_tokens > 0 and an overlap under half of it"
+        )
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    # Text not yet chunked (plus the overlap), starting at `base`
+    buffer = ""
+    base = 0
+    # Chunk start within the buffer
+    start = 0
+    index = 0
+    # (offset, page) of the blocks from the one holding `start` on
+    pages: Deque[Tuple[int, Optional[int]]] = deque()
+
+    def cut(final: bool) -> Iterator[Chunk]:
+        nonlocal start, index
+        while True:
+            start = _skip_space(buffer, start)
+            end = start + max_chars
+            if end >= len(buffer):
+                # Only the last chunk may end with the text
+                if not final or start >= len(buffer):
+                    return
+                end = len(buffer)
+            else:
+                end = _break_before(buffer, start + max_chars // 2, end)
+            while len(pages) > 1 and pages[1][0] <= base + start:
+                pages.popleft()
+            yield Chunk(
+                buffer[start:end].rstrip(),
+                base + start,
+                index,
+                pages[0][1] if pages else None,
+            )
+            index += 1
+            if end >= len(buffer):
+                start = end
+                return
+            # Overlap the previous chunk, starting on a word
+            next_start = end - overlap_chars
+            if overlap_chars and not buffer[next_start - 1].isspace():
+                space = _BREAKS[-1].search(buffer, next_start, end)
+                next_start = space.start() if space else next_start
+            start = next_start
+
+    first = True
+    for block in blocks:
+        if not first:
+            buffer += "\n"
+        first = False
+        pages.append((base + len(buffer), block.page))
+        buffer += block.text
+        yield from cut(final=False)
+        base += start
+        buffer = buffer[start:]
+        start = 0
+    yield from cut(final=True)
+
+
+def chunk_text(
+    text: str, max_tokens: int = 400, overlap_tokens: int = 50
+) -> Iterator[Chunk]:
+    return chunk_blocks([TextBlock(text, 0)], max_tokens, overlap_tokens)
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_chunks(
+    chunks: Iterable[Chunk],
+    embed: Callable[[List[str]], List[List[float]]],
+    upsert: Callable[[List[Dict[str, Any]]], Any],
+    id_prefix: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    embed_batch_size: int = 64,
+    embed_concurrency: int = 4,
+    upsert_batch_size: int = 100,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> int:
+    """
+    Embed and upsert `chunks`; returns the number of vectors upserted.
+    `embed` is an embed_documents-style function, `upsert` takes a list of
+    {"id", "values", "metadata"} vectors. `progress(counter, count)` hears
+    about "chunks_embedded" and "vectors_upserted".
+    """
+    progress = progress or (lambda counter, count: None)
+    metadata = metadata or {}
+    pending: List[Dict[str, Any]] = []
+    upserted = 0
+
+    def flush(size: int) -> None:
+        nonlocal upserted
+        while len(pending) >= size and pending:
+            batch = pending[:upsert_batch_size]
+            upsert(batch)
+            del pending[: len(batch)]
+            upserted += len(batch)
+            progress("vectors_upserted", len(batch))
+
+    def collect(batch: List[Chunk], embeddings: List[List[float]]) -> None:
+        progress("chunks_embedded", len(batch))
+        pending.extend(
+            {
+                "id": f"{id_prefix}_{chunk.index}",
+                "values": values,
+                "metadata": {
+                    **metadata,
+                    "text": chunk.text,
+                    "offset": chunk.offset,
+                    "chunk": chunk.index,
+                    # Vector stores reject null metadata values
+                    **({"page": chunk.page} if chunk.page is not None else {}),
+                },
+            }
+            for chunk, values in zip(batch, embeddings)
+        )
+        flush(upsert_batch_size)
+
+    in_flight: Deque[Tuple[List[Chunk], Future]] = deque()
+    with ThreadPoolExecutor(
+        embed_concurrency, thread_name_prefix="embed"
+    ) as executor:
+        try:
+            for batch in _batches(chunks, embed_batch_size):
+                if len(in_flight) >= embed_concurrency:
+                    done, future = in_flight.popleft()
+                    collect(done, future.result())
+                in_flight.append(
+                    (batch, executor.submit(embed, [c.text for c in batch]))
+                )
+            while in_flight:
+                done, future = in_flight.popleft()
+                collect(done, future.result())
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+    flush(1)
+    return upserted
@@ -0,0 +1,221 @@
+"""
+CircuitBreaker: stop sending traffic to a provider that is failing or slow.
+
+Each breaker keeps the outcomes of recent calls in a sliding time window.
+Once enough calls were made and the share of errors or of slow calls
+reaches its threshold, the breaker opens and the provider is skipped. After
+`open_seconds` it turns half-open and lets a few probe calls through: a
+fast success closes it again, anything else re-opens it.
+
+AdvancedRouter keeps one breaker per provider in a CircuitBreakerRegistry
+and substitutes an equivalent model from another provider while a breaker
+is open.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is refused because its circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_rate_threshold: float = 0.8,
+        slow_call_seconds: float = 30.0,
+        min_calls: int = 10,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (time, error, slow) of recent calls, oldest first
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._errors = 0
+        self._slow = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, error, slow = self._calls.popleft()
+            self._errors -= error
+            self._slow -= slow
+
+    def _reset_window(self) -> None:
+        self._calls.clear()
+        self._errors = 0
+        self._slow = 0
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self.times_opened += 1
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(self.clock())
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now (reserves nothing)."""
+        with self._lock:
+            state = self._current_state(self.clock())
+            return state == CLOSED or (
+                state == HALF_OPEN and self._probes < self.half_open_max_calls
+            )
+
+    def acquire(self) -> None:
+        """Admit one call or raise CircuitOpenError."""
+        with self._lock:
+            state = self._current_state(self.clock())
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+    def release(self) -> None:
+        """Give back an admitted call that ended without an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record(self, latency: float, error: bool = False) -> None:
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            now = self.clock()
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                if error or slow:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._reset_window()
+                return
+            if state == OPEN:
+                # A call admitted before the breaker opened
+                return
+
+            self._calls.append((now, error, slow))
+            self._errors += error
+            self._slow += slow
+            self._prune(now)
+            calls = len(self._calls)
+            if calls >= self.min_calls and (
+                self._errors / calls >= self.failure_rate_threshold
+                or self._slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._reset_window()
+                self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._calls)
+            return {
+                "state": state,
+                "calls": calls,
+                "error_rate": self._errors / calls if calls else 0.0,
+                "slow_call_rate": self._slow / calls if calls else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in": (
+                    max(self.open_seconds - (now - self._opened_at), 0.0)
+                    if state == OPEN
+                    else None
+                ),
+            }
+
+
+class CircuitBreakerRegistry:
+    """One lazily created CircuitBreaker per provider, sharing settings."""
+
+    def __init__(self, enabled: bool = True, **settings: Any):
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CircuitBreakerRegistry":
+        return cls(
+            enabled=config.get("circuit_breaker_enabled", True),
+            failure_rate_threshold=config.get(
+                "circuit_breaker_failure_rate", 0.5
+            ),
+            slow_call_rate_threshold=config.get(
+                "circuit_breaker_slow_call_rate", 0.8
+            ),
+            slow_call_seconds=config.get(
+                "circuit_breaker_slow_call_seconds", 30.0
+            ),
+            min_calls=config.get("circuit_breaker_min_calls", 10),
+            window_seconds=config.get("circuit_breaker_window_seconds", 60.0),
+            open_seconds=config.get("circuit_breaker_open_seconds", 30.0),
+        )
+
+    def get(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker(
+                    provider, **self.settings
+                )
+            return breaker
+
+    def available(self, provider: str) -> bool:
+        return not self.enabled or self.get(provider).available()
+
+    def acquire(self, provider: str) -> None:
+        if self.enabled:
+            self.get(provider).acquire()
+
+    def release(self, provider: str) -> None:
+        if self.enabled:
+            self.get(provider).release()
+
+    def record(
+        self, provider: str, latency: float, error: bool = False
+    ) -> None:
+        if self.enabled:
+            self.get(provider).record(latency, error)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
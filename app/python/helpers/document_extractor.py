@@ -0,0 +1,181 @@
+"""
+Streaming text extraction for uploaded documents.
+
+iter_blocks() yields a document as TextBlocks: one per PDF page, one per
+DOCX paragraph and one per blank-line separated TXT paragraph, each with
+its position in the extracted text ("\\n".join of the block texts) and in
+the source. Blocks are produced as the file is read, so callers that
+consume them one at a time hold a bounded amount of text whatever the file
+size.
+
+PDFs with PDF_PARALLEL_MIN_PAGES pages or more are split into ranges of
+PDF_PAGES_PER_TASK pages that a shared process pool parses, keeping at most
+two ranges per worker in flight; pages are still yielded in order.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", 0)) or os.cpu_count()
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 64))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".docx")
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class TextBlock:
+    text: str
+    # Where the block starts in the extracted text
+    offset: int
+    # 1-based PDF page, else None
+    page: Optional[int] = None
+    # 0-based paragraph number in a DOCX or TXT file, else None
+    paragraph: Optional[int] = None
+    # Line of a TXT file the paragraph starts on (1-based), else None
+    line: Optional[int] = None
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(PDF_WORKERS)
+        return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown()
+            _pdf_pool = None
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Texts of pages [start, stop) of a PDF (runs in the process pool)."""
+    import PyPDF2
+
+    with open(path, "rb") as pdf_file:
+        pages = PyPDF2.PdfReader(pdf_file).pages
+        return [pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _iter_pdf_pages(
+    path: str,
+    workers: int,
+    pages_per_task: int,
+    parallel_min_pages: int,
+) -> Iterator[str]:
+    import PyPDF2
+
+    with open(path, "rb") as pdf_file:
+        pages = PyPDF2.PdfReader(pdf_file).pages
+        page_count = len(pages)
+        if workers <= 1 or page_count < parallel_min_pages:
+            for page in pages:
+                yield page.extract_text() or ""
+            return
+
+    pool = get_pdf_pool()
+    ranges = iter(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    in_flight: Deque[Future] = deque()
+    try:
+        for start, stop in ranges:
+            in_flight.append(
+                pool.submit(_extract_page_range, path, start, stop)
+            )
+            if len(in_flight) >= 2 * workers:
+                break
+        while in_flight:
+            texts = in_flight.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                in_flight.append(
+                    pool.submit(_extract_page_range, path, *next_range)
+                )
+            yield from texts
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def _iter_txt_paragraphs(path: str) -> Iterator[tuple]:
+    """(text, first line) of each blank-line separated paragraph."""
+    lines: List[str] = []
+    first_line = 1
+    with open(path, "r", encoding="utf-8") as txt_file:
+        for number, line in enumerate(txt_file, 1):
+            line = line.rstrip("\r\n")
+            if line.strip():
+                if not lines:
+                    first_line = number
+                lines.append(line)
+            elif lines:
+                yield "\n".join(lines), first_line
+                lines = []
+    if lines:
+        yield "\n".join(lines), first_line
+
+
+def iter_blocks(
+    path: str,
+    workers: Optional[int] = None,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+    parallel_min_pages: int = PDF_PARALLEL_MIN_PAGES,
+) -> Iterator[TextBlock]:
+    """
+    The TextBlocks of a PDF, TXT or DOCX file, in document order. Raises
+    ValueError for other file types.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    offset = 0
+    if extension == ".pdf":
+        for number, text in enumerate(
+            _iter_pdf_pages(
+                path,
+                PDF_WORKERS if workers is None else workers,
+                pages_per_task,
+                parallel_min_pages,
+            ),
+            1,
+        ):
+            yield TextBlock(text, offset, page=number)
+            offset += len(text) + 1
+    elif extension == ".txt":
+        for number, (text, line) in enumerate(_iter_txt_paragraphs(path)):
+            yield TextBlock(text, offset, paragraph=number, line=line)
+            offset += len(text) + 1
+    elif extension == ".docx":
+        import docx
+
+        for number, paragraph in enumerate(docx.Document(path).paragraphs):
+            yield TextBlock(paragraph.text, offset, paragraph=number)
+            offset += len(paragraph.text) + 1
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+
+
+def extract_text(
+    path: str, on_block: Optional[Callable[[TextBlock], None]] = None
+) -> str:
+    """The whole text of a file; calls on_block() for every block read."""
+    texts = []
+    for block in iter_blocks(path):
+        if on_block is not None:
+            on_block(block)
+        texts.append(block.text)
+    return "\n".join(texts)
@@ -0,0 +1,177 @@
+"""
+HistoryWindow: keeps conversation history sent to a model within a per-model
+token budget.
+
+The first `keep_start` messages (how the conversation started) and the last
+`keep_end` messages (what is being discussed now) are sent verbatim; the
+messages in between are replaced by a single summary message. Summaries are
+cached by the digest of the messages they cover, so repeated calls over the
+same history do not summarize again.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .token_estimate import estimate_tokens
+
+Message = Dict[str, str]
+Summarizer = Callable[[Sequence[Message], int], str]
+
+# Prompt budget for the history, per model; well below the context windows
+# so that prompt size (and with it latency and cost) stays bounded
+MODEL_TOKEN_BUDGETS = {
+    "llama-3.1-8b-instant": 6000,
+    "llama-3.1-70b-versatile": 12000,
+    "claude-3-opus-20240229": 24000,
+}
+DEFAULT_TOKEN_BUDGET = 8000
+DEFAULT_SUMMARY_TOKENS = 300
+DEFAULT_SUMMARY_CACHE_SIZE = 256
+
+# Role, separators and framing a provider adds to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def message_tokens(message: Message) -> int:
+    return (
+        estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+    )
+
+
+def extractive_summary(messages: Sequence[Message], max_tokens: int) -> str:
+    """
+    Summarize without a model call: the opening sentence of every message,
+    in order, until the token allowance is used up.
+    """
+    lines = []
+    used = 0
+    for message in messages:
+        content = " ".join(message.get("content", "").split())
+        first_sentence = SENTENCE_END.split(content, 1)[0][:200]
+        line = f"{message.get('role', 'user')}: {first_sentence}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            lines.append("...")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+class HistoryWindow:
+    def __init__(
+        self,
+        max_messages: int = 25,
+        keep_start: int = 5,
+        keep_end: int = 10,
+        token_budget: Optional[int] = None,
+        summary_tokens: int = DEFAULT_SUMMARY_TOKENS,
+        summarizer: Summarizer = extractive_summary,
+        cache_size: int = DEFAULT_SUMMARY_CACHE_SIZE,
+    ):
+        self.max_messages = max_messages
+        self.keep_start = keep_start
+        self.keep_end = max(keep_end, 1)
+        # Overrides the per-model budgets when set
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "HistoryWindow":
+        return cls(
+            max_messages=config.get("msgs_keep_max", 25),
+            keep_start=config.get("msgs_keep_start", 5),
+            keep_end=config.get("msgs_keep_end", 10),
+            token_budget=config.get("history_token_budget"),
+            summary_tokens=config.get(
+                "history_summary_tokens", DEFAULT_SUMMARY_TOKENS
+            ),
+        )
+
+    def budget_for(self, model: Optional[str]) -> int:
+        if self.token_budget:
+            return self.token_budget
+        return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+    def apply(
+        self, messages: Sequence[Message], model: Optional[str] = None
+    ) -> List[Message]:
+        """
+        Return the messages to send to `model`. The most recent message is
+        always kept, even if it alone exceeds the budget.
+        """
+        budget = self.budget_for(model)
+        costs = [message_tokens(message) for message in messages]
+        if len(messages) <= self.max_messages and sum(costs) <= budget:
+            return list(messages)
+
+        # Indices [0, head) and [tail, len) are sent verbatim
+        head = min(self.keep_start, len(messages) - 1)
+        tail = max(head, len(messages) - self.keep_end)
+        available = budget - self.summary_tokens - MESSAGE_OVERHEAD_TOKENS
+        used = sum(costs[:head]) + sum(costs[tail:])
+
+        # Recent messages matter most: give up the opening ones first
+        while used > available and head > 0:
+            head -= 1
+            used -= costs[head]
+        while used > available and tail < len(messages) - 1:
+            used -= costs[tail]
+            tail += 1
+
+        middle = messages[head:tail]
+        if not middle:
+            return list(messages[:head]) + list(messages[tail:])
+
+        summary = {
+            "role": "system",
+            "content": (
+                f"Summary of {len(middle)} earlier messages:\n"
+                f"{self.summarize(middle)}"
+            ),
+        }
+        return list(messages[:head]) + [summary] + list(messages[tail:])
+
+    def summarize(self, messages: Sequence[Message]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for message in messages:
+            digest.update(message.get("role", "").encode())
+            digest.update(b"\0")
+            digest.update(message.get("content", "").encode())
+            digest.update(b"\0")
+        key = digest.digest()
+
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                self.hits += 1
+                return summary
+            self.misses += 1
+
+        summary = self.summarizer(messages, self.summary_tokens)
+
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._summaries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
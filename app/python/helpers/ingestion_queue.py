@@ -0,0 +1,176 @@
+"""
+IngestionQueue: background ingestion of uploaded documents.
+
+/upload saves the file and submits a job; a bounded pool of worker threads
+extracts the text, embeds it and upserts it while the job's progress (pages
+parsed, chunks embedded, vectors upserted) can be polled by job id. When
+`max_queued` jobs are already waiting for a worker, submit() raises
+QueueFullError instead of letting the backlog grow, so the endpoint can
+tell clients to come back later.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when `max_queued` jobs are already waiting."""
+
+
+class QueueClosedError(RuntimeError):
+    """Raised by submit() after shutdown()."""
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    filename: str
+    status: str = QUEUED
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    vectors_upserted: int = 0
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def advance(self, counter: str, count: int = 1) -> None:
+        """Add `count` to a progress counter, e.g. "pages_parsed"."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                f.name: getattr(self, f.name)
+                for f in fields(self)
+                if not f.name.startswith("_")
+            }
+
+
+class IngestionQueue:
+    def __init__(
+        self,
+        ingest: Callable[[IngestionJob, str], None],
+        workers: int = 2,
+        max_queued: int = 16,
+        keep_finished: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        `ingest(job, path)` does the work for one file, reporting progress
+        through job.advance(); an exception marks the job failed.
+        """
+        self.ingest = ingest
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(
+            workers, thread_name_prefix="ingestion"
+        )
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ("submitted", "rejected", DONE, FAILED), 0
+        )
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        ingest: Callable[[IngestionJob, str], None],
+    ) -> "IngestionQueue":
+        return cls(
+            ingest,
+            workers=config.get("ingestion_workers", 2),
+            max_queued=config.get("ingestion_max_queued", 16),
+        )
+
+    def submit(self, path: str, filename: str) -> IngestionJob:
+        with self._lock:
+            if self._closed:
+                raise QueueClosedError("Ingestion queue is shut down")
+            if self._queued >= self.max_queued:
+                self._counts["rejected"] += 1
+                raise QueueFullError(
+                    f"{self._queued} documents are already waiting"
+                )
+            job = IngestionJob(
+                id=uuid.uuid4().hex, filename=filename, created_at=self.clock()
+            )
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._counts["submitted"] += 1
+            self._executor.submit(self._run, job, path)
+        return job
+
+    def _run(self, job: IngestionJob, path: str) -> None:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        job.status = RUNNING
+        job.started_at = self.clock()
+        try:
+            self.ingest(job, path)
+            job.status = DONE
+        except Exception as e:
+            logger.error(
+                f"Error ingesting {job.filename}: {str(e)}", exc_info=True
+            )
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = self.clock()
+        with self._lock:
+            self._running -= 1
+            self._counts[job.status] += 1
+            self._forget_finished()
+
+    def _forget_finished(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in (DONE, FAILED)
+        ]
+        for job_id in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return None if job is None else job.to_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "queued": self._queued,
+                "running": self._running,
+                **self._counts,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop taking jobs; with `wait`, finish the submitted ones."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
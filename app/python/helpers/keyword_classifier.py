@@ -0,0 +1,214 @@
+"""
+KeywordClassifier: word-boundary-aware task and question type matching.
+
+Keyword tables are compiled once into a phrase lookup table, so classifying
+a query is a single pass over its words and the cost per query does not grow
+with the size of the tables.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class KeywordRule:
+    label: str
+    keywords: Tuple[str, ...]
+    # Only match when the keyword opens the query ("is it ...", "can you ...")
+    leading_only: bool = False
+
+
+RuleSpec = Union[KeywordRule, Tuple[str, Sequence[str]]]
+
+DEFAULT_TASK_TYPE_RULES: List[KeywordRule] = [
+    KeywordRule(
+        "coding",
+        (
+            "code",
+            "coding",
+            "program",
+            "programming",
+            "function",
+            "functions",
+            "debug",
+            "debugging",
+        ),
+    ),
+    KeywordRule(
+        "analysis",
+        ("analyze", "analyse", "compare", "evaluate", "evaluation"),
+    ),
+    KeywordRule("creative", ("create", "generate", "write", "writing")),
+    KeywordRule("casual", ("hi", "hello", "hey", "how are you")),
+    KeywordRule("current_info", ("news", "current events", "latest", "today")),
+]
+
+DEFAULT_QUESTION_TYPE_RULES: List[KeywordRule] = [
+    KeywordRule("problem_solving", ("how", "why", "explain")),
+    KeywordRule("factual", ("what", "who", "where", "when")),
+    KeywordRule(
+        "yes_no", ("is", "are", "can", "do", "does"), leading_only=True
+    ),
+    KeywordRule("analysis", ("compare", "contrast", "analyze")),
+    KeywordRule("casual", ("hi", "hello", "hey", "how are you")),
+]
+
+DEFAULT_TASK_TYPE = "general"
+DEFAULT_QUESTION_TYPE = "open_ended"
+
+# Index of the two tables inside the compiled phrase lookup
+_TASK_TABLE = 0
+_QUESTION_TABLE = 1
+
+
+def _to_rule(spec: RuleSpec) -> KeywordRule:
+    if isinstance(spec, KeywordRule):
+        return spec
+    label, keywords = spec
+    return KeywordRule(label, tuple(keywords))
+
+
+def _split_phrase(phrase: str) -> Tuple[str, ...]:
+    return tuple(WORD_PATTERN.findall(phrase.lower()))
+
+
+class KeywordClassifier:
+    def __init__(
+        self,
+        task_type_rules: Optional[Sequence[RuleSpec]] = None,
+        question_type_rules: Optional[Sequence[RuleSpec]] = None,
+    ):
+        self.task_type_rules = [
+            _to_rule(rule)
+            for rule in (
+                DEFAULT_TASK_TYPE_RULES
+                if task_type_rules is None
+                else task_type_rules
+            )
+        ]
+        self.question_type_rules = [
+            _to_rule(rule)
+            for rule in (
+                DEFAULT_QUESTION_TYPE_RULES
+                if question_type_rules is None
+                else question_type_rules
+            )
+        ]
+        self._compile()
+
+    def _compile(self) -> None:
+        # phrase -> best (priority, label) per table, for anywhere/leading
+        self._phrases: Dict[Tuple[str, ...], List[Optional[Tuple]]] = {}
+        self._leading: Dict[Tuple[str, ...], List[Optional[Tuple]]] = {}
+        self._max_phrase_len = 1
+
+        for table, rules in (
+            (_TASK_TABLE, self.task_type_rules),
+            (_QUESTION_TABLE, self.question_type_rules),
+        ):
+            for priority, rule in enumerate(rules):
+                target = self._leading if rule.leading_only else self._phrases
+                for keyword in rule.keywords:
+                    phrase = _split_phrase(keyword)
+                    if not phrase:
+                        continue
+                    self._max_phrase_len = max(
+                        self._max_phrase_len, len(phrase)
+                    )
+                    entry = target.setdefault(phrase, [None, None])
+                    if entry[table] is None or priority < entry[table][0]:
+                        entry[table] = (priority, rule.label)
+
+    def classify(self, query: str) -> Tuple[str, str]:
+        """Return (task_type, question_type) in one pass over the query."""
+        words = WORD_PATTERN.findall(query.lower())
+        best: List[Optional[Tuple[int, str]]] = [None, None]
+        phrases = self._phrases
+        max_len = self._max_phrase_len
+        word_count = len(words)
+
+        for start in range(word_count):
+            for length in range(1, min(max_len, word_count - start) + 1):
+                entry = phrases.get(tuple(words[start : start + length]))
+                if entry is None:
+                    continue
+                for table in (_TASK_TABLE, _QUESTION_TABLE):
+                    hit = entry[table]
+                    if hit is not None and (
+                        best[table] is None or hit[0] < best[table][0]
+                    ):
+                        best[table] = hit
+
+        if words:
+            for length in range(1, min(max_len, word_count) + 1):
+                entry = self._leading.get(tuple(words[:length]))
+                if entry is None:
+                    continue
+                for table in (_TASK_TABLE, _QUESTION_TABLE):
+                    hit = entry[table]
+                    if hit is not None and (
+                        best[table] is None or hit[0] < best[table][0]
+                    ):
+                        best[table] = hit
+
+        task_type = best[_TASK_TABLE][1] if best[_TASK_TABLE] else None
+        question_type = (
+            best[_QUESTION_TABLE][1] if best[_QUESTION_TABLE] else None
+        )
+        return (
+            task_type or DEFAULT_TASK_TYPE,
+            question_type or DEFAULT_QUESTION_TYPE,
+        )
+
+
+def _rules_from_json(table: Dict[str, Any]) -> List[KeywordRule]:
+    rules = []
+    for label, spec in table.items():
+        if isinstance(spec, dict):
+            rules.append(
+                KeywordRule(
+                    label,
+                    tuple(spec.get("keywords", [])),
+                    leading_only=bool(spec.get("leading_only", False)),
+                )
+            )
+        else:
+            rules.append(KeywordRule(label, tuple(spec)))
+    return rules
+
+
+def load_keyword_classifier(path: str) -> KeywordClassifier:
+    """
+    Build a classifier from a JSON file of the form:
+
+        {
+            "task_types": {"coding": ["code", "debug"], ...},
+            "question_types": {
+                "yes_no": {"keywords": ["is", "can"], "leading_only": true},
+                ...
+            }
+        }
+
+    Labels are checked in file order; a missing table keeps the default.
+    """
+    with open(path, "r") as f:
+        tables = json.load(f)
+    return KeywordClassifier(
+        task_type_rules=(
+            _rules_from_json(tables["task_types"])
+            if "task_types" in tables
+            else None
+        ),
+        question_type_rules=(
+            _rules_from_json(tables["question_types"])
+            if "question_types" in tables
+            else None
+        ),
+    )
+
+
+default_classifier = KeywordClassifier()
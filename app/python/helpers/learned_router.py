@@ -0,0 +1,249 @@
+"""
+LearnedRouter: a small softmax-regression tier classifier trained offline.
+
+It is trained by app/train_router.py from logged routing outcomes (query,
+tier, latency and a quality signal per answer) to predict the cheapest tier
+that still gives an acceptable answer. The model is a handful of NumPy
+arrays saved with np.savez, and scoring a query is one small matrix product
+over the QueryFeatures the router computes anyway.
+
+AdvancedRouter uses the prediction only when it is confident enough and
+falls back to the heuristic tiers otherwise.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .query_features import QueryFeatures
+
+TIERS = ("low", "mid", "high")
+TASK_TYPES = (
+    "general",
+    "coding",
+    "analysis",
+    "creative",
+    "casual",
+    "current_info",
+)
+QUESTION_TYPES = (
+    "open_ended",
+    "problem_solving",
+    "factual",
+    "yes_no",
+    "analysis",
+    "casual",
+)
+FEATURE_NAMES = (
+    "length",
+    "lexical_diversity",
+    "avg_word_length",
+    "special_char_density",
+    "number_density",
+    "log_context_length",
+    *(f"task:{task_type}" for task_type in TASK_TYPES),
+    *(f"question:{question_type}" for question_type in QUESTION_TYPES),
+)
+
+_TASK_INDEX = {task_type: i + 6 for i, task_type in enumerate(TASK_TYPES)}
+_QUESTION_INDEX = {
+    question_type: i + 6 + len(TASK_TYPES)
+    for i, question_type in enumerate(QUESTION_TYPES)
+}
+
+
+def featurize(features: QueryFeatures, context_length: int) -> List[float]:
+    row = [0.0] * len(FEATURE_NAMES)
+    row[0] = features.token_count / 100
+    row[1] = features.lexical_diversity
+    row[2] = features.avg_word_length / 10
+    row[3] = features.special_char_density
+    row[4] = features.number_density
+    row[5] = math.log1p(context_length) / 10
+    if features.task_type in _TASK_INDEX:
+        row[_TASK_INDEX[features.task_type]] = 1.0
+    if features.question_type in _QUESTION_INDEX:
+        row[_QUESTION_INDEX[features.question_type]] = 1.0
+    return row
+
+
+def featurize_many(
+    features: Sequence[QueryFeatures], context_lengths: Sequence[int]
+) -> np.ndarray:
+    return np.array(
+        [
+            featurize(feature, length)
+            for feature, length in zip(features, context_lengths)
+        ],
+        dtype=np.float64,
+    ).reshape(len(features), len(FEATURE_NAMES))
+
+
+class LearnedRouter:
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        tiers: Sequence[str] = TIERS,
+    ):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.tiers = tuple(tiers)
+        # Standardization folded into the weights: one product per query
+        self._weights = self.weights / self.scale[:, None]
+        self._bias = self.bias - self.mean / self.scale @ self.weights
+
+    def predict_proba(self, rows: np.ndarray) -> np.ndarray:
+        logits = np.atleast_2d(rows) @ self._weights + self._bias
+        logits -= logits.max(axis=1, keepdims=True)
+        odds = np.exp(logits)
+        return odds / odds.sum(axis=1, keepdims=True)
+
+    def predict(
+        self, features: QueryFeatures, context_length: int
+    ) -> Tuple[str, float]:
+        """Most likely tier and its probability."""
+        proba = self.predict_proba(
+            np.array(featurize(features, context_length))
+        )[0]
+        best = int(proba.argmax())
+        return self.tiers[best], float(proba[best])
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            mean=self.mean,
+            scale=self.scale,
+            tiers=np.array(self.tiers),
+            feature_names=np.array(FEATURE_NAMES),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LearnedRouter":
+        with np.load(path, allow_pickle=False) as data:
+            feature_names = tuple(data["feature_names"].tolist())
+            if feature_names != FEATURE_NAMES:
+                raise ValueError(
+                    f"Router model {path} was trained on different features"
+                )
+            return cls(
+                data["weights"],
+                data["bias"],
+                data["mean"],
+                data["scale"],
+                tuple(data["tiers"].tolist()),
+            )
+
+
+def train_router(
+    rows: np.ndarray,
+    labels: Sequence[str],
+    tiers: Sequence[str] = TIERS,
+    l2: float = 1e-3,
+    learning_rate: float = 0.5,
+    epochs: int = 500,
+) -> LearnedRouter:
+    """Fit multinomial logistic regression with full-batch gradient descent."""
+    rows = np.asarray(rows, dtype=np.float64)
+    tier_index = {tier: i for i, tier in enumerate(tiers)}
+    targets = np.zeros((len(labels), len(tiers)))
+    targets[np.arange(len(labels)), [tier_index[t] for t in labels]] = 1.0
+
+    mean = rows.mean(axis=0)
+    scale = rows.std(axis=0)
+    scale[scale == 0] = 1.0
+    standardized = (rows - mean) / scale
+
+    # Balanced class weights, so a rare tier is not simply ignored
+    counts = targets.sum(axis=0)
+    class_weights = np.where(
+        counts > 0, len(labels) / (len(tiers) * np.maximum(counts, 1)), 0.0
+    )
+    sample_weights = targets @ class_weights
+    sample_weights /= sample_weights.sum()
+
+    weights = np.zeros((rows.shape[1], len(tiers)))
+    bias = np.zeros(len(tiers))
+    for _ in range(epochs):
+        logits = standardized @ weights + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        proba = np.exp(logits)
+        proba /= proba.sum(axis=1, keepdims=True)
+        error = (proba - targets) * sample_weights[:, None]
+        weights -= learning_rate * (standardized.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum(axis=0)
+
+    return LearnedRouter(weights, bias, mean, scale, tiers)
+
+
+def label_records(
+    records: Iterable[Dict[str, Any]],
+    quality_threshold: float,
+    tiers: Sequence[str] = TIERS,
+) -> List[Dict[str, Any]]:
+    """
+    Turn logged outcomes into one training example per (query, context).
+
+    The label is the cheapest tier whose answer met the quality threshold;
+    if none did, the tier above the best one tried. Observed latencies per
+    tier are kept for evaluation.
+    """
+    rank = {tier: i for i, tier in enumerate(tiers)}
+    groups: Dict[Tuple[str, int], List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        if record.get("tier") in rank:
+            key = (record["query"], int(record.get("context_length", 0)))
+            groups[key].append(record)
+
+    examples = []
+    for (query, context_length), group in groups.items():
+        acceptable = [
+            rank[r["tier"]]
+            for r in group
+            if (r.get("quality") or 0.0) >= quality_threshold
+        ]
+        if acceptable:
+            label = min(acceptable)
+        else:
+            label = min(
+                max(rank[r["tier"]] for r in group) + 1, len(tiers) - 1
+            )
+        examples.append(
+            {
+                "query": query,
+                "context_length": context_length,
+                "label": tiers[label],
+                "routed_tier": group[0].get("routed_tier"),
+                "latencies": {
+                    r["tier"]: r["latency"]
+                    for r in group
+                    if r.get("latency") is not None
+                },
+            }
+        )
+    return examples
+
+
+class RouteLogWriter:
+    """Append routing outcomes as JSON lines for offline training."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps({"time": time.time(), **record}) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
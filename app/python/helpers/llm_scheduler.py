@@ -0,0 +1,328 @@
+"""
+LLMScheduler: priority and fair-share queuing in front of model calls.
+
+At most `max_concurrent` model calls run at once. Callers that find no free
+slot wait in one of two priority classes:
+
+- INTERACTIVE: a user waiting on a chat answer
+- TOOL_LOOP: follow-up calls of an agent working through tool results
+
+A free slot goes to the highest class with waiters, except that a class
+whose next waiter has waited `max_wait_seconds` or longer is served first,
+so lower classes are delayed but never starved. Within a class, calls are
+ordered by start-time fair queuing over conversation ids: each conversation
+gets its weight's share of the slots, so one chatty conversation cannot
+push the others to the back of the line.
+
+The priority and conversation of a call are taken from llm_call_context()
+unless given explicitly. Queue depth and wait times per class are reported
+by stats().
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+INTERACTIVE = "interactive"
+TOOL_LOOP = "tool_loop"
+# Highest priority first
+PRIORITIES = (INTERACTIVE, TOOL_LOOP)
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default=INTERACTIVE)
+_conversation_id: ContextVar[Optional[str]] = ContextVar(
+    "llm_conversation_id", default=None
+)
+
+
+@contextmanager
+def llm_call_context(
+    priority: Optional[str] = None, conversation_id: Optional[str] = None
+) -> Iterator[None]:
+    """Set the priority and conversation of model calls made inside."""
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if conversation_id is not None:
+        tokens.append(
+            (_conversation_id, _conversation_id.set(conversation_id))
+        )
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def lower_priority(first: str, second: str) -> str:
+    return max(first, second, key=PRIORITIES.index)
+
+
+class _Waiter:
+    def __init__(
+        self, conversation_id: Optional[str], start: float, enqueued: float
+    ):
+        self.conversation_id = conversation_id
+        self.start = start
+        self.enqueued = enqueued
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.dispatched = False
+        self.cancelled = False
+
+    def notify(self) -> None:
+        # May be called from another thread or event loop
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _PriorityClass:
+    """The waiters of one priority class and their fair-queuing state."""
+
+    def __init__(self, name: str, history: int):
+        self.name = name
+        # (start tag, sequence, waiter)
+        self.heap: List[Tuple[float, int, _Waiter]] = []
+        self.queued = 0
+        self.active = 0
+        self.virtual_time = 0.0
+        # Finish tag of each conversation's latest call
+        self.finish: Dict[str, float] = {}
+        self.admitted = 0
+        self.promoted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=history)
+
+    def tag(self, conversation_id: Optional[str], weight: float) -> float:
+        """Start tag of a new call; charges it to its conversation."""
+        start = self.virtual_time
+        if conversation_id is not None:
+            start = max(start, self.finish.get(conversation_id, 0.0))
+            self.finish[conversation_id] = start + 1.0 / weight
+        return start
+
+    def head(self) -> Optional[_Waiter]:
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        return self.heap[0][2] if self.heap else None
+
+    def admit(self, waiter_start: float, wait: float) -> None:
+        self.virtual_time = max(self.virtual_time, waiter_start)
+        self.active += 1
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+        # Conversations that fell behind have no claim left to remember
+        if len(self.finish) > 1024:
+            self.finish = {
+                conversation_id: finish
+                for conversation_id, finish in self.finish.items()
+                if finish > self.virtual_time
+            }
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        waiting = [
+            waiter for _, _, waiter in self.heap if not waiter.cancelled
+        ]
+        waits = sorted(self.recent_waits)
+        return {
+            "queued": self.queued,
+            "active": self.active,
+            "admitted": self.admitted,
+            "promoted": self.promoted,
+            "conversations_waiting": len(
+                {waiter.conversation_id for waiter in waiting}
+            ),
+            "oldest_wait": max(
+                (now - waiter.enqueued for waiter in waiting), default=0.0
+            ),
+            "avg_wait": (
+                self.total_wait / self.admitted if self.admitted else 0.0
+            ),
+            "p95_wait": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = 16,
+        max_wait_seconds: float = 30.0,
+        enabled: bool = True,
+        history: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self.enabled = enabled
+        self.clock = clock
+        self._classes = {
+            priority: _PriorityClass(priority, history)
+            for priority in PRIORITIES
+        }
+        self._weights: Dict[str, float] = {}
+        self._active = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "LLMScheduler":
+        return cls(
+            max_concurrent=config.get("llm_max_concurrent_calls", 16),
+            max_wait_seconds=config.get(
+                "llm_scheduler_max_wait_seconds", 30.0
+            ),
+            enabled=config.get("llm_scheduler_enabled", True),
+        )
+
+    def set_weight(self, conversation_id: str, weight: float) -> None:
+        """Give a conversation `weight` times the default share of slots."""
+        if weight <= 0:
+            raise ValueError("Conversation weight must be positive")
+        with self._lock:
+            if weight == 1.0:
+                self._weights.pop(conversation_id, None)
+            else:
+                self._weights[conversation_id] = weight
+
+    def _resolve(
+        self, priority: Optional[str], conversation_id: Optional[str]
+    ) -> Tuple[str, Optional[str]]:
+        priority = priority or _priority.get()
+        if priority not in self._classes:
+            raise ValueError(f"Unknown LLM call priority: {priority}")
+        if conversation_id is None:
+            conversation_id = _conversation_id.get()
+        return priority, conversation_id
+
+    async def acquire(
+        self,
+        priority: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+    ) -> float:
+        """Wait for a call slot; returns the seconds spent waiting."""
+        priority, conversation_id = self._resolve(priority, conversation_id)
+        queue = self._classes[priority]
+        with self._lock:
+            now = self.clock()
+            start = queue.tag(
+                conversation_id, self._weights.get(conversation_id, 1.0)
+            )
+            if self._active < self.max_concurrent and not any(
+                c.queued for c in self._classes.values()
+            ):
+                self._active += 1
+                queue.admit(start, 0.0)
+                return 0.0
+            waiter = _Waiter(conversation_id, start, now)
+            heapq.heappush(queue.heap, (start, next(self._sequence), waiter))
+            queue.queued += 1
+
+        try:
+            await waiter.future
+        except BaseException:
+            with self._lock:
+                if waiter.dispatched:
+                    self._release(priority)
+                else:
+                    waiter.cancelled = True
+                    queue.queued -= 1
+            raise
+        return self.clock() - waiter.enqueued
+
+    def release(self, priority: str) -> None:
+        """Free the slot of a finished call of class `priority`."""
+        with self._lock:
+            self._release(priority)
+
+    def _release(self, priority: str) -> None:
+        self._active -= 1
+        self._classes[priority].active -= 1
+        now = self.clock()
+        while self._active < self.max_concurrent:
+            picked = self._next_class(now)
+            if picked is None:
+                return
+            waiter = heapq.heappop(picked.heap)[2]
+            picked.queued -= 1
+            waiter.dispatched = True
+            self._active += 1
+            picked.admit(waiter.start, now - waiter.enqueued)
+            waiter.notify()
+
+    def _next_class(self, now: float) -> Optional[_PriorityClass]:
+        heads = [
+            (queue, head)
+            for queue, head in (
+                (queue, queue.head()) for queue in self._classes.values()
+            )
+            if head is not None
+        ]
+        if not heads:
+            return None
+        starved = [
+            (head.enqueued, index)
+            for index, (_, head) in enumerate(heads)
+            if now - head.enqueued >= self.max_wait_seconds
+        ]
+        if starved:
+            queue = heads[min(starved)[1]][0]
+            if queue is not heads[0][0]:
+                queue.promoted += 1
+            return queue
+        return heads[0][0]
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+    ) -> AsyncIterator[None]:
+        """Hold a call slot for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+        priority, conversation_id = self._resolve(priority, conversation_id)
+        await self.acquire(priority, conversation_id)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            return {
+                "enabled": self.enabled,
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "classes": {
+                    priority: queue.stats(now)
+                    for priority, queue in self._classes.items()
+                },
+            }
@@ -0,0 +1,283 @@
+"""
+Per-model rate limits.
+
+Every chat model has its own provider quota, so ModelRateLimiterRegistry
+keeps one limiter per model, created on first use. Limits start from
+DEFAULT_MODEL_LIMITS and can be overridden by a JSON file
+(MODEL_RATE_LIMITS_FILE) and then by JSON in the MODEL_RATE_LIMITS
+variable, both shaped like
+
+    {"gpt-4o": {"requests": 500, "input_tokens": 30000,
+                "output_tokens": 0, "window_seconds": 60}}
+
+where a limit of 0 disables that check. get_chat_model wraps its clients in
+RateLimitedChatModel so every call goes through the model's limiter, and
+the router reads headroom() when choosing between equivalent models. With
+adaptive limiters, the wrapper also reports 429s and rate-limit headers
+back to the limiter. Callers that time model calls use admit() to wait for
+quota before starting the clock.
+"""
+
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from .adaptive_rate_limiter import AdaptiveRateLimiter, response_headers
+from .rate_limiter import CallRecord, RateLimiter, create_rate_limiter
+from .token_estimate import (
+    chars_to_tokens,
+    count_output_tokens,
+    estimate_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    requests: int
+    input_tokens: int = 0
+    output_tokens: int = 0
+    window_seconds: float = 60
+
+
+# Conservative entry-tier quotas per minute; override them per deployment
+DEFAULT_MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "gpt-4o": ModelLimits(500, 30000),
+    "gpt-4o-mini": ModelLimits(500, 200000),
+    "claude-3-5-sonnet-20240620": ModelLimits(50, 40000, 8000),
+    "claude-3-opus-20240229": ModelLimits(50, 20000, 4000),
+    "llama-3.1-8b-instant": ModelLimits(30, 20000),
+    "llama-3.1-70b-versatile": ModelLimits(30, 6000),
+    "llama-3.1-sonar-small-128k-online": ModelLimits(50),
+    "llama-3.1-sonar-large-128k-online": ModelLimits(50),
+    "llama-3.1-sonar-huge-128k-online": ModelLimits(50),
+    "llama3-groq-70b-8192-tool-use-preview": ModelLimits(30, 15000),
+    "llama3-groq-8b-8192-tool-use-preview": ModelLimits(30, 15000),
+}
+
+
+def parse_model_limits(table: Dict[str, Any]) -> Dict[str, ModelLimits]:
+    return {
+        model: ModelLimits(
+            requests=int(spec.get("requests", 0)),
+            input_tokens=int(spec.get("input_tokens", 0)),
+            output_tokens=int(spec.get("output_tokens", 0)),
+            window_seconds=float(spec.get("window_seconds", 60)),
+        )
+        for model, spec in table.items()
+    }
+
+
+class ModelRateLimiterRegistry:
+    def __init__(
+        self,
+        limits: Optional[Dict[str, ModelLimits]] = None,
+        config: Optional[Dict[str, Any]] = None,
+        enabled: bool = True,
+    ):
+        self.limits = dict(DEFAULT_MODEL_LIMITS if limits is None else limits)
+        # Backend settings for create_rate_limiter
+        self.config = config or {}
+        self.enabled = enabled
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ModelRateLimiterRegistry":
+        limits = dict(DEFAULT_MODEL_LIMITS)
+        limits_file = config.get("model_rate_limits_file")
+        if limits_file:
+            with open(limits_file, "r") as f:
+                limits.update(parse_model_limits(json.load(f)))
+        if config.get("model_rate_limits"):
+            limits.update(
+                parse_model_limits(json.loads(config["model_rate_limits"]))
+            )
+        return cls(
+            limits, config, config.get("model_rate_limits_enabled", True)
+        )
+
+    def get(self, model: str) -> Optional[RateLimiter]:
+        """The model's limiter, or None if it has no limits."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None and model in self.limits:
+                limits = self.limits[model]
+                limiter = self._limiters[model] = create_rate_limiter(
+                    self.config,
+                    f"model:{model}",
+                    limits.requests,
+                    limits.input_tokens,
+                    limits.output_tokens,
+                    limits.window_seconds,
+                )
+            return limiter
+
+    def get_or_register(self, model: str, limits: ModelLimits) -> RateLimiter:
+        """Like get(), using `limits` unless the model is configured."""
+        with self._lock:
+            self.limits.setdefault(model, limits)
+        limiter = self.get(model)
+        if limiter is None:
+            # Disabled registry: callers still expect a limiter to hold
+            limits = self.limits[model]
+            limiter = RateLimiter(
+                limits.requests,
+                limits.input_tokens,
+                limits.output_tokens,
+                limits.window_seconds,
+            )
+        return limiter
+
+    def headroom(self, model: str) -> float:
+        """Free share (0-1) of the model's tightest limit; 1 if unlimited."""
+        limiter = self.get(model)
+        return 1.0 if limiter is None else limiter.headroom()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {
+            model: {
+                **asdict(self.limits[model]),
+                "headroom": limiter.headroom(),
+                **(
+                    {"adaptive": limiter.stats()}
+                    if isinstance(limiter, AdaptiveRateLimiter)
+                    else {}
+                ),
+            }
+            for model, limiter in limiters.items()
+        }
+
+
+class RateLimitedChatModel:
+    """
+    A chat model client whose invoke/ainvoke/stream/astream calls wait for
+    the model's limiter, reserving the estimated input tokens and reporting
+    the output tokens afterwards. Everything else is the wrapped client's.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        limiter: RateLimiter,
+        admitted: Optional[CallRecord] = None,
+    ):
+        self.client = client
+        self.limiter = limiter
+        # Admission already granted by admit() for the next call
+        self._admitted = admitted
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def _take_admission(self) -> Optional[CallRecord]:
+        record, self._admitted = self._admitted, None
+        return record
+
+    def _succeeded(self, response: Any = None) -> None:
+        if isinstance(self.limiter, AdaptiveRateLimiter):
+            self.limiter.on_success(response_headers(response))
+
+    def _failed(self, error: Exception) -> None:
+        if isinstance(self.limiter, AdaptiveRateLimiter):
+            self.limiter.report(error)
+
+    async def ainvoke(self, input: Any, *args: Any, **kwargs: Any) -> Any:
+        record = self._take_admission() or await self.limiter.acquire(
+            estimate_tokens(input)
+        )
+        try:
+            response = await self.client.ainvoke(input, *args, **kwargs)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(response)
+        await self.limiter.arelease(count_output_tokens(response), record)
+        return response
+
+    def invoke(self, input: Any, *args: Any, **kwargs: Any) -> Any:
+        record = self._take_admission() or self.limiter.limit_call_and_input(
+            estimate_tokens(input)
+        )
+        try:
+            response = self.client.invoke(input, *args, **kwargs)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(response)
+        self.limiter.release(count_output_tokens(response), record)
+        return response
+
+    async def astream(
+        self, input: Any, *args: Any, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        record = self._take_admission() or await self.limiter.acquire(
+            estimate_tokens(input)
+        )
+        output = _StreamedOutput()
+        try:
+            async for chunk in self.client.astream(input, *args, **kwargs):
+                output.add(chunk)
+                yield chunk
+        except Exception as e:
+            self._failed(e)
+            raise
+        else:
+            self._succeeded(output.first)
+        finally:
+            await self.limiter.arelease(output.tokens(), record)
+
+    def stream(self, input: Any, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        record = self._take_admission() or self.limiter.limit_call_and_input(
+            estimate_tokens(input)
+        )
+        output = _StreamedOutput()
+        try:
+            for chunk in self.client.stream(input, *args, **kwargs):
+                output.add(chunk)
+                yield chunk
+        except Exception as e:
+            self._failed(e)
+            raise
+        else:
+            self._succeeded(output.first)
+        finally:
+            self.limiter.release(output.tokens(), record)
+
+
+async def admit(chat_model: Any, input: Any) -> Any:
+    """
+    Wait for `chat_model`'s quota for `input` and return a client whose next
+    call uses that admission, so the wait is over before the caller starts
+    timing the call. Clients without a limiter are returned unchanged.
+    """
+    if not isinstance(chat_model, RateLimitedChatModel):
+        return chat_model
+    record = await chat_model.limiter.acquire(estimate_tokens(input))
+    return RateLimitedChatModel(chat_model.client, chat_model.limiter, record)
+
+
+class _StreamedOutput:
+    def __init__(self):
+        self.chars = 0
+        self.reported = 0
+        # Carries the response headers, if the client kept them
+        self.first: Any = None
+
+    def add(self, chunk: Any) -> None:
+        if self.first is None:
+            self.first = chunk
+        usage = getattr(chunk, "usage_metadata", None) or {}
+        self.reported += usage.get("output_tokens", 0)
+        content = getattr(chunk, "content", chunk)
+        self.chars += len(content) if isinstance(content, str) else 0
+
+    def tokens(self) -> int:
+        return self.reported or chars_to_tokens(self.chars)
@@ -119,6 +119,13 @@ def delete_document(collection_name: str, query: dict):
 
 
 # Fallback methods using local JSON file
+def close_connection():
+    """Close the MongoDB client (on server shutdown)."""
+    if client:
+        client.close()
+        logger.info("MongoDB connection closed")
+
+
 def load_fallback_data():
     try:
         with open(FALLBACK_FILE, "r") as f:
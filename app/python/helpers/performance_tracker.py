@@ -0,0 +1,256 @@
+"""
+PerformanceTracker: live latency, error and throughput statistics per model
+and per routing tier.
+
+Latency is tracked both as an EWMA (what is happening right now) and as a
+streaming quantile sketch (what is normal). Their ratio is the performance
+factor AdvancedRouter._select_model_config uses to shift traffic between
+tiers.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+TIERS = ("low", "mid", "high")
+
+
+class QuantileSketch:
+    """
+    Log-bucketed streaming quantile sketch with bounded relative error.
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is answered within `relative_accuracy` of the true value while
+    memory only depends on the range of values seen (a few hundred buckets
+    for latencies between a millisecond and several minutes).
+    """
+
+    def __init__(
+        self, relative_accuracy: float = 0.01, min_value: float = 1e-4
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def _bucket(self, value: float) -> int:
+        return math.ceil(
+            math.log(max(value, self.min_value)) / self._log_gamma
+        )
+
+    def add(self, value: float) -> None:
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                # Midpoint of the bucket in log space
+                return 2 * self.gamma**bucket / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+@dataclass
+class LatencyStats:
+    alpha: float
+    sketch: QuantileSketch = field(default_factory=QuantileSketch)
+    ttft_sketch: QuantileSketch = field(default_factory=QuantileSketch)
+    ewma_latency: Optional[float] = None
+    ewma_error_rate: float = 0.0
+    ewma_tokens_per_second: Optional[float] = None
+    requests: int = 0
+    errors: int = 0
+    output_tokens: int = 0
+    last_updated: Optional[float] = None
+
+    def record(
+        self,
+        latency: float,
+        output_tokens: int = 0,
+        error: bool = False,
+        ttft: Optional[float] = None,
+    ) -> None:
+        self.requests += 1
+        self.last_updated = time.time()
+        self.ewma_error_rate += self.alpha * (
+            float(error) - self.ewma_error_rate
+        )
+        if error:
+            self.errors += 1
+            return
+
+        self.sketch.add(latency)
+        if ttft is not None:
+            self.ttft_sketch.add(ttft)
+        self.ewma_latency = (
+            latency
+            if self.ewma_latency is None
+            else self.ewma_latency + self.alpha * (latency - self.ewma_latency)
+        )
+        if output_tokens and latency > 0:
+            self.output_tokens += output_tokens
+            rate = output_tokens / latency
+            self.ewma_tokens_per_second = (
+                rate
+                if self.ewma_tokens_per_second is None
+                else self.ewma_tokens_per_second
+                + self.alpha * (rate - self.ewma_tokens_per_second)
+            )
+
+    def percentile(self, q: float) -> Optional[float]:
+        return self.sketch.quantile(q)
+
+    def ttft_percentile(self, q: float) -> Optional[float]:
+        return self.ttft_sketch.quantile(q)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.ewma_error_rate, 4),
+            "ewma_latency": self.ewma_latency,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "ttft_p95": self.ttft_percentile(0.95),
+            "tokens_per_second": self.ewma_tokens_per_second,
+            "output_tokens": self.output_tokens,
+            "last_updated": self.last_updated,
+        }
+
+
+class PerformanceTracker:
+    """
+    Per-model and per-tier performance statistics.
+
+    The performance factor of a tier is its current EWMA latency divided by
+    its median latency, inflated by the recent error rate: 1.0 means the
+    tier behaves as usual and above 1.0 it is degraded. The factor never
+    goes below 1.0: a tier answering faster than its own history is not a
+    reason to send it more traffic, since the traffic it gets would keep it
+    looking fast. Tiers with fewer than `min_samples` requests report 1.0.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        min_samples: int = 5,
+        max_decisions: int = 100,
+    ):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.models: Dict[str, LatencyStats] = {}
+        self.tiers: Dict[str, LatencyStats] = {}
+        self.tier_selections: Counter = Counter()
+        self.recent_decisions: Deque[Dict[str, Any]] = deque(
+            maxlen=max_decisions
+        )
+        self._lock = threading.Lock()
+
+    def _stats(self, table: Dict[str, LatencyStats], key: str):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = LatencyStats(alpha=self.alpha)
+        return stats
+
+    def record(
+        self,
+        model: str,
+        tier: Optional[str],
+        latency: float,
+        output_tokens: int = 0,
+        error: bool = False,
+        ttft: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            self._stats(self.models, model).record(
+                latency, output_tokens, error, ttft
+            )
+            if tier:
+                self._stats(self.tiers, tier).record(
+                    latency, output_tokens, error, ttft
+                )
+
+    def update_performance(self, tier: str, processing_time: float) -> None:
+        with self._lock:
+            self._stats(self.tiers, tier).record(processing_time)
+
+    def record_selection(
+        self,
+        tier: str,
+        reason: str,
+        factors: Optional[Dict[str, float]] = None,
+        count: int = 1,
+    ) -> None:
+        with self._lock:
+            self.tier_selections[(tier, reason)] += count
+            self.recent_decisions.append(
+                {
+                    "time": time.time(),
+                    "tier": tier,
+                    "reason": reason,
+                    "count": count,
+                    "factors": factors,
+                }
+            )
+
+    def _factor(self, stats: Optional[LatencyStats]) -> float:
+        if (
+            stats is None
+            or stats.requests < self.min_samples
+            or stats.ewma_latency is None
+        ):
+            return 1.0
+        median = stats.percentile(0.5)
+        if not median:
+            return 1.0
+        health = max(1.0 - stats.ewma_error_rate, 0.1)
+        return max(stats.ewma_latency / median / health, 1.0)
+
+    def get_performance_factors(self) -> Dict[str, float]:
+        with self._lock:
+            return {tier: self._factor(self.tiers.get(tier)) for tier in TIERS}
+
+    def get_model_stats(self, model: str) -> Optional[LatencyStats]:
+        return self.models.get(model)
+
+    def latency_percentile(
+        self, model: str, q: float, ttft: bool = False
+    ) -> Optional[float]:
+        with self._lock:
+            stats = self.models.get(model)
+            if stats is None:
+                return None
+            return stats.ttft_percentile(q) if ttft else stats.percentile(q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Inspection view of everything that feeds tier selection."""
+        with self._lock:
+            selections: Dict[str, Dict[str, int]] = {}
+            for (tier, reason), count in self.tier_selections.items():
+                selections.setdefault(tier, {})[reason] = count
+            return {
+                "factors": {
+                    tier: self._factor(self.tiers.get(tier)) for tier in TIERS
+                },
+                "tiers": {
+                    tier: stats.to_dict() for tier, stats in self.tiers.items()
+                },
+                "models": {
+                    model: stats.to_dict()
+                    for model, stats in self.models.items()
+                },
+                "tier_selections": selections,
+                "recent_decisions": list(self.recent_decisions),
+            }
@@ -3,7 +3,15 @@ from dotenv import load_dotenv
 import logging
 from openai import OpenAI
 from typing import List, Dict, Union
+from .adaptive_rate_limiter import (
+    AdaptiveRateLimiter,
+    stop_if_throttled_for,
+    wait_for_provider,
+)
+from .query_features import get_query_features
 from .redis_cache import RedisCache
+from .single_flight import coalesce_key, get_single_flight
+from .token_estimate import estimate_tokens
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -15,20 +23,33 @@ import json
 load_dotenv()
 
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
+# Longest retry-after we wait out before giving up on a call
+MAX_RETRY_AFTER = float(os.getenv("RATE_LIMIT_MAX_RETRY_AFTER", 60))
 logger = logging.getLogger(__name__)
 
+# Shared by all Perplexity calls; follows the API's rate-limit headers
+rate_limiter = AdaptiveRateLimiter(
+    max_calls=int(os.getenv("PERPLEXITY_RATE_LIMIT_REQUESTS", 50)),
+    max_input_tokens=0,
+    max_output_tokens=0,
+    window_seconds=60,
+)
+
 # Retry decorator for API calls
 api_retry = retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3)
+    | stop_if_throttled_for(rate_limiter, MAX_RETRY_AFTER),
+    wait=wait_for_provider(
+        rate_limiter, wait_exponential(multiplier=1, min=4, max=10)
+    ),
     retry=retry_if_exception_type((Exception,)),
     before_sleep=lambda retry_state: logger.info(
         f"Retrying Perplexity API call: attempt {retry_state.attempt_number}"
     ),
+    reraise=True,
 )
 
 
-@api_retry
 def perplexity_search(
     query: str,
     max_results: int = 5,
@@ -36,6 +57,23 @@ def perplexity_search(
     complexity: float = 0.5,
     timeout: int = 30,
     stream: bool = False,
+) -> Union[str, List[Dict[str, str]]]:
+    # Concurrent identical searches share one API call (and its retries)
+    return get_single_flight("perplexity_search").do(
+        coalesce_key(query, max_results, complexity, stream, api_key),
+        lambda: _perplexity_search(
+            query, max_results, api_key, complexity, timeout, stream
+        ),
+    )
+
+
+def _perplexity_search(
+    query: str,
+    max_results: int = 5,
+    api_key: str | None = None,
+    complexity: float = 0.5,
+    timeout: int = 30,
+    stream: bool = False,
 ) -> Union[str, List[Dict[str, str]]]:
     if not api_key:
         api_key = PERPLEXITY_API_KEY
@@ -55,7 +93,10 @@ def perplexity_search(
         )
         return json.loads(cached_result)
 
-    client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
+    # 429s are retried by api_retry, which knows the provider's pause
+    client = OpenAI(
+        api_key=api_key, base_url="https://api.perplexity.ai", max_retries=0
+    )
 
     model = select_sonar_model(complexity)
 
@@ -72,7 +113,8 @@ def perplexity_search(
 
     try:
         if stream:
-            response_stream = client.chat.completions.create(
+            response_stream = _create_completion(
+                client,
                 model=model,
                 messages=[
                     {"role": msg["role"], "content": msg["content"]}
@@ -89,7 +131,8 @@ def perplexity_search(
                 and chunk.choices[0].delta.content is not None
             ]
         else:
-            response = client.chat.completions.create(
+            response = _create_completion(
+                client,
                 model=model,
                 messages=[
                     {"role": msg["role"], "content": msg["content"]}
@@ -113,6 +156,19 @@ def perplexity_search(
         return f"An error occurred while performing the Perplexity search: {str(e)}"
 
 
+@api_retry
+def _create_completion(client: OpenAI, **kwargs):
+    rate_limiter.ensure_available(MAX_RETRY_AFTER)
+    rate_limiter.limit_call_and_input(estimate_tokens(kwargs["messages"]))
+    try:
+        raw = client.chat.completions.with_raw_response.create(**kwargs)
+    except Exception as e:
+        rate_limiter.report(e)
+        raise
+    rate_limiter.on_success(raw.headers)
+    return raw.parse()
+
+
 def select_sonar_model(complexity: float) -> str:
     if complexity < 0.3:
         return "llama-3-sonar-small-32k-online"
@@ -123,44 +179,5 @@ def select_sonar_model(complexity: float) -> str:
 
 
 def assess_complexity(query: str) -> float:
-    # This method is now consistent with the one in RAGSystem
-    from nltk.tokenize import word_tokenize
-    from nltk.corpus import stopwords
-    import nltk
-
-    nltk.download("punkt", quiet=True)
-    nltk.download("stopwords", quiet=True)
-
-    # Tokenize the query
-    tokens = word_tokenize(query.lower())
-
-    # Remove stopwords
-    stop_words = set(stopwords.words("english"))
-    tokens = [word for word in tokens if word not in stop_words]
-
-    # Calculate lexical diversity
-    lexical_diversity = len(set(tokens)) / len(tokens) if tokens else 0
-
-    # Calculate average word length
-    avg_word_length = (
-        sum(len(word) for word in tokens) / len(tokens) if tokens else 0
-    )
-
-    # Count special characters and numbers
-    special_chars = sum(
-        1
-        for char in query
-        if not char.isalnum() and char not in [" ", ".", ",", "!", "?"]
-    )
-    numbers = sum(1 for char in query if char.isdigit())
-
-    # Calculate complexity score
-    complexity = (
-        (len(tokens) / 100) * 0.3  # Length factor
-        + lexical_diversity * 0.3  # Vocabulary richness
-        + (avg_word_length / 10) * 0.2  # Word complexity
-        + (special_chars / len(query)) * 0.1  # Special character density
-        + (numbers / len(query)) * 0.1  # Number density
-    )
-
-    return min(complexity, 1.0)
+    # Shared with RAGSystem and AdvancedRouter through the feature cache
+    return get_query_features(query).complexity
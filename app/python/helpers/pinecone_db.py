@@ -1,6 +1,7 @@
 import os
 import time
 import logging
+from contextlib import contextmanager
 from typing import List, Dict, Any
 from pinecone import Pinecone, ServerlessSpec
 from tenacity import (
@@ -9,6 +10,11 @@ from tenacity import (
     wait_exponential,
     retry_if_exception_type,
 )
+from .adaptive_rate_limiter import (
+    AdaptiveRateLimiter,
+    stop_if_throttled_for,
+    wait_for_provider,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -22,10 +28,24 @@ environment = os.getenv("PINECONE_ENVIRONMENT")
 dimension = int(os.getenv("PINECONE_DIMENSION", "1536"))
 cloud = os.getenv("PINECONE_CLOUD", "aws")
 
+# Longest retry-after we wait out before giving up on an operation
+max_retry_after = float(os.getenv("RATE_LIMIT_MAX_RETRY_AFTER", 60))
+
+# Shared by all Pinecone operations; backs off when Pinecone answers 429
+rate_limiter = AdaptiveRateLimiter(
+    max_calls=int(os.getenv("PINECONE_RATE_LIMIT_REQUESTS", 6000)),
+    max_input_tokens=0,
+    max_output_tokens=0,
+    window_seconds=60,
+)
+
 # Retry decorator
 pinecone_retry = retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=4, max=60),
+    stop=stop_after_attempt(5)
+    | stop_if_throttled_for(rate_limiter, max_retry_after),
+    wait=wait_for_provider(
+        rate_limiter, wait_exponential(multiplier=1, min=4, max=60)
+    ),
     retry=retry_if_exception_type((Exception,)),
     before_sleep=lambda retry_state: logger.info(
         f"Retrying Pinecone operation: attempt {retry_state.attempt_number}"
@@ -33,6 +53,19 @@ pinecone_retry = retry(
 )
 
 
+@contextmanager
+def rate_limited():
+    """Wait for the limiter and report how the Pinecone call went."""
+    rate_limiter.ensure_available(max_retry_after)
+    rate_limiter.limit_call_and_input(0)
+    try:
+        yield
+    except Exception as e:
+        rate_limiter.report(e)
+        raise
+    rate_limiter.on_success()
+
+
 # Check if the index exists, if not create it
 @pinecone_retry
 def create_index_if_not_exists():
@@ -57,7 +90,8 @@ index = pc.Index(index_name)
 @pinecone_retry
 def upsert_vectors(vectors: List[Dict[str, Any]]):
     try:
-        result = index.upsert(vectors=vectors)
+        with rate_limited():
+            result = index.upsert(vectors=vectors)
         logger.info(f"Successfully upserted {len(vectors)} vectors")
         return result
     except Exception as e:
@@ -68,7 +102,8 @@ def upsert_vectors(vectors: List[Dict[str, Any]]):
 @pinecone_retry
 def query_vectors(query_vector: List[float], top_k: int = 5):
     try:
-        result = index.query(vector=query_vector, top_k=top_k)
+        with rate_limited():
+            result = index.query(vector=query_vector, top_k=top_k)
         logger.info(f"Successfully queried vectors with top_k={top_k}")
         return result
     except Exception as e:
@@ -79,7 +114,8 @@ def query_vectors(query_vector: List[float], top_k: int = 5):
 @pinecone_retry
 def delete_vectors(ids: List[str]):
     try:
-        result = index.delete(ids=ids)
+        with rate_limited():
+            result = index.delete(ids=ids)
         logger.info(f"Successfully deleted {len(ids)} vectors")
         return result
     except Exception as e:
@@ -99,6 +135,14 @@ def check_pinecone_health():
         return False
 
 
+def close_connection():
+    """Release the index's connection pool (on server shutdown)."""
+    close = getattr(index, "close", None)
+    if close is not None:
+        close()
+        logger.info("Pinecone connection closed")
+
+
 # Initialization
 logger.info("Initializing Pinecone connection...")
 if check_pinecone_health():
@@ -0,0 +1,180 @@
+"""
+QueryFeatures: single-pass feature extraction for incoming queries.
+
+The router, the RAG system and Perplexity search all score the same query.
+Features are computed once and kept in a bounded LRU keyed by the query hash,
+so a request that travels router -> hybrid RAG -> Perplexity only pays the
+tokenization cost on the first hop.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import nltk
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+
+from .keyword_classifier import KeywordClassifier, default_classifier
+
+nltk.download("punkt", quiet=True)
+nltk.download("stopwords", quiet=True)
+
+DEFAULT_CACHE_SIZE = int(os.getenv("QUERY_FEATURE_CACHE_SIZE", 4096))
+
+# Characters that do not count towards the special character density
+IGNORED_SPECIAL_CHARS = frozenset(" .,!?")
+
+_stop_words: Optional[FrozenSet[str]] = None
+_stop_words_lock = threading.Lock()
+
+
+def get_stop_words() -> FrozenSet[str]:
+    """Return the English stopword set, loading the corpus only once."""
+    global _stop_words
+    if _stop_words is None:
+        with _stop_words_lock:
+            if _stop_words is None:
+                _stop_words = frozenset(stopwords.words("english"))
+    return _stop_words
+
+
+@dataclass(frozen=True)
+class QueryFeatures:
+    """Everything the complexity scorers and classifiers need from a query."""
+
+    tokens: Tuple[str, ...]
+    lexical_diversity: float
+    avg_word_length: float
+    special_char_density: float
+    number_density: float
+    task_type: str
+    question_type: str
+
+    @property
+    def token_count(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def complexity(self) -> float:
+        complexity = (
+            (self.token_count / 100) * 0.3  # Length factor
+            + self.lexical_diversity * 0.3  # Vocabulary richness
+            + (self.avg_word_length / 10) * 0.2  # Word complexity
+            + self.special_char_density * 0.1  # Special character density
+            + self.number_density * 0.1  # Number density
+        )
+        return min(complexity, 1.0)
+
+
+def extract_query_features(
+    query: str, classifier: KeywordClassifier = default_classifier
+) -> QueryFeatures:
+    """Compute all query features in a single pass, without caching."""
+    query_lower = query.lower()
+    stop_words = get_stop_words()
+    tokens = tuple(
+        word for word in word_tokenize(query_lower) if word not in stop_words
+    )
+
+    special_chars = 0
+    numbers = 0
+    for char in query:
+        if char.isdigit():
+            numbers += 1
+        elif not char.isalnum() and char not in IGNORED_SPECIAL_CHARS:
+            special_chars += 1
+
+    task_type, question_type = classifier.classify(query_lower)
+    token_count = len(tokens)
+    query_length = len(query)
+    return QueryFeatures(
+        tokens=tokens,
+        lexical_diversity=(
+            len(set(tokens)) / token_count if token_count else 0.0
+        ),
+        avg_word_length=(
+            sum(len(word) for word in tokens) / token_count
+            if token_count
+            else 0.0
+        ),
+        special_char_density=(
+            special_chars / query_length if query_length else 0.0
+        ),
+        number_density=numbers / query_length if query_length else 0.0,
+        task_type=task_type,
+        question_type=question_type,
+    )
+
+
+class QueryFeatureCache:
+    """Thread-safe bounded LRU of QueryFeatures keyed by query hash."""
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        classifier: KeywordClassifier = default_classifier,
+    ):
+        self.max_size = max_size
+        self.classifier = classifier
+        self._entries: "OrderedDict[bytes, QueryFeatures]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str) -> bytes:
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, query: str) -> QueryFeatures:
+        key = self._key(query)
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return features
+            self.misses += 1
+
+        features = extract_query_features(query, self.classifier)
+
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return features
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+feature_cache = QueryFeatureCache()
+
+
+def get_query_features(query: str) -> QueryFeatures:
+    """Return the (memoized) features for a query."""
+    return feature_cache.get(query)
+
+
+def assess_complexity(query: str) -> float:
+    """Complexity score in [0, 1] shared by every component."""
+    return get_query_features(query).complexity
@@ -1,6 +1,14 @@
 from langchain_openai import OpenAIEmbeddings, OpenAI
 from langchain_community.vectorstores import Pinecone as LangchainPinecone
 from langchain.chains import RetrievalQA
+from .chunked_ingestion import (
+    Chunk,
+    chunk_blocks,
+    chunk_text,
+    document_id,
+    ingest_chunks,
+)
+from .document_extractor import TextBlock
 from .perplexity_search import perplexity_search
 from .pinecone_db import (
     upsert_vectors,
@@ -8,20 +16,36 @@ from .pinecone_db import (
     delete_vectors,
     check_pinecone_health,
 )
+from .query_features import assess_complexity
 from .redis_cache import RedisCache
+from .semantic_cache import SemanticCache, invalidate_semantic_caches
+from .single_flight import coalesce_key, get_single_flight
 import os
 import logging
 import json
-from typing import List, Dict, Any
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-
-nltk.download("punkt", quiet=True)
-nltk.download("stopwords", quiet=True)
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Changed by every ingestion and part of the keys of cached answers, so
+# that new documents retire them in every worker
+CORPUS_VERSION_KEY = "rag_corpus_version"
+# Outlives any cached answer: once the version expires, nothing is left
+# under the default version it falls back to
+CORPUS_VERSION_TTL = 7 * 24 * 3600
+
+
+def corpus_version() -> str:
+    return RedisCache.get(CORPUS_VERSION_KEY) or "0"
+
+
+def bump_corpus_version() -> str:
+    version = uuid.uuid4().hex
+    RedisCache.set(CORPUS_VERSION_KEY, version, expiration=CORPUS_VERSION_TTL)
+    return version
+
 
 class RAGSystem:
     def __init__(self):
@@ -32,6 +56,26 @@ class RAGSystem:
         self.dimension = int(os.getenv("PINECONE_DIMENSION", "1536"))
         self.cloud = os.getenv("PINECONE_CLOUD", "aws")
         self.region = os.getenv("PINECONE_ENVIRONMENT")
+        self.chunk_tokens = int(os.getenv("RAG_CHUNK_TOKENS", 400))
+        self.chunk_overlap_tokens = int(
+            os.getenv("RAG_CHUNK_OVERLAP_TOKENS", 50)
+        )
+        self.embed_batch_size = int(os.getenv("RAG_EMBED_BATCH_SIZE", 64))
+        self.embed_concurrency = int(os.getenv("RAG_EMBED_CONCURRENCY", 4))
+        self.upsert_batch_size = int(os.getenv("RAG_UPSERT_BATCH_SIZE", 100))
+        self._seen_corpus_version: Optional[str] = None
+        self.semantic_cache = (
+            SemanticCache(
+                self.embeddings.embed_query,
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95)),
+                ttl=int(os.getenv("SEMANTIC_CACHE_TTL", 3600)),
+                max_entries=int(
+                    os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000)
+                ),
+            )
+            if os.getenv("SEMANTIC_CACHE_ENABLED", "False").lower() == "true"
+            else None
+        )
 
         if check_pinecone_health():
             self.vectorstore = LangchainPinecone.from_existing_index(
@@ -53,7 +97,7 @@ class RAGSystem:
     def query(self, question: str, use_perplexity: bool = False) -> str:
         try:
             # Check cache first
-            cache_key = f"rag_query:{question}"
+            cache_key = f"rag_query:{self._corpus_version()}:{question}"
             cached_result = RedisCache.get(cache_key)
             if cached_result:
                 logger.info(
@@ -81,33 +125,90 @@ class RAGSystem:
             logger.error(f"Error in RAG query: {str(e)}", exc_info=True)
             return f"An error occurred while processing your query: {str(e)}"
 
-    def add_document(self, text: str, metadata: dict = None):
-        try:
-            # Generate embedding
-            embedding = self.embeddings.embed_query(text)
+    def add_document(
+        self,
+        text: str,
+        metadata: dict = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+    ):
+        """
+        Split a document into overlapping chunks, embed them in batches and
+        upsert them in batches. `progress(counter, count)` is told about
+        "chunks_embedded" and "vectors_upserted" as they happen.
+        """
+        self._ingest(
+            chunk_text(text, self.chunk_tokens, self.chunk_overlap_tokens),
+            document_id(text),
+            metadata,
+            progress,
+        )
+
+    def add_blocks(
+        self,
+        blocks: Iterable[TextBlock],
+        doc_id: str,
+        metadata: dict = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+    ):
+        """
+        add_document() for a document read as TextBlocks (see
+        document_extractor.iter_blocks), chunked as the blocks arrive.
+        Chunks keep the page they start on. `doc_id` names the vectors.
+        """
+        self._ingest(
+            chunk_blocks(blocks, self.chunk_tokens, self.chunk_overlap_tokens),
+            doc_id,
+            metadata,
+            progress,
+        )
 
-            # Prepare vector for upsert
-            vector = {
-                "id": f"doc_{len(text)}_{hash(text)}",  # Generate a unique ID
-                "values": embedding,
-                "metadata": metadata or {},
-            }
+    def _ingest(
+        self,
+        chunks: Iterable[Chunk],
+        doc_id: str,
+        metadata: Optional[dict],
+        progress: Optional[Callable[[str, int], None]],
+    ):
+        try:
+            start_time = time.perf_counter()
+            count = ingest_chunks(
+                chunks,
+                self.embeddings.embed_documents,
+                upsert_vectors,
+                f"doc_{doc_id}",
+                metadata,
+                embed_batch_size=self.embed_batch_size,
+                embed_concurrency=self.embed_concurrency,
+                upsert_batch_size=self.upsert_batch_size,
+                progress=progress,
+            )
 
-            # Upsert vector to Pinecone
-            upsert_vectors([vector])
+            # Cached answers may be outdated by the new document
+            self._seen_corpus_version = bump_corpus_version()
+            invalidate_semantic_caches()
 
+            elapsed = time.perf_counter() - start_time
             logger.info(
-                f"Successfully added document to RAG system. Metadata: {metadata}"
+                f"Successfully added document to RAG system: {count} chunks "
+                f"in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.1f} "
+                f"chunks/s). Metadata: {metadata}"
             )
         except Exception as e:
             logger.error(
                 f"Error adding document to RAG system: {str(e)}", exc_info=True
             )
+            raise
 
     def hybrid_query(self, question: str) -> str:
+        # Concurrent identical questions share one retrieval
+        return get_single_flight("hybrid_query").do(
+            coalesce_key(question), lambda: self._hybrid_query(question)
+        )
+
+    def _hybrid_query(self, question: str) -> str:
         try:
             # Check cache first
-            cache_key = f"hybrid_query:{question}"
+            cache_key = f"hybrid_query:{self._corpus_version()}:{question}"
             cached_result = RedisCache.get(cache_key)
             if cached_result:
                 logger.info(
@@ -115,6 +216,16 @@ class RAGSystem:
                 )
                 return cached_result
 
+            semantic = None
+            if self.semantic_cache is not None:
+                semantic = self.semantic_cache.lookup(question)
+                if semantic.hit:
+                    logger.info(
+                        f"Semantic cache hit ({semantic.similarity:.3f}) for "
+                        f"question: {question[:50]}..."
+                    )
+                    return semantic.answer
+
             # Attempt to use Pinecone-based retrieval first
             pinecone_result = self.qa.invoke(question)
 
@@ -138,46 +249,28 @@ class RAGSystem:
             RedisCache.set(
                 cache_key, result, expiration=3600
             )  # Cache for 1 hour
+            if semantic is not None:
+                self.semantic_cache.store(question, result, semantic)
 
             return result
         except Exception as e:
             logger.error(f"Error in hybrid query: {str(e)}", exc_info=True)
             return f"An error occurred while processing your hybrid query: {str(e)}"
 
-    def assess_complexity(self, query: str) -> float:
-        # Tokenize the query
-        tokens = word_tokenize(query.lower())
-
-        # Remove stopwords
-        stop_words = set(stopwords.words("english"))
-        tokens = [word for word in tokens if word not in stop_words]
+    def _corpus_version(self) -> str:
+        """
+        The current corpus version. A change made by another worker's
+        ingestion also empties this process's semantic caches.
+        """
+        version = corpus_version()
+        if version != self._seen_corpus_version:
+            if self._seen_corpus_version is not None:
+                invalidate_semantic_caches()
+            self._seen_corpus_version = version
+        return version
 
-        # Calculate lexical diversity
-        lexical_diversity = len(set(tokens)) / len(tokens) if tokens else 0
-
-        # Calculate average word length
-        avg_word_length = (
-            sum(len(word) for word in tokens) / len(tokens) if tokens else 0
-        )
-
-        # Count special characters and numbers
-        special_chars = sum(
-            1
-            for char in query
-            if not char.isalnum() and char not in [" ", ".", ",", "!", "?"]
-        )
-        numbers = sum(1 for char in query if char.isdigit())
-
-        # Calculate complexity score
-        complexity = (
-            (len(tokens) / 100) * 0.3  # Length factor
-            + lexical_diversity * 0.3  # Vocabulary richness
-            + (avg_word_length / 10) * 0.2  # Word complexity
-            + (special_chars / len(query)) * 0.1  # Special character density
-            + (numbers / len(query)) * 0.1  # Number density
-        )
-
-        return min(complexity, 1.0)
+    def assess_complexity(self, query: str) -> float:
+        return assess_complexity(query)
 
     def clear_cache(self):
         # This method can be called periodically to clear the cache
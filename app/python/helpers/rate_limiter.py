@@ -1,10 +1,33 @@
+"""
+RateLimiter: sliding-window limits on calls, input tokens and output tokens.
+
+A call is admitted once the last `window_seconds` leave room for one more
+call and its input tokens and the output tokens recorded so far are under
+their limit (a limit of 0 disables that check). Output tokens are only
+known after a call, so they are added with release() and count against
+later admissions. Window totals are kept up to date as calls are added,
+expire and report output, so admission does not depend on how many calls
+are in the window; a waiter sleeps until the exact moment enough calls
+will have expired.
+
+Waiters are admitted strictly first come, first served. Coroutines wait
+with `await acquire(tokens)` or `async with limiter:` and never block the
+event loop; worker threads can use the blocking facade (`with limiter:`,
+limit_call_and_input). Both kinds of waiter share one queue.
+
+create_rate_limiter() picks this, the AdaptiveRateLimiter that follows the
+provider's rate-limit headers and 429s, or the Redis-backed
+RedisRateLimiter, whose window is shared by all worker processes.
+"""
+
+import asyncio
+import threading
 import time
 from collections import deque
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Any, Deque, Dict, Optional, Tuple
 from .print_style import PrintStyle
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -14,6 +37,39 @@ class CallRecord:
     timestamp: float
     input_tokens: int
     output_tokens: int = 0  # Default to 0, will be set separately
+    # Set when the call was admitted by a shared (Redis) window
+    call_id: Optional[str] = None
+
+
+class _ThreadWaiter:
+    def __init__(self, input_tokens: int):
+        self.input_tokens = input_tokens
+        self.event = threading.Event()
+
+    def notify(self) -> None:
+        self.event.set()
+
+    def wait(self, timeout: Optional[float]) -> None:
+        self.event.wait(timeout)
+        self.event.clear()
+
+
+class _AsyncWaiter:
+    def __init__(self, input_tokens: int):
+        self.input_tokens = input_tokens
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self) -> None:
+        # May be called from another thread or event loop
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout: Optional[float]) -> None:
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
 
 
 class RateLimiter:
@@ -24,90 +80,268 @@ class RateLimiter:
         self.max_input_tokens = max_input_tokens
         self.max_output_tokens = max_output_tokens
         self.window_seconds = window_seconds
-        self.calls = 0
-        self.input_tokens = 0
-        self.output_tokens = 0
-        self.start_time = time.time()
-        self.call_records = deque()  # Add this line to initialize call_records
-
-    def check_and_update(self):
-        current_time = time.time()
-        if current_time - self.start_time > self.window_seconds:
-            self.calls = 0
-            self.input_tokens = 0
-            self.output_tokens = 0
-            self.start_time = current_time
-
-        if (
-            self.calls < self.max_calls
-            and self.input_tokens < self.max_input_tokens
-            and self.output_tokens < self.max_output_tokens
-        ):
-            self.calls += 1
-            return True
-        return False
+        self.clock = time.monotonic
+        self.call_records: Deque[CallRecord] = deque()
+        # Running totals over call_records
+        self._input_total = 0
+        self._output_total = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
 
     def _clean_old_records(self, current_time: float):
         while (
             self.call_records
             and current_time - self.call_records[0].timestamp
-            > self.window_seconds
+            >= self.window_seconds
         ):
-            self.call_records.popleft()
+            record = self.call_records.popleft()
+            self._input_total -= record.input_tokens
+            self._output_total -= record.output_tokens
 
     def _get_counts(self) -> Tuple[int, int, int]:
-        calls = len(self.call_records)
-        input_tokens = sum(record.input_tokens for record in self.call_records)
-        output_tokens = sum(
-            record.output_tokens for record in self.call_records
+        return len(self.call_records), self._input_total, self._output_total
+
+    def headroom(self) -> float:
+        """Free share (0-1) of the tightest limit in the current window."""
+        with self._lock:
+            self._clean_old_records(self.clock())
+            return self._headroom(*self._get_counts())
+
+    def _headroom(
+        self, calls: int, input_tokens: int, output_tokens: int
+    ) -> float:
+        free = 1.0
+        for used, limit in (
+            (calls, self.max_calls),
+            (input_tokens, self.max_input_tokens),
+            (output_tokens, self.max_output_tokens),
+        ):
+            if limit > 0:
+                free = min(free, max(1.0 - used / limit, 0.0))
+        return free
+
+    def _in_window(self, record: CallRecord) -> bool:
+        # Expired records leave from the front, all equal timestamps at once
+        return bool(self.call_records) and (
+            record.timestamp >= self.call_records[0].timestamp
         )
-        return calls, input_tokens, output_tokens
-
-    def _wait_if_needed(self, current_time: float, new_input_tokens: int):
-        while True:
-            self._clean_old_records(current_time)
-            calls, input_tokens, output_tokens = self._get_counts()
-
-            wait_reasons = []
-            if self.max_calls > 0 and calls >= self.max_calls:
-                wait_reasons.append("max calls")
-            if (
-                self.max_input_tokens > 0
-                and input_tokens + new_input_tokens > self.max_input_tokens
-            ):
-                wait_reasons.append("max input tokens")
-            if (
-                self.max_output_tokens > 0
-                and output_tokens >= self.max_output_tokens
-            ):
-                wait_reasons.append("max output tokens")
-
-            if not wait_reasons:
+
+    def _wait_time(self, current_time: float, new_input_tokens: int) -> float:
+        """
+        Seconds until enough calls expire for this one to fit (0: it fits
+        now). Output tokens reported meanwhile can push that further out.
+        """
+        self._clean_old_records(current_time)
+        # A call too large for an empty window could never be admitted
+        if not self.call_records:
+            return 0.0
+        calls, input_tokens, output_tokens = self._get_counts()
+
+        # How much has to expire before the new call fits
+        excess_calls = calls - self.max_calls + 1 if self.max_calls > 0 else 0
+        excess_input = (
+            input_tokens + new_input_tokens - self.max_input_tokens
+            if self.max_input_tokens > 0
+            else 0
+        )
+        excess_output = (
+            output_tokens - self.max_output_tokens + 1
+            if self.max_output_tokens > 0
+            else 0
+        )
+        if excess_calls <= 0 and excess_input <= 0 and excess_output <= 0:
+            return 0.0
+
+        # Walk from the oldest call only as far as needed; once the window
+        # is empty any call fits
+        last_needed = self.call_records[-1]
+        for record in self.call_records:
+            excess_calls -= 1
+            excess_input -= record.input_tokens
+            excess_output -= record.output_tokens
+            if excess_calls <= 0 and excess_input <= 0 and excess_output <= 0:
+                last_needed = record
                 break
+        return last_needed.timestamp + self.window_seconds - current_time
 
-            oldest_record = self.call_records[0]
-            wait_time = (
-                oldest_record.timestamp + self.window_seconds - current_time
-            )
-            if wait_time > 0:
-                PrintStyle(font_color="yellow", padding=True).print(
-                    f"Rate limit exceeded. Waiting for {wait_time:.2f} seconds due to: {', '.join(wait_reasons)}"
-                )
-                time.sleep(wait_time)
-            current_time = time.time()
+    def _try_admit(
+        self, waiter
+    ) -> Tuple[Optional[CallRecord], Optional[float]]:
+        """
+        Admit `waiter` if it is first in line and the window has room.
+        Returns its record, or None and how long to wait (None: until
+        notified, because someone else is first).
+        """
+        with self._lock:
+            if self._waiters[0] is not waiter:
+                return None, None
+            record, wait_time = self._admit(self.clock(), waiter.input_tokens)
+            if record is None:
+                return None, wait_time
+            self._waiters.popleft()
+            if self._waiters:
+                self._waiters[0].notify()
+            return record, 0.0
+
+    async def _try_admit_async(
+        self, waiter
+    ) -> Tuple[Optional[CallRecord], Optional[float]]:
+        return self._try_admit(waiter)
+
+    def _admit(
+        self, current_time: float, input_tokens: int
+    ) -> Tuple[Optional[CallRecord], float]:
+        """Record a call if the window has room, else say how long to wait."""
+        wait_time = self._wait_time(current_time, input_tokens)
+        if wait_time > 0:
+            return None, wait_time
+        record = CallRecord(current_time, input_tokens)
+        self.call_records.append(record)
+        self._input_total += input_tokens
+        return record, 0.0
+
+    def _enqueue(self, waiter) -> None:
+        with self._lock:
+            self._waiters.append(waiter)
+
+    def _abandon(self, waiter) -> None:
+        with self._lock:
+            was_first = self._waiters and self._waiters[0] is waiter
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return
+            if was_first and self._waiters:
+                self._waiters[0].notify()
+
+    @staticmethod
+    def _announce_wait(wait_time: float) -> None:
+        PrintStyle(font_color="yellow", padding=True).print(
+            f"Rate limit exceeded. Waiting for {wait_time:.2f} seconds"
+        )
+
+    async def acquire(self, input_tokens: int = 0) -> CallRecord:
+        """Wait (without blocking the event loop) until a call may start."""
+        waiter = _AsyncWaiter(input_tokens)
+        self._enqueue(waiter)
+        announced = False
+        try:
+            while True:
+                record, wait_time = await self._try_admit_async(waiter)
+                if record is not None:
+                    return record
+                if wait_time is not None and not announced:
+                    self._announce_wait(wait_time)
+                    announced = True
+                await waiter.wait(wait_time)
+        except BaseException:
+            self._abandon(waiter)
+            raise
 
     def limit_call_and_input(self, input_token_count: int) -> CallRecord:
-        current_time = time.time()
-        self._wait_if_needed(current_time, input_token_count)
-        new_record = CallRecord(current_time, input_token_count)
-        self.call_records.append(new_record)
-        return new_record
+        """Blocking acquire() for worker threads."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                "Blocking rate limiter call inside an event loop; "
+                "use 'await acquire()' or run it in a worker thread"
+            )
+        waiter = _ThreadWaiter(input_token_count)
+        self._enqueue(waiter)
+        announced = False
+        try:
+            while True:
+                record, wait_time = self._try_admit(waiter)
+                if record is not None:
+                    return record
+                if wait_time is not None and not announced:
+                    self._announce_wait(wait_time)
+                    announced = True
+                waiter.wait(wait_time)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def release(
+        self, output_tokens: int = 0, record: Optional[CallRecord] = None
+    ) -> None:
+        """Add a finished call's output tokens (default: the latest call)."""
+        if not output_tokens:
+            return
+        with self._lock:
+            if record is None:
+                if not self.call_records:
+                    return
+                record = self.call_records[-1]
+            record.output_tokens += output_tokens
+            if self._in_window(record):
+                self._output_total += output_tokens
+
+    async def arelease(
+        self, output_tokens: int = 0, record: Optional[CallRecord] = None
+    ) -> None:
+        """release() for coroutines."""
+        self.release(output_tokens, record)
 
     def set_output_tokens(self, output_token_count: int):
-        if self.call_records:
-            self.call_records[-1].output_tokens += output_token_count
+        self.release(output_token_count)
         return self
 
+    async def __aenter__(self) -> CallRecord:
+        return await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def __enter__(self) -> CallRecord:
+        return self.limit_call_and_input(0)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def create_rate_limiter(
+    config: Dict[str, Any],
+    name: str,
+    max_calls: int,
+    max_input_tokens: int,
+    max_output_tokens: int,
+    window_seconds: float,
+) -> RateLimiter:
+    """
+    A limiter for `name`: local to this process (adaptive unless
+    config["rate_limit_adaptive"] is off), or shared by all workers through
+    Redis when config["rate_limit_backend"] is "redis".
+    """
+    if config.get("rate_limit_backend", "local") == "redis":
+        # Imported here: the Redis limiter builds on this module
+        from .redis_rate_limiter import RedisRateLimiter
+
+        return RedisRateLimiter.from_config(
+            config,
+            name,
+            max_calls,
+            max_input_tokens,
+            max_output_tokens,
+            window_seconds,
+        )
+    if config.get("rate_limit_adaptive", True):
+        from .adaptive_rate_limiter import AdaptiveRateLimiter
+
+        return AdaptiveRateLimiter.from_config(
+            config,
+            max_calls,
+            max_input_tokens,
+            max_output_tokens,
+            window_seconds,
+        )
+    return RateLimiter(
+        max_calls, max_input_tokens, max_output_tokens, window_seconds
+    )
+
 
 # Example usage
 rate_limiter = RateLimiter(
@@ -145,6 +145,16 @@ class RedisCache:
             return False
 
 
+def close_connections():
+    """Close the Redis connection pools (on server shutdown)."""
+    for client in (redis_client, docker_redis_client):
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                logger.error(f"Error closing Redis client: {str(e)}")
+
+
 # Perform initial health check
 if RedisCache.check_redis_health():
     logger.info("Redis connection established successfully")
@@ -0,0 +1,317 @@
+"""
+RedisRateLimiter: a RateLimiter whose window is shared by every worker
+process through Redis.
+
+The window lives in Redis (a sorted set of call ids by admission time, their
+token counts and running totals) and is only changed by Lua scripts, so the
+expire-check-admit step is atomic across processes. Times come from the
+Redis server clock, so workers on different hosts agree on the window.
+
+Within a process waiters still queue first come, first served; between
+processes the first to retry after the computed wait gets the slot. If Redis
+cannot be reached the limiter enforces the same limits locally and tries
+Redis again after `retry_seconds`.
+
+Coroutines never wait on Redis: admissions and arelease() run the scripts
+in a worker thread, and headroom() answers from a reading at most
+`headroom_ttl` seconds old, refreshing it in a worker thread when called
+on an event loop.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+
+from .rate_limiter import CallRecord, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Drops calls older than the window (ARGV[1], in us) from KEYS[1] (zset id ->
+# admission time in us), their token counts from KEYS[2] (hash "id:in" /
+# "id:out") and the running totals in KEYS[3] (hash input/output), then
+# reads the window.
+EXPIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local window = tonumber(ARGV[1])
+
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now - window)
+for _, id in ipairs(expired) do
+    local used = redis.call('HMGET', KEYS[2], id .. ':in', id .. ':out')
+    redis.call('HINCRBY', KEYS[3], 'input', -(tonumber(used[1]) or 0))
+    redis.call('HINCRBY', KEYS[3], 'output', -(tonumber(used[2]) or 0))
+    redis.call('HDEL', KEYS[2], id .. ':in', id .. ':out')
+end
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+end
+
+local calls = redis.call('ZCARD', KEYS[1])
+local totals = redis.call('HMGET', KEYS[3], 'input', 'output')
+"""
+
+# KEYS: calls, tokens, totals, sequence
+# ARGV: window us, max calls, max input tokens, max output tokens, input tokens
+# Returns {id, ""} when admitted, {"", wait in us} otherwise.
+ADMIT_SCRIPT = EXPIRE_SCRIPT + """
+local max_calls = tonumber(ARGV[2])
+local max_input = tonumber(ARGV[3])
+local max_output = tonumber(ARGV[4])
+local input_tokens = tonumber(ARGV[5])
+local excess_calls = 0
+local excess_input = 0
+local excess_output = 0
+if max_calls > 0 then
+    excess_calls = calls - max_calls + 1
+end
+if max_input > 0 then
+    excess_input = (tonumber(totals[1]) or 0) + input_tokens - max_input
+end
+if max_output > 0 then
+    excess_output = (tonumber(totals[2]) or 0) - max_output + 1
+end
+
+if calls == 0 or (excess_calls <= 0 and excess_input <= 0
+        and excess_output <= 0) then
+    local id = tostring(redis.call('INCR', KEYS[4]))
+    redis.call('ZADD', KEYS[1], now, id)
+    redis.call('HSET', KEYS[2], id .. ':in', input_tokens, id .. ':out', 0)
+    redis.call('HINCRBY', KEYS[3], 'input', input_tokens)
+    -- An idle window disappears on its own
+    local ttl = math.ceil(window / 1000) + 1000
+    for i = 1, 4 do
+        redis.call('PEXPIRE', KEYS[i], ttl)
+    end
+    return {id, ''}
+end
+
+-- Walk from the oldest call until enough would have expired
+local batch = 128
+local start = 0
+local expires = nil
+while expires == nil do
+    local entries = redis.call(
+        'ZRANGE', KEYS[1], start, start + batch - 1, 'WITHSCORES')
+    if #entries == 0 then
+        break
+    end
+    for i = 1, #entries, 2 do
+        local used = redis.call(
+            'HMGET', KEYS[2], entries[i] .. ':in', entries[i] .. ':out')
+        excess_calls = excess_calls - 1
+        excess_input = excess_input - (tonumber(used[1]) or 0)
+        excess_output = excess_output - (tonumber(used[2]) or 0)
+        expires = tonumber(entries[i + 1]) + window
+        if excess_calls <= 0 and excess_input <= 0
+                and excess_output <= 0 then
+            break
+        end
+    end
+    if excess_calls <= 0 and excess_input <= 0 and excess_output <= 0 then
+        break
+    end
+    expires = nil
+    start = start + batch
+end
+if expires == nil then
+    local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+    expires = tonumber(newest[2]) + window
+end
+return {'', tostring(math.max(expires - now, 1))}
+"""
+
+# KEYS: calls, tokens, totals; ARGV: window us
+# Returns {calls, input tokens, output tokens} in the window.
+USAGE_SCRIPT = EXPIRE_SCRIPT + """
+return {calls, tonumber(totals[1]) or 0, tonumber(totals[2]) or 0}
+"""
+
+# KEYS: calls, tokens, totals; ARGV: call id, output tokens
+RELEASE_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('HINCRBY', KEYS[2], ARGV[1] .. ':out', ARGV[2])
+    redis.call('HINCRBY', KEYS[3], 'output', ARGV[2])
+end
+return 1
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    def __init__(
+        self,
+        client: redis.Redis,
+        name: str,
+        max_calls: int,
+        max_input_tokens: int,
+        max_output_tokens: int,
+        window_seconds: float,
+        retry_seconds: float = 30.0,
+        headroom_ttl: float = 1.0,
+    ):
+        super().__init__(
+            max_calls, max_input_tokens, max_output_tokens, window_seconds
+        )
+        self.client = client
+        self.name = name
+        self.retry_seconds = retry_seconds
+        # One hash slot for all keys, so the scripts also run on a cluster
+        prefix = f"rate_limit:{{{name}}}"
+        self.keys = [
+            f"{prefix}:calls",
+            f"{prefix}:tokens",
+            f"{prefix}:totals",
+            f"{prefix}:seq",
+        ]
+        self._admit_script = client.register_script(ADMIT_SCRIPT)
+        self._release_script = client.register_script(RELEASE_SCRIPT)
+        self._usage_script = client.register_script(USAGE_SCRIPT)
+        self._redis_retry_at = 0.0
+        self._last_record: Optional[CallRecord] = None
+        self.headroom_ttl = headroom_ttl
+        self._headroom_reading: Optional[float] = None
+        self._headroom_read_at = float("-inf")
+        self._headroom_refreshing = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        name: str,
+        max_calls: int,
+        max_input_tokens: int,
+        max_output_tokens: int,
+        window_seconds: float,
+    ) -> "RedisRateLimiter":
+        client = redis.Redis.from_url(
+            config.get("rate_limit_redis_url", "redis://localhost:6379/0"),
+            socket_timeout=config.get("rate_limit_redis_timeout", 0.5),
+            socket_connect_timeout=config.get("rate_limit_redis_timeout", 0.5),
+        )
+        return cls(
+            client,
+            name,
+            max_calls,
+            max_input_tokens,
+            max_output_tokens,
+            window_seconds,
+            retry_seconds=config.get("rate_limit_redis_retry_seconds", 30.0),
+            headroom_ttl=config.get("rate_limit_redis_headroom_ttl", 1.0),
+        )
+
+    @property
+    def using_redis(self) -> bool:
+        return self.clock() >= self._redis_retry_at
+
+    def _redis_failed(self, error: Exception) -> None:
+        if self.using_redis:
+            logger.warning(
+                f"Redis rate limiter '{self.name}' unavailable, limiting "
+                f"locally for {self.retry_seconds}s: {str(error)}"
+            )
+        self._redis_retry_at = self.clock() + self.retry_seconds
+
+    def _admit(
+        self, current_time: float, input_tokens: int
+    ) -> Tuple[Optional[CallRecord], float]:
+        if self.using_redis:
+            try:
+                call_id, wait_us = self._admit_script(
+                    keys=self.keys,
+                    args=[
+                        int(self.window_seconds * 1_000_000),
+                        self.max_calls,
+                        self.max_input_tokens,
+                        self.max_output_tokens,
+                        input_tokens,
+                    ],
+                )
+            except redis.RedisError as e:
+                self._redis_failed(e)
+            else:
+                if not call_id:
+                    return None, int(wait_us) / 1_000_000
+                record = CallRecord(
+                    current_time, input_tokens, call_id=call_id.decode()
+                )
+                self._last_record = record
+                return record, 0.0
+
+        record, wait_time = super()._admit(current_time, input_tokens)
+        if record is not None:
+            self._last_record = record
+        return record, wait_time
+
+    def headroom(self) -> float:
+        if (
+            self._headroom_reading is not None
+            and self.clock() - self._headroom_read_at < self.headroom_ttl
+        ):
+            return self._headroom_reading
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._read_headroom()
+        # Routing answers from the last reading rather than wait on Redis
+        if self._headroom_refreshing.acquire(blocking=False):
+            loop.run_in_executor(None, self._refresh_headroom)
+        if self._headroom_reading is None:
+            return super().headroom()
+        return self._headroom_reading
+
+    def _refresh_headroom(self) -> None:
+        try:
+            self._read_headroom()
+        finally:
+            self._headroom_refreshing.release()
+
+    def _read_headroom(self) -> float:
+        headroom = None
+        if self.using_redis:
+            try:
+                usage = self._usage_script(
+                    keys=self.keys[:3],
+                    args=[int(self.window_seconds * 1_000_000)],
+                )
+            except redis.RedisError as e:
+                self._redis_failed(e)
+            else:
+                headroom = self._headroom(*(int(value) for value in usage))
+        if headroom is None:
+            headroom = super().headroom()
+        self._headroom_reading = headroom
+        self._headroom_read_at = self.clock()
+        return headroom
+
+    async def _try_admit_async(
+        self, waiter
+    ) -> Tuple[Optional[CallRecord], Optional[float]]:
+        # The Redis round trip must not hold up the event loop
+        return await asyncio.to_thread(self._try_admit, waiter)
+
+    def release(
+        self, output_tokens: int = 0, record: Optional[CallRecord] = None
+    ) -> None:
+        if not output_tokens:
+            return
+        record = record or self._last_record
+        if record is None or record.call_id is None:
+            super().release(output_tokens, record)
+            return
+        record.output_tokens += output_tokens
+        try:
+            self._release_script(
+                keys=self.keys[:3], args=[record.call_id, output_tokens]
+            )
+        except redis.RedisError as e:
+            logger.error(
+                f"Could not record output tokens for '{self.name}': {str(e)}"
+            )
+
+    async def arelease(
+        self, output_tokens: int = 0, record: Optional[CallRecord] = None
+    ) -> None:
+        if output_tokens:
+            await asyncio.to_thread(self.release, output_tokens, record)
@@ -0,0 +1,129 @@
+"""
+ResponseCache: exact-match cache of model answers, stored in RedisCache.
+
+Entries are keyed by a hash of the model, its sampling settings and the
+normalized message list, so only a byte-for-byte repeat of a conversation
+(modulo whitespace) is served from the cache. Only response strategies that
+opt in (by default the factual "direct_answer" one) at low enough
+temperatures are cached.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from .redis_cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHED_STRATEGIES = frozenset({"direct_answer"})
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_TEMPERATURE = 0.7
+KEY_PREFIX = "llm_response:"
+
+
+def normalize_messages(
+    messages: Iterable[Dict[str, str]],
+) -> List[List[str]]:
+    """Roles and contents with Unicode and whitespace differences removed."""
+    return [
+        [
+            message.get("role", "user"),
+            " ".join(
+                unicodedata.normalize(
+                    "NFC", message.get("content", "")
+                ).split()
+            ),
+        ]
+        for message in messages
+    ]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: int = DEFAULT_TTL_SECONDS,
+        strategies: Iterable[str] = DEFAULT_CACHED_STRATEGIES,
+        max_temperature: float = DEFAULT_MAX_TEMPERATURE,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.strategies: FrozenSet[str] = frozenset(strategies)
+        self.max_temperature = max_temperature
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ResponseCache":
+        return cls(
+            enabled=config.get("response_cache_enabled", True),
+            ttl=config.get("response_cache_ttl", DEFAULT_TTL_SECONDS),
+            strategies=config.get(
+                "response_cache_strategies", DEFAULT_CACHED_STRATEGIES
+            ),
+            max_temperature=config.get(
+                "response_cache_max_temperature", DEFAULT_MAX_TEMPERATURE
+            ),
+        )
+
+    def accepts(self, config: Dict[str, Any]) -> bool:
+        """Whether answers for this routed config may be cached."""
+        accepted = (
+            self.enabled
+            and config.get("response_strategy") in self.strategies
+            and config.get("temperature", 1.0) <= self.max_temperature
+        )
+        if not accepted:
+            with self._lock:
+                self.bypasses += 1
+        return accepted
+
+    @staticmethod
+    def key(config: Dict[str, Any], messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps(
+            [
+                config["model"],
+                config.get("temperature"),
+                config.get("max_tokens"),
+                normalize_messages(messages),
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return KEY_PREFIX + hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            cached = RedisCache.get(key)
+        except Exception as e:
+            logger.error(f"Error reading response cache: {str(e)}")
+            cached = None
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached or None
+
+    def set(self, key: str, response: Dict[str, Any]) -> None:
+        try:
+            RedisCache.set(key, response, expiration=self.ttl)
+        except Exception as e:
+            logger.error(f"Error writing response cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,213 @@
+"""
+SemanticCache: reuse answers to previously answered queries that mean the
+same thing.
+
+Queries are embedded and kept in a local FAISS inner-product index over
+L2-normalized vectors, so a search score is the cosine similarity. A lookup
+returns the stored answer of the most similar live entry at or above the
+similarity threshold. Entries expire after `ttl` seconds and the least
+recently used ones are evicted beyond `max_entries`.
+
+Ingesting documents can change what the right answer is, so
+invalidate_semantic_caches() empties every cache in the process.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 10000
+# Neighbours inspected per lookup, enough to skip a few expired entries
+SEARCH_K = 8
+
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def invalidate_semantic_caches() -> None:
+    """Drop every semantic cache entry, e.g. after new documents."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+
+@dataclass
+class SemanticCacheEntry:
+    query: str
+    answer: Any
+    created: float
+
+
+@dataclass
+class SemanticLookup:
+    """Result of a lookup; keep it to store the answer without re-embedding."""
+
+    embedding: np.ndarray
+    answer: Any = None
+    similarity: Optional[float] = None
+    matched_query: Optional[str] = None
+    # The cache's epoch when looked up; a store after a flush is dropped
+    epoch: Optional[int] = None
+
+    @property
+    def hit(self) -> bool:
+        return self.matched_query is not None
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]],
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index: Optional[faiss.IndexIDMap2] = None
+        # Insertion/access ordered, oldest first
+        self.entries: "OrderedDict[int, SemanticCacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._generation = _generation
+        # Bumped whenever the entries are flushed
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray([self.embed(query)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _check_generation(self) -> None:
+        if self._generation != _generation:
+            self._generation = _generation
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.entries:
+            self.invalidations += 1
+        self._epoch += 1
+        self.index = None
+        self.entries.clear()
+
+    def _remove(self, ids: List[int]) -> None:
+        for entry_id in ids:
+            del self.entries[entry_id]
+        if self.index is not None and ids:
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def lookup(self, query: str) -> SemanticLookup:
+        embedding = self._embed(query)
+        with self._lock:
+            self._check_generation()
+            if self.index is None or not self.entries:
+                self.misses += 1
+                return SemanticLookup(embedding, epoch=self._epoch)
+
+            scores, ids = self.index.search(
+                embedding, min(SEARCH_K, len(self.entries))
+            )
+            now = time.time()
+            expired = []
+            result = SemanticLookup(embedding, epoch=self._epoch)
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self.entries[int(entry_id)]
+                if now - entry.created > self.ttl:
+                    expired.append(int(entry_id))
+                    continue
+                self.entries.move_to_end(int(entry_id))
+                result.answer = entry.answer
+                result.similarity = float(score)
+                result.matched_query = entry.query
+                break
+            self._remove(expired)
+
+            if result.hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return result
+
+    def store(
+        self,
+        query: str,
+        answer: Any,
+        lookup: Optional[SemanticLookup] = None,
+    ) -> None:
+        """
+        Remember an answer; pass the miss's lookup to skip embedding.
+
+        An answer looked up before the cache was flushed may predate the
+        documents that caused the flush, so it is not stored.
+        """
+        embedding = lookup.embedding if lookup else self._embed(query)
+        with self._lock:
+            self._check_generation()
+            if lookup is not None and lookup.epoch not in (None, self._epoch):
+                return
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(
+                    faiss.IndexFlatIP(embedding.shape[1])
+                )
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(
+                embedding, np.asarray([entry_id], dtype=np.int64)
+            )
+            self.entries[entry_id] = SemanticCacheEntry(
+                query, answer, time.time()
+            )
+
+            if len(self.entries) > self.max_entries:
+                # Expired entries go first, then the least recently used
+                now = time.time()
+                evicted = [
+                    entry_id
+                    for entry_id, entry in self.entries.items()
+                    if now - entry.created > self.ttl
+                ]
+                expired = set(evicted)
+                excess = len(self.entries) - len(evicted) - self.max_entries
+                for entry_id in self.entries:
+                    if excess <= 0:
+                        break
+                    if entry_id not in expired:
+                        evicted.append(entry_id)
+                        excess -= 1
+                self._remove(evicted)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,43 @@
+"""
+Token estimates shared by the rate limiters, history windows, document
+chunking and the router's statistics.
+
+Provider tokenizers differ and are not all installed, so everything uses
+one rule of thumb: four characters per token, rounded up so that budgets
+and quotas err on the safe side.
+"""
+
+from typing import Any
+
+CHARS_PER_TOKEN = 4
+
+
+def chars_to_tokens(chars: int) -> int:
+    return -(-chars // CHARS_PER_TOKEN)
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Token count of a string or of a model input (a list of messages)."""
+    if isinstance(messages, str):
+        return chars_to_tokens(len(messages))
+    chars = 0
+    for message in messages:
+        if isinstance(message, dict):
+            content = message.get("content", "")
+        elif isinstance(message, (tuple, list)):
+            content = message[-1]
+        else:
+            content = getattr(message, "content", message)
+        chars += (
+            len(content) if isinstance(content, str) else len(str(content))
+        )
+    return chars_to_tokens(chars)
+
+
+def count_output_tokens(response: Any) -> int:
+    """Output tokens a model response reports, else estimated."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return usage["output_tokens"]
+    content = getattr(response, "content", None) or str(response)
+    return chars_to_tokens(len(str(content)))
@@ -1,7 +1,8 @@
 import time
 from typing import List, Dict, Any
 from app.python.helpers.tool import Tool, Response
-from app.python.helpers.rate_limiter import RateLimiter
+from app.models import get_model_rate_limiters
+from app.python.helpers.model_rate_limits import ModelLimits
 
 
 class HelperAgent:
@@ -14,8 +15,12 @@ class HelperAgent:
         window_seconds: int,
     ):
         self.model = model
-        self.rate_limiter = RateLimiter(
-            rate_limit, max_input_tokens, max_output_tokens, window_seconds
+        # Configured limits for the model (MODEL_RATE_LIMITS) take precedence
+        self.rate_limiter = get_model_rate_limiters().get_or_register(
+            model,
+            ModelLimits(
+                rate_limit, max_input_tokens, max_output_tokens, window_seconds
+            ),
         )
 
     def process(self, task: str) -> str:
@@ -0,0 +1,296 @@
+import json
+import threading
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import openai
+from tenacity import stop_after_attempt, wait_fixed
+
+from app.python.helpers import perplexity_search
+from app.python.helpers.adaptive_rate_limiter import (
+    AdaptiveRateLimiter,
+    ProviderThrottledError,
+    parse_duration,
+    parse_rate_limit_headers,
+    stop_if_throttled_for,
+    wait_for_provider,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """An OpenAI-compatible endpoint that plays back queued responses."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        server.requests += 1
+        status, headers = (
+            server.responses.pop(0) if server.responses else (200, {})
+        )
+        if status == 200:
+            body = {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "fake",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "ok"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 1,
+                    "total_tokens": 2,
+                },
+            }
+        else:
+            body = {"error": {"message": "Rate limit reached"}}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHeaderParsing(unittest.TestCase):
+    def test_durations(self):
+        self.assertEqual(parse_duration("7"), 7.0)
+        self.assertEqual(parse_duration("1m30s"), 90.0)
+        self.assertAlmostEqual(parse_duration("20ms"), 0.02)
+        self.assertAlmostEqual(parse_duration("6m0.5s"), 360.5)
+        soon = datetime.now(timezone.utc) + timedelta(seconds=30)
+        self.assertAlmostEqual(parse_duration(soon.isoformat()), 30, delta=2)
+        self.assertAlmostEqual(
+            parse_duration(format_datetime(soon, usegmt=True)), 30, delta=2
+        )
+        self.assertIsNone(parse_duration("soon"))
+
+    def test_openai_style_headers(self):
+        hints = parse_rate_limit_headers(
+            {
+                "X-RateLimit-Remaining-Requests": "3",
+                "X-RateLimit-Reset-Requests": "1.5s",
+                "X-RateLimit-Remaining-Tokens": "900",
+                "X-RateLimit-Reset-Tokens": "250ms",
+                "Retry-After": "2",
+            }
+        )
+        self.assertEqual(hints.remaining_requests, 3)
+        self.assertEqual(hints.requests_reset, 1.5)
+        self.assertEqual(hints.remaining_tokens, 900)
+        self.assertAlmostEqual(hints.tokens_reset, 0.25)
+        self.assertEqual(hints.retry_after, 2.0)
+
+    def test_anthropic_headers_use_tightest_token_budget(self):
+        reset = (
+            datetime.now(timezone.utc) + timedelta(seconds=10)
+        ).isoformat()
+        hints = parse_rate_limit_headers(
+            {
+                "anthropic-ratelimit-requests-remaining": "40",
+                "anthropic-ratelimit-tokens-remaining": "5000",
+                "anthropic-ratelimit-input-tokens-remaining": "1200",
+                "anthropic-ratelimit-input-tokens-reset": reset,
+                "retry-after-ms": "1500",
+            }
+        )
+        self.assertEqual(hints.remaining_requests, 40)
+        self.assertEqual(hints.remaining_tokens, 1200)
+        self.assertAlmostEqual(hints.tokens_reset, 10, delta=2)
+        self.assertEqual(hints.retry_after, 1.5)
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveRateLimiter(100, 10000, 0, 60)
+        self.limiter.clock = self.clock
+
+    def test_backs_off_multiplicatively_and_ramps_up_additively(self):
+        self.limiter.on_throttled(retry_after=1)
+        self.assertEqual(self.limiter.max_calls, 50)
+        self.assertEqual(self.limiter.max_input_tokens, 5000)
+        self.assertEqual(self.limiter.max_output_tokens, 0)
+        self.limiter.on_throttled()
+        self.assertEqual(self.limiter.max_calls, 25)
+
+        self.limiter.on_success()
+        self.assertEqual(self.limiter.max_calls, 30)
+        for _ in range(100):
+            self.limiter.on_success()
+        self.assertEqual(self.limiter.max_calls, 100)
+
+        for _ in range(20):
+            self.limiter.on_throttled()
+        self.assertEqual(self.limiter.max_calls, 5)
+        self.assertEqual(self.limiter.stats()["throttled"], 22)
+
+    def test_retry_after_pauses_calls(self):
+        self.assertEqual(self.limiter.on_throttled({"retry-after": "3"}), 3.0)
+        self.assertEqual(self.limiter.pause_remaining(), 3.0)
+        self.assertEqual(self.limiter._wait_time(self.clock(), 0), 3.0)
+        with self.assertRaises(ProviderThrottledError):
+            self.limiter.ensure_available(2)
+        self.limiter.ensure_available(5)
+        self.clock.now = 3.0
+        self.assertEqual(self.limiter.pause_remaining(), 0.0)
+
+    def test_follows_reported_remaining_requests(self):
+        self.limiter.on_success(
+            {
+                "x-ratelimit-remaining-requests": "1",
+                "x-ratelimit-reset-requests": "10s",
+            }
+        )
+        self.limiter.limit_call_and_input(0)
+        # The provider's last request is spent until its reset
+        self.assertEqual(self.limiter._wait_time(self.clock(), 0), 10.0)
+        self.clock.now = 10.0
+        self.assertEqual(self.limiter._wait_time(self.clock(), 0), 0.0)
+
+    def test_follows_reported_remaining_tokens(self):
+        self.limiter.on_success(
+            {
+                "x-ratelimit-remaining-tokens": "500",
+                "x-ratelimit-reset-tokens": "2s",
+            }
+        )
+        self.assertEqual(self.limiter._wait_time(self.clock(), 400), 0.0)
+        self.assertEqual(self.limiter._wait_time(self.clock(), 600), 2.0)
+
+    def test_tenacity_helpers(self):
+        wait = wait_for_provider(self.limiter, wait_fixed(1))
+        stop = stop_if_throttled_for(self.limiter, 10)
+        self.assertEqual(wait(None), 1)
+        self.assertFalse(stop(None))
+        self.limiter.on_throttled(retry_after=5)
+        self.assertEqual(wait(None), 5)
+        self.assertFalse(stop(None))
+        self.limiter.on_throttled(retry_after=30)
+        self.assertTrue(stop(None))
+
+
+class FakeProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeProviderHandler
+        )
+        self.server.requests = 0
+        self.server.responses = []
+        thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+
+class TestPerplexityRetries(FakeProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.limiter = AdaptiveRateLimiter(50, 0, 0, 60)
+        patcher = patch.object(perplexity_search, "rate_limiter", self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.create = perplexity_search._create_completion.retry_with(
+            stop=stop_after_attempt(3)
+            | stop_if_throttled_for(self.limiter, 1),
+            wait=wait_for_provider(self.limiter, wait_fixed(0)),
+        )
+        self.client = openai.OpenAI(
+            api_key="test", base_url=self.base_url, max_retries=0
+        )
+
+    def complete(self):
+        return self.create(
+            self.client,
+            model="fake",
+            messages=[{"role": "user", "content": "hello"}],
+        )
+
+    def test_retry_waits_for_retry_after_and_learns_budget(self):
+        self.server.responses = [
+            (429, {"retry-after-ms": "200"}),
+            (
+                200,
+                {
+                    "x-ratelimit-remaining-requests": "7",
+                    "x-ratelimit-reset-requests": "30s",
+                },
+            ),
+        ]
+        response = self.complete()
+        self.assertEqual(response.choices[0].message.content, "ok")
+        self.assertEqual(self.server.requests, 2)
+        stats = self.limiter.stats()
+        self.assertEqual(stats["throttled"], 1)
+        self.assertEqual(stats["provider_requests_left"], 7)
+        self.assertEqual(stats["max_calls"], 27)
+
+    def test_long_retry_after_stops_retrying(self):
+        self.server.responses = [(429, {"retry-after": "120"})]
+        with self.assertRaises(openai.RateLimitError):
+            self.complete()
+        self.assertEqual(self.server.requests, 1)
+
+        # Later calls are turned away without reaching the provider
+        with self.assertRaises(ProviderThrottledError):
+            self.complete()
+        self.assertEqual(self.server.requests, 1)
+
+
+class TestChatModelFeedback(FakeProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        from langchain_openai import ChatOpenAI
+
+        from app.python.helpers.model_rate_limits import RateLimitedChatModel
+
+        self.limiter = AdaptiveRateLimiter(10, 0, 0, 60)
+        self.model = RateLimitedChatModel(
+            ChatOpenAI(
+                model="gpt-4o-mini",
+                api_key="test",
+                base_url=self.base_url,
+                max_retries=0,
+                include_response_headers=True,
+            ),
+            self.limiter,
+        )
+
+    def test_headers_and_429s_reach_the_limiter(self):
+        self.server.responses = [
+            (200, {"x-ratelimit-remaining-tokens": "321"}),
+            (429, {"retry-after": "4"}),
+        ]
+        self.model.invoke("hello")
+        self.assertEqual(self.limiter.stats()["provider_tokens_left"], 321)
+        with self.assertRaises(openai.RateLimitError):
+            self.model.invoke("hello")
+        self.assertEqual(self.limiter.max_calls, 5)
+        self.assertAlmostEqual(self.limiter.pause_remaining(), 4, delta=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
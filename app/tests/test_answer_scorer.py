@@ -0,0 +1,49 @@
+import unittest
+from app.python.helpers.answer_scorer import score_answer
+
+
+class TestAnswerScorer(unittest.TestCase):
+    def test_clean_answer(self):
+        score, reasons = score_answer(
+            "What is the capital of France?",
+            "The capital of France is Paris.",
+        )
+        self.assertEqual(score, 1.0)
+        self.assertEqual(reasons, [])
+
+    def test_refusal(self):
+        score, reasons = score_answer(
+            "Summarise this article", "As an AI language model, I cannot."
+        )
+        self.assertIn("refusal", reasons)
+        self.assertLess(score, 0.6)
+
+    def test_uncertainty(self):
+        _, reasons = score_answer(
+            "When was the treaty signed?",
+            "I'm not sure, but it might have been in 1648.",
+        )
+        self.assertIn("uncertain", reasons)
+
+    def test_malformed_code_block(self):
+        _, reasons = score_answer(
+            "Write a function",
+            "```python\ndef f():\n    return 1\n",
+            task_type="coding",
+        )
+        self.assertIn("malformed_code_block", reasons)
+
+    def test_short_answer(self):
+        score, reasons = score_answer(
+            "Explain the causes of the first world war", "War."
+        )
+        self.assertIn("too_short", reasons)
+        score, reasons = score_answer("hi", "Hello!", task_type="casual")
+        self.assertEqual(reasons, [])
+
+    def test_empty(self):
+        self.assertEqual(score_answer("question", "  "), (0.0, ["empty"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
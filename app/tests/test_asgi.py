@@ -0,0 +1,274 @@
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+try:
+    from werkzeug.datastructures import FileStorage
+
+    from app import asgi, bootstrap
+except ImportError:  # quart and the upload parsers are optional here
+    asgi = None
+
+
+class FakeRouter:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def process(self, query, params):
+        self.calls.append((query, params))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if query == "fail":
+            raise RuntimeError("model unavailable")
+        return {
+            "content": f"echo: {query}",
+            "model_used": "fake-model",
+            "task_type": "general",
+            "task_complexity": "low",
+        }
+
+    async def astream_process(self, query, params):
+        self.calls.append((query, params))
+        if query == "fail":
+            raise RuntimeError("model unavailable")
+        for word in ("echo:", query):
+            await asyncio.sleep(self.latency)
+            yield {"event": "token", "content": word}
+        yield {
+            "event": "done",
+            "content": f"echo: {query}",
+            "model_used": "fake-model",
+            "task_type": "general",
+            "task_complexity": "low",
+            "time_to_first_token": self.latency,
+            "processing_time": 2 * self.latency,
+        }
+
+    async def process_many(self, items):
+        async def answer(index, query, params):
+            try:
+                return index, await self.process(query, params)
+            except Exception as e:
+                return index, e
+
+        for finished in asyncio.as_completed(
+            [
+                answer(i, query, params)
+                for i, (query, params) in enumerate(items)
+            ]
+        ):
+            yield await finished
+
+
+class FakeRAGSystem:
+    def __init__(self):
+        self.documents = []
+
+    def add_blocks(self, blocks, doc_id, metadata=None, progress=None):
+        text = "\n".join(block.text for block in blocks)
+        self.documents.append((text, metadata))
+        progress("chunks_embedded", 1)
+        progress("vectors_upserted", 1)
+
+
+@unittest.skipUnless(asgi, "quart is not installed")
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.conversations = {}
+        for module, name, fake in (
+            (module, name, fake)
+            for module in (asgi, bootstrap)
+            for name, fake in (
+                ("load_conversation", self.load_conversation),
+                ("save_conversation", self.save_conversation),
+            )
+        ):
+            patcher = patch.object(module, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = FakeRouter(latency=0.05)
+        self.rag_system = FakeRAGSystem()
+        self.app = asgi.create_app(
+            router=self.router,
+            rag_system=self.rag_system,
+            manage_backends=False,
+        )
+        self.app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.app.config["UPLOAD_FOLDER"])
+        self.client = self.app.test_client()
+        await self.app.startup()
+        self.addAsyncCleanup(self.app.shutdown)
+
+    def load_conversation(self, conversation_id):
+        return list(self.conversations.get(conversation_id, []))
+
+    def save_conversation(self, conversation_id, history):
+        self.conversations[conversation_id] = history
+
+    async def test_query_matches_flask_response(self):
+        response = await self.client.post(
+            "/query", json={"query": "hello", "conversation_id": "c1"}
+        )
+        self.assertEqual(response.status_code, 200)
+        body = await response.get_json()
+        self.assertEqual(body["response"], "echo: hello")
+        self.assertEqual(
+            body["metadata"],
+            {
+                "model_used": "fake-model",
+                "task_type": "general",
+                "task_complexity": "low",
+                "conversation_id": "c1",
+                "response_cache": "bypass",
+            },
+        )
+        self.assertEqual(
+            self.conversations["c1"],
+            [
+                {"role": "user", "content": "hello"},
+                {"role": "assistant", "content": "echo: hello"},
+            ],
+        )
+        self.assertEqual(self.router.calls[0][1]["conversation_id"], "c1")
+
+    async def test_invalid_json_and_errors(self):
+        response = await self.client.post("/query", data="not json")
+        self.assertEqual(response.status_code, 400)
+        response = await self.client.post("/query", json={"query": "fail"})
+        self.assertEqual(response.status_code, 500)
+        body = await response.get_json()
+        self.assertEqual(body["details"], "model unavailable")
+
+    async def test_queries_run_concurrently_on_one_loop(self):
+        responses = await asyncio.gather(
+            *(
+                self.client.post("/query", json={"query": f"q{i}"})
+                for i in range(20)
+            )
+        )
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(self.router.max_in_flight, 20)
+
+    async def test_stream_sends_tokens_then_metadata(self):
+        response = await self.client.post(
+            "/query/stream", json={"query": "hello", "conversation_id": "c1"}
+        )
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = [
+            (lines[0][len("event: ") :], json.loads(lines[1][len("data: ") :]))
+            for lines in (
+                chunk.splitlines()
+                for chunk in (await response.get_data(as_text=True)).split(
+                    "\n\n"
+                )
+                if chunk
+            )
+        ]
+        self.assertEqual(
+            events[:2],
+            [("token", {"content": "echo:"}), ("token", {"content": "hello"})],
+        )
+        self.assertEqual(events[2][0], "done")
+        self.assertEqual(
+            events[2][1],
+            {
+                "model_used": "fake-model",
+                "task_type": "general",
+                "task_complexity": "low",
+                "conversation_id": "c1",
+                "response_cache": "bypass",
+                "time_to_first_token": 0.05,
+                "processing_time": 0.1,
+            },
+        )
+        self.assertEqual(
+            self.conversations["c1"][-1],
+            {"role": "assistant", "content": "echo: hello"},
+        )
+
+    async def test_stream_reports_errors_as_events(self):
+        response = await self.client.post(
+            "/query/stream", json={"query": "fail"}
+        )
+        self.assertIn("event: error", await response.get_data(as_text=True))
+
+    async def test_batch_returns_results_in_order(self):
+        response = await self.client.post(
+            "/query/batch",
+            json={
+                "queries": [
+                    {"query": "one", "conversation_id": "c1"},
+                    {"query": "fail"},
+                    {"query": "two", "conversation_id": "c1"},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        results = (await response.get_json())["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2])
+        self.assertEqual(results[0]["response"], "echo: one")
+        self.assertEqual(results[1]["details"], "model unavailable")
+        self.assertEqual(len(self.conversations["c1"]), 4)
+
+    async def test_batch_streams_ndjson(self):
+        response = await self.client.post(
+            "/query/batch",
+            json={"queries": [{"query": "a"}, {"query": "b"}], "stream": True},
+        )
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = (await response.get_data(as_text=True)).splitlines()
+        self.assertEqual(
+            sorted(json.loads(line)["index"] for line in lines), [0, 1]
+        )
+
+    async def test_batch_rejects_malformed_bodies(self):
+        for body in ({}, {"queries": []}, {"queries": [{"q": "x"}]}):
+            response = await self.client.post("/query/batch", json=body)
+            self.assertEqual(response.status_code, 400)
+
+    async def test_upload_rejects_missing_and_unknown_files(self):
+        response = await self.client.post("/upload")
+        self.assertEqual(response.status_code, 400)
+        response = await self.client.get("/upload/unknown")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_upload_is_ingested_in_the_background(self):
+        response = await self.client.post(
+            "/upload",
+            files={
+                "file": FileStorage(io.BytesIO(b"some notes"), "notes.txt")
+            },
+        )
+        self.assertEqual(response.status_code, 202)
+        body = await response.get_json()
+        self.assertEqual(body["filename"], "notes.txt")
+
+        for _ in range(100):
+            response = await self.client.get(body["status_url"])
+            job = await response.get_json()
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(
+            (job["pages_parsed"], job["vectors_upserted"]), (1, 1)
+        )
+        self.assertEqual(
+            self.rag_system.documents,
+            [("some notes", {"filename": "notes.txt"})],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from app.python.helpers.chunked_ingestion import (
+    CHARS_PER_TOKEN,
+    chunk_blocks,
+    chunk_text,
+    document_id,
+    file_document_id,
+    ingest_chunks,
+)
+from app.python.helpers.document_extractor import TextBlock
+
+SENTENCE = "The router picks a model for every query it sees. "
+
+
+class TestChunkText(unittest.TestCase):
+    def test_short_text_is_one_chunk(self):
+        chunks = list(chunk_text("  Just one line.\n", 100, 10))
+        self.assertEqual(
+            [(c.text, c.offset) for c in chunks], [("Just one line.", 2)]
+        )
+        self.assertEqual(list(chunk_text("   ")), [])
+
+    def test_chunks_fit_overlap_and_point_into_the_text(self):
+        text = SENTENCE * 200
+        chunks = list(chunk_text(text, max_tokens=100, overlap_tokens=20))
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual([c.index for c in chunks], list(range(len(chunks))))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLessEqual(len(chunk.text), 100 * CHARS_PER_TOKEN)
+            self.assertEqual(
+                text[chunk.offset : chunk.offset + len(chunk.text)],
+                chunk.text,
+            )
+            # Overlapping, and cut at sentence ends
+            self.assertLess(chunk.offset, previous.offset + len(previous.text))
+            self.assertTrue(previous.text.endswith("."))
+        self.assertTrue(text.rstrip().endswith(chunks[-1].text))
+
+    def test_prefers_paragraph_breaks(self):
+        first = "word " * 60
+        text = first + "\n\n" + "more " * 60
+        chunks = list(chunk_text(text, max_tokens=100, overlap_tokens=0))
+        self.assertEqual(chunks[0].text, first.rstrip())
+        self.assertEqual(chunks[1].offset, len(first) + 2)
+
+    def test_overlap_starts_on_a_word(self):
+        text = "abcdefghij " * 100
+        for chunk in list(chunk_text(text, max_tokens=50, overlap_tokens=10)):
+            self.assertTrue(chunk.text.startswith("abcdefghij"))
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            list(chunk_text("text", max_tokens=100, overlap_tokens=50))
+
+    def test_document_id_is_stable(self):
+        self.assertEqual(document_id("a"), document_id("a"))
+        self.assertNotEqual(document_id("a"), document_id("b"))
+        with tempfile.NamedTemporaryFile("w", delete=False) as f:
+            f.write("a")
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(file_document_id(f.name), document_id("a"))
+
+
+def page_blocks(count, consumed=None):
+    offset = 0
+    for page in range(1, count + 1):
+        if consumed is not None:
+            consumed.append(page)
+        text = f"Page {page}. " + SENTENCE * 10
+        yield TextBlock(text, offset, page=page)
+        offset += len(text) + 1
+
+
+class TestChunkBlocks(unittest.TestCase):
+    def test_matches_chunking_the_joined_text(self):
+        text = "\n".join(block.text for block in page_blocks(30))
+        self.assertEqual(
+            [
+                (c.text, c.offset, c.index)
+                for c in chunk_blocks(page_blocks(30), 100, 20)
+            ],
+            [(c.text, c.offset, c.index) for c in chunk_text(text, 100, 20)],
+        )
+
+    def test_chunks_carry_their_start_page(self):
+        blocks = list(page_blocks(30))
+        for chunk in chunk_blocks(blocks, 100, 20):
+            self.assertEqual(
+                chunk.page,
+                max(b.page for b in blocks if b.offset <= chunk.offset),
+            )
+
+    def test_reads_blocks_as_it_goes(self):
+        consumed = []
+        chunks = chunk_blocks(page_blocks(1000, consumed), 100, 20)
+        first = next(chunks)
+        self.assertEqual(first.page, 1)
+        self.assertLessEqual(len(consumed), 2)
+
+
+class TestIngestChunks(unittest.TestCase):
+    def setUp(self):
+        self.embed_calls = []
+        self.upserts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.progress = {}
+
+    def embed(self, texts):
+        with self.lock:
+            self.embed_calls.append(len(texts))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return [[float(len(text))] for text in texts]
+
+    def report(self, counter, count):
+        self.progress[counter] = self.progress.get(counter, 0) + count
+
+    def test_batches_embeddings_and_upserts(self):
+        chunks = list(chunk_text(SENTENCE * 300, 50, 10))
+        count = ingest_chunks(
+            chunks,
+            self.embed,
+            self.upserts.append,
+            "doc_x",
+            {"filename": "notes.txt"},
+            embed_batch_size=8,
+            embed_concurrency=3,
+            upsert_batch_size=20,
+            progress=self.report,
+        )
+        self.assertEqual(count, len(chunks))
+        self.assertTrue(all(size <= 8 for size in self.embed_calls))
+        self.assertEqual(sum(self.embed_calls), len(chunks))
+        self.assertEqual(self.max_in_flight, 3)
+        self.assertTrue(all(len(batch) <= 20 for batch in self.upserts))
+        self.assertEqual(
+            self.progress,
+            {"chunks_embedded": len(chunks), "vectors_upserted": len(chunks)},
+        )
+
+        vectors = [vector for batch in self.upserts for vector in batch]
+        self.assertEqual(
+            [v["id"] for v in vectors],
+            [f"doc_x_{i}" for i in range(len(chunks))],
+        )
+        third = vectors[3]
+        self.assertEqual(third["values"], [float(len(chunks[3].text))])
+        self.assertEqual(
+            third["metadata"],
+            {
+                "filename": "notes.txt",
+                "text": chunks[3].text,
+                "offset": chunks[3].offset,
+                "chunk": 3,
+            },
+        )
+
+    def test_page_goes_into_the_metadata(self):
+        ingest_chunks(
+            chunk_blocks(page_blocks(5), 50, 10),
+            self.embed,
+            self.upserts.append,
+            "doc_x",
+        )
+        pages = [v["metadata"]["page"] for v in self.upserts[0]]
+        self.assertEqual(pages, sorted(pages))
+        self.assertEqual((pages[0], pages[-1]), (1, 5))
+
+    def test_embedding_errors_propagate(self):
+        def embed(texts):
+            raise RuntimeError("embedding failed")
+
+        with self.assertRaises(RuntimeError):
+            ingest_chunks(
+                chunk_text(SENTENCE * 50, 50, 10),
+                embed,
+                self.upserts.append,
+                "doc_x",
+            )
+        self.assertEqual(self.upserts, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
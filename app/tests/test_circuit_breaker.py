@@ -0,0 +1,128 @@
+import unittest
+
+from app.python.helpers.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            "groq",
+            failure_rate_threshold=0.5,
+            slow_call_rate_threshold=0.5,
+            slow_call_seconds=5.0,
+            min_calls=4,
+            window_seconds=60.0,
+            open_seconds=30.0,
+            clock=self.clock,
+        )
+
+    def test_opens_on_error_rate(self):
+        self.breaker.record(1.0)
+        self.breaker.record(1.0, error=True)
+        self.breaker.record(1.0)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record(1.0, error=True)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.available())
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.acquire()
+        self.assertEqual(self.breaker.snapshot()["rejected"], 1)
+
+    def test_opens_on_slow_calls(self):
+        for _ in range(2):
+            self.breaker.record(1.0)
+            self.breaker.record(8.0)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_needs_min_calls(self):
+        for _ in range(3):
+            self.breaker.record(1.0, error=True)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_old_calls_leave_the_window(self):
+        for _ in range(3):
+            self.breaker.record(1.0, error=True)
+        self.clock.now += 61
+        self.breaker.record(1.0, error=True)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.snapshot()["calls"], 1)
+
+    def open_breaker(self):
+        for _ in range(4):
+            self.breaker.record(1.0, error=True)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_probe_success_closes(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.acquire()
+        # Only one probe at a time
+        self.assertFalse(self.breaker.available())
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.acquire()
+        self.breaker.record(1.0)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.snapshot()["calls"], 0)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.acquire()
+        self.breaker.record(9.0)
+        self.assertEqual(self.breaker.state, OPEN)
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot["times_opened"], 2)
+        self.assertEqual(snapshot["retry_in"], 30.0)
+
+    def test_release_frees_the_probe(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.acquire()
+        self.breaker.release()
+        self.assertTrue(self.breaker.available())
+
+
+class TestCircuitBreakerRegistry(unittest.TestCase):
+    def test_one_breaker_per_provider(self):
+        registry = CircuitBreakerRegistry(min_calls=1)
+        registry.record("groq", 1.0, error=True)
+        self.assertFalse(registry.available("groq"))
+        self.assertTrue(registry.available("openai"))
+        self.assertEqual(registry.snapshot()["groq"]["state"], OPEN)
+
+    def test_disabled(self):
+        registry = CircuitBreakerRegistry(enabled=False, min_calls=1)
+        registry.record("groq", 1.0, error=True)
+        registry.acquire("groq")
+        self.assertTrue(registry.available("groq"))
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_from_config(self):
+        registry = CircuitBreakerRegistry.from_config(
+            {"circuit_breaker_min_calls": 3, "circuit_breaker_open_seconds": 5}
+        )
+        breaker = registry.get("anthropic")
+        self.assertEqual(breaker.min_calls, 3)
+        self.assertEqual(breaker.open_seconds, 5)
+        self.assertIs(registry.get("anthropic"), breaker)
+
+
+if __name__ == "__main__":
+    unittest.main()
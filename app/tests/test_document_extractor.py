@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.python.helpers.document_extractor import (
+    extract_text,
+    iter_blocks,
+    shutdown_pdf_pool,
+)
+
+try:
+    import docx
+    import PyPDF2
+except ImportError:  # the upload parsers are optional here
+    docx = PyPDF2 = None
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Write a PDF with one text line per string of each page's list."""
+    count = len(pages)
+    with open(path, "wb") as pdf_file:
+        offsets = []
+
+        def write_object(body):
+            offsets.append(pdf_file.tell())
+            pdf_file.write(f"{len(offsets)} 0 obj\n".encode())
+            pdf_file.write(body)
+            pdf_file.write(b"\nendobj\n")
+
+        pdf_file.write(b"%PDF-1.4\n")
+        write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(count))
+        write_object(
+            f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode()
+        )
+        write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for i, lines in enumerate(pages):
+            write_object(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {5 + 2 * i} 0 R >>".encode()
+            )
+            content = "BT /F1 10 Tf 12 TL 72 750 Td\n"
+            content += "".join(f"({_escape(line)}) Tj T*\n" for line in lines)
+            content = (content + "ET").encode()
+            write_object(
+                f"<< /Length {len(content)} >>\nstream\n".encode()
+                + content
+                + b"\nendstream"
+            )
+        xref = pdf_file.tell()
+        pdf_file.write(f"xref\n0 {len(offsets) + 1}\n".encode())
+        pdf_file.write(b"0000000000 65535 f \n")
+        for offset in offsets:
+            pdf_file.write(f"{offset:010d} 00000 n \n".encode())
+        pdf_file.write(
+            f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n".encode()
+        )
+
+
+class ExtractorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+
+class TestTextFiles(ExtractorTestCase):
+    def test_paragraph_blocks_with_offsets(self):
+        with open(self.path("notes.txt"), "w", encoding="utf-8") as f:
+            f.write("First line\nstill first\n\n\nSecond\r\n\nThird\n")
+        blocks = list(iter_blocks(self.path("notes.txt")))
+        self.assertEqual(
+            [(b.text, b.paragraph, b.line) for b in blocks],
+            [
+                ("First line\nstill first", 0, 1),
+                ("Second", 1, 5),
+                ("Third", 2, 7),
+            ],
+        )
+        text = extract_text(self.path("notes.txt"))
+        for block in blocks:
+            self.assertEqual(
+                text[block.offset : block.offset + len(block.text)],
+                block.text,
+            )
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            list(iter_blocks(self.path("image.png")))
+
+
+@unittest.skipUnless(PyPDF2 and docx, "PyPDF2 or python-docx missing")
+class TestDocuments(ExtractorTestCase):
+    def write_pages(self, name, count):
+        write_pdf(
+            self.path(name),
+            [[f"page {p} line {n}" for n in range(3)] for p in range(count)],
+        )
+        return self.path(name)
+
+    def test_pdf_pages_in_order(self):
+        blocks = list(iter_blocks(self.write_pages("short.pdf", 3)))
+        self.assertEqual([b.page for b in blocks], [1, 2, 3])
+        self.assertIn("page 1 line 2", blocks[1].text)
+        self.assertEqual(blocks[1].offset, len(blocks[0].text) + 1)
+
+    def test_parallel_extraction_matches_sequential(self):
+        self.addCleanup(shutdown_pdf_pool)
+        path = self.write_pages("long.pdf", 23)
+        sequential = list(iter_blocks(path, workers=1))
+        parallel = list(
+            iter_blocks(
+                path, workers=2, pages_per_task=4, parallel_min_pages=8
+            )
+        )
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(len(parallel), 23)
+        self.assertIn("page 22 line 0", parallel[-1].text)
+
+    def test_docx_paragraphs(self):
+        document = docx.Document()
+        for text in ("Intro", "Body", "End"):
+            document.add_paragraph(text)
+        document.save(self.path("doc.docx"))
+        blocks = list(iter_blocks(self.path("doc.docx")))
+        self.assertEqual([b.text for b in blocks], ["Intro", "Body", "End"])
+        self.assertEqual([b.offset for b in blocks], [0, 6, 11])
+        self.assertEqual(
+            extract_text(self.path("doc.docx")), "Intro\nBody\nEnd"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
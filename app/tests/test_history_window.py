@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import MagicMock
+from app.python.helpers.history_window import (
+    HistoryWindow,
+    estimate_tokens,
+    extractive_summary,
+    message_tokens,
+)
+
+
+def conversation(count, words=5):
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}. " + "word " * words,
+        }
+        for i in range(count)
+    ]
+
+
+class TestHistoryWindow(unittest.TestCase):
+    def test_short_history_untouched(self):
+        window = HistoryWindow(max_messages=25, keep_start=5, keep_end=10)
+        history = conversation(10)
+        self.assertEqual(window.apply(history), history)
+
+    def test_keeps_start_and_end_around_summary(self):
+        window = HistoryWindow(max_messages=8, keep_start=2, keep_end=3)
+        history = conversation(20)
+        windowed = window.apply(history)
+        self.assertEqual(windowed[:2], history[:2])
+        self.assertEqual(windowed[-3:], history[-3:])
+        self.assertEqual(len(windowed), 6)
+        summary = windowed[2]
+        self.assertEqual(summary["role"], "system")
+        self.assertIn("Summary of 15 earlier messages", summary["content"])
+        self.assertIn("Message 2.", summary["content"])
+
+    def test_respects_token_budget(self):
+        window = HistoryWindow(
+            max_messages=100,
+            keep_start=5,
+            keep_end=10,
+            token_budget=400,
+            summary_tokens=50,
+        )
+        history = conversation(30, words=40)
+        windowed = window.apply(history)
+        self.assertLessEqual(sum(message_tokens(m) for m in windowed), 400)
+        # The newest message always survives, the opening ones go first
+        self.assertEqual(windowed[-1], history[-1])
+        self.assertEqual(windowed[0]["role"], "system")
+
+    def test_per_model_budget(self):
+        window = HistoryWindow(max_messages=1000)
+        history = conversation(200, words=40)
+        small = window.apply(history, "llama-3.1-8b-instant")
+        large = window.apply(history, "claude-3-opus-20240229")
+        self.assertLess(len(small), len(large))
+
+    def test_summary_is_cached(self):
+        summarizer = MagicMock(return_value="summary")
+        window = HistoryWindow(
+            max_messages=8, keep_start=2, keep_end=3, summarizer=summarizer
+        )
+        history = conversation(20)
+        window.apply(history)
+        window.apply(history)
+        summarizer.assert_called_once()
+        self.assertEqual(window.stats()["hits"], 1)
+
+    def test_from_config(self):
+        window = HistoryWindow.from_config(
+            {
+                "msgs_keep_max": 12,
+                "msgs_keep_start": 3,
+                "msgs_keep_end": 4,
+                "history_token_budget": 1000,
+            }
+        )
+        self.assertEqual(window.max_messages, 12)
+        self.assertEqual(window.budget_for("llama-3.1-8b-instant"), 1000)
+
+
+class TestEstimators(unittest.TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd"), 1)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+    def test_extractive_summary_is_bounded(self):
+        summary = extractive_summary(conversation(100, words=50), 50)
+        self.assertLessEqual(estimate_tokens(summary), 60)
+        self.assertTrue(summary.endswith("..."))
+
+
+if __name__ == "__main__":
+    unittest.main()
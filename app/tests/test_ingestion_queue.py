@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+from app.python.helpers.ingestion_queue import (
+    DONE,
+    FAILED,
+    IngestionQueue,
+    QueueClosedError,
+    QueueFullError,
+)
+
+
+class TestIngestionQueue(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def ingest(self, job, path):
+        self.started.release()
+        job.advance("pages_parsed", 3)
+        self.release.wait(5)
+        if path == "broken.pdf":
+            raise ValueError("not a PDF")
+        job.advance("chunks_embedded", 2)
+        job.advance("vectors_upserted", 2)
+
+    def queue(self, **kwargs):
+        queue = IngestionQueue(self.ingest, **kwargs)
+        self.addCleanup(queue.shutdown)
+        self.addCleanup(self.release.set)
+        return queue
+
+    def wait_for(self, queue, job_id, status):
+        for _ in range(200):
+            job = queue.get(job_id)
+            if job["status"] == status:
+                return job
+            time.sleep(0.01)
+        self.fail(f"job never reached {status}: {job}")
+
+    def test_reports_progress_until_done(self):
+        queue = self.queue(workers=1)
+        job = queue.submit("report.pdf", "report.pdf")
+        self.assertTrue(self.started.acquire(timeout=5))
+        running = queue.get(job.id)
+        self.assertEqual(running["status"], "running")
+        self.assertEqual(running["pages_parsed"], 3)
+        self.assertEqual(running["vectors_upserted"], 0)
+
+        self.release.set()
+        done = self.wait_for(queue, job.id, DONE)
+        self.assertEqual(done["filename"], "report.pdf")
+        self.assertEqual(done["chunks_embedded"], 2)
+        self.assertEqual(done["vectors_upserted"], 2)
+        self.assertIsNotNone(done["finished_at"])
+        self.assertIsNone(queue.get("unknown"))
+
+    def test_failures_are_reported(self):
+        queue = self.queue()
+        self.release.set()
+        job = queue.submit("broken.pdf", "broken.pdf")
+        failed = self.wait_for(queue, job.id, FAILED)
+        self.assertEqual(failed["error"], "not a PDF")
+        self.assertEqual(queue.stats()[FAILED], 1)
+
+    def test_rejects_jobs_when_the_queue_is_full(self):
+        queue = self.queue(workers=1, max_queued=2)
+        jobs = [queue.submit("a.txt", "a.txt")]
+        self.assertTrue(self.started.acquire(timeout=5))
+        jobs += [queue.submit(f"{n}.txt", f"{n}.txt") for n in "bc"]
+        with self.assertRaises(QueueFullError):
+            queue.submit("d.txt", "d.txt")
+        stats = queue.stats()
+        self.assertEqual((stats["running"], stats["queued"]), (1, 2))
+        self.assertEqual(stats["rejected"], 1)
+
+        self.release.set()
+        for job in jobs:
+            self.wait_for(queue, job.id, DONE)
+        queue.submit("d.txt", "d.txt")
+
+    def test_forgets_old_finished_jobs(self):
+        queue = self.queue(workers=1, keep_finished=2)
+        self.release.set()
+        jobs = [queue.submit(f"{n}.txt", f"{n}.txt") for n in range(4)]
+        self.wait_for(queue, jobs[-1].id, DONE)
+        self.assertIsNone(queue.get(jobs[0].id))
+        self.assertIsNotNone(queue.get(jobs[-1].id))
+
+    def test_shutdown_finishes_jobs_and_stops_taking_new_ones(self):
+        queue = self.queue()
+        self.release.set()
+        job = queue.submit("a.txt", "a.txt")
+        queue.shutdown()
+        self.assertEqual(queue.get(job.id)["status"], DONE)
+        with self.assertRaises(QueueClosedError):
+            queue.submit("b.txt", "b.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
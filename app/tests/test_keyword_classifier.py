@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+from app.python.helpers.keyword_classifier import (
+    KeywordClassifier,
+    KeywordRule,
+    load_keyword_classifier,
+)
+
+
+class TestKeywordClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = KeywordClassifier()
+
+    def test_word_boundaries(self):
+        # "hi" must not match inside "this"
+        task_type, _ = self.classifier.classify(
+            "Summarise this long report for me"
+        )
+        self.assertEqual(task_type, "general")
+
+    def test_priority_order(self):
+        task_type, question_type = self.classifier.classify(
+            "Hi, can you debug this function?"
+        )
+        self.assertEqual(task_type, "coding")
+        self.assertEqual(question_type, "casual")
+
+    def test_multi_word_phrase(self):
+        task_type, question_type = self.classifier.classify(
+            "hey there, how are you"
+        )
+        self.assertEqual(task_type, "casual")
+        self.assertEqual(question_type, "problem_solving")
+
+    def test_leading_only_rule(self):
+        _, question_type = self.classifier.classify("Is Paris in France?")
+        self.assertEqual(question_type, "yes_no")
+        _, question_type = self.classifier.classify("Isolate the bug")
+        self.assertEqual(question_type, "open_ended")
+        _, question_type = self.classifier.classify("Paris is in France")
+        self.assertEqual(question_type, "open_ended")
+
+    def test_custom_tables(self):
+        classifier = KeywordClassifier(
+            task_type_rules=[("math", ["integral", "derivative"])],
+            question_type_rules=[
+                KeywordRule("command", ("please",), leading_only=True)
+            ],
+        )
+        self.assertEqual(
+            classifier.classify("please compute the integral"),
+            ("math", "command"),
+        )
+
+    def test_load_from_file(self):
+        tables = {
+            "task_types": {"legal": ["contract", "liability"]},
+            "question_types": {
+                "yes_no": {"keywords": ["is"], "leading_only": True}
+            },
+        }
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".json", delete=False
+        ) as f:
+            json.dump(tables, f)
+        try:
+            classifier = load_keyword_classifier(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(
+            classifier.classify("Is this contract valid?"),
+            ("legal", "yes_no"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
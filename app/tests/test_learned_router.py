@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from app.advanced_router import AdvancedRouter
+from app.python.helpers.learned_router import (
+    FEATURE_NAMES,
+    TIERS,
+    LearnedRouter,
+    RouteLogWriter,
+    featurize,
+    featurize_many,
+    label_records,
+    train_router,
+)
+from app.python.helpers.query_features import QueryFeatures
+
+
+def make_features(task_type, length, question_type="open_ended"):
+    tokens = tuple(f"w{i}" for i in range(length))
+    return QueryFeatures(
+        tokens=tokens,
+        lexical_diversity=1.0,
+        avg_word_length=2.0,
+        special_char_density=0.0,
+        number_density=0.0,
+        task_type=task_type,
+        question_type=question_type,
+    )
+
+
+def constant_router(bias):
+    """A model that ignores the features and always has the same opinion."""
+    return LearnedRouter(
+        np.zeros((len(FEATURE_NAMES), len(TIERS))),
+        np.asarray(bias, dtype=np.float64),
+        np.zeros(len(FEATURE_NAMES)),
+        np.ones(len(FEATURE_NAMES)),
+    )
+
+
+class TestLearnedRouter(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        tier_of = {"casual": "low", "general": "mid", "coding": "high"}
+        self.features, self.labels = [], []
+        for _ in range(300):
+            task_type = rng.choice(list(tier_of))
+            self.features.append(make_features(task_type, rng.randint(1, 60)))
+            self.labels.append(tier_of[task_type])
+        self.rows = featurize_many(self.features, [0] * len(self.features))
+
+    def test_featurize(self):
+        row = featurize(make_features("coding", 50, "factual"), 100)
+        self.assertEqual(len(row), len(FEATURE_NAMES))
+        self.assertEqual(row[FEATURE_NAMES.index("task:coding")], 1.0)
+        self.assertEqual(row[FEATURE_NAMES.index("question:factual")], 1.0)
+        self.assertEqual(sum(row[6:]), 2.0)
+        self.assertEqual(featurize_many([], []).shape, (0, len(FEATURE_NAMES)))
+
+    def test_learns_separable_tiers(self):
+        model = train_router(self.rows, self.labels)
+        predicted = [
+            model.tiers[i] for i in model.predict_proba(self.rows).argmax(1)
+        ]
+        self.assertEqual(predicted, self.labels)
+        tier, confidence = model.predict(make_features("coding", 10), 0)
+        self.assertEqual(tier, "high")
+        self.assertGreater(confidence, 0.5)
+
+    def test_save_and_load(self):
+        model = train_router(self.rows, self.labels, epochs=50)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "router_model.npz")
+            model.save(path)
+            loaded = LearnedRouter.load(path)
+        self.assertEqual(loaded.tiers, model.tiers)
+        np.testing.assert_allclose(
+            loaded.predict_proba(self.rows), model.predict_proba(self.rows)
+        )
+
+    def test_load_rejects_other_features(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "router_model.npz")
+            np.savez(
+                path,
+                weights=np.zeros((2, 3)),
+                bias=np.zeros(3),
+                mean=np.zeros(2),
+                scale=np.ones(2),
+                tiers=np.array(TIERS),
+                feature_names=np.array(["length", "other"]),
+            )
+            with self.assertRaises(ValueError):
+                LearnedRouter.load(path)
+
+    def test_label_records(self):
+        records = [
+            {"query": "a", "tier": "low", "quality": 0.4, "latency": 1.0},
+            {"query": "a", "tier": "mid", "quality": 0.9, "latency": 2.0},
+            {"query": "a", "tier": "high", "quality": 0.9, "latency": 5.0},
+            {"query": "b", "tier": "low", "quality": 0.8, "latency": 1.0},
+            {"query": "c", "tier": "low", "quality": 0.1, "latency": 1.0},
+            {"query": "d", "tier": "high", "quality": 0.1},
+            {"query": "e", "tier": "superior", "quality": 1.0},
+        ]
+        examples = {
+            example["query"]: example
+            for example in label_records(records, quality_threshold=0.6)
+        }
+        self.assertEqual(set(examples), {"a", "b", "c", "d"})
+        self.assertEqual(examples["a"]["label"], "mid")
+        self.assertEqual(
+            examples["a"]["latencies"], {"low": 1.0, "mid": 2.0, "high": 5.0}
+        )
+        self.assertEqual(examples["b"]["label"], "low")
+        # Nothing acceptable: one tier above the best one tried
+        self.assertEqual(examples["c"]["label"], "mid")
+        self.assertEqual(examples["d"]["label"], "high")
+
+    def test_route_log_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.jsonl")
+            writer = RouteLogWriter(path)
+            writer.write({"query": "a", "tier": "low"})
+            writer.write({"query": "b", "tier": "high"})
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([r["query"] for r in records], ["a", "b"])
+        self.assertIn("time", records[0])
+
+
+class TestRouterWithLearnedModel(unittest.TestCase):
+    def setUp(self):
+        self.router = AdvancedRouter(
+            {"ROUTER_THRESHOLD": 0.7}, MagicMock(), MagicMock()
+        )
+        rng = random.Random(11)
+        words = (
+            "analyze code the hi what is please explain compare 2024 $x "
+            "function quantum entanglement today news write hello"
+        ).split()
+        self.queries = [
+            " ".join(rng.choices(words, k=rng.randint(1, 40)))
+            for _ in range(100)
+        ]
+        self.histories = [[] for _ in self.queries]
+        self.histories[0].append({"role": "user", "content": "x" * 4500})
+
+    def route(self, query, history=()):
+        return asyncio.run(self.router.route(query, list(history)))
+
+    def test_confident_prediction_is_used(self):
+        self.router.learned_router = constant_router([5.0, 0.0, 0.0])
+        query = "please analyze and compare quantum entanglement theories"
+        config = self.route(query)
+        self.assertEqual(config["tier"], "low")
+        self.assertEqual(
+            self.router.performance_tracker.tier_selections[
+                ("low", "learned")
+            ],
+            1,
+        )
+
+    def test_falls_back_to_heuristic_when_unsure(self):
+        query = "please analyze and compare quantum entanglement theories"
+        expected = self.route(query)["tier"]
+        self.router.learned_router = constant_router([0.0, 0.0, 0.0])
+        self.assertEqual(self.route(query)["tier"], expected)
+
+    def test_long_context_stays_on_high_tier(self):
+        self.router.learned_router = constant_router([5.0, 0.0, 0.0])
+        history = [{"role": "user", "content": "x" * 4500}]
+        self.assertEqual(self.route("hi", history)["tier"], "high")
+
+    def test_route_many_matches_route(self):
+        self.router.learned_router = train_router(
+            featurize_many(
+                [self.router.feature_cache.get(q) for q in self.queries],
+                [0] * len(self.queries),
+            ),
+            [random.Random(i).choice(TIERS) for i in range(len(self.queries))],
+            epochs=50,
+        )
+        result = self.router.route_many(self.queries, self.histories)
+        expected = [
+            self.route(query, history)
+            for query, history in zip(self.queries, self.histories)
+        ]
+        self.assertEqual(result["configs"], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import unittest
+from app.python.helpers.llm_scheduler import (
+    INTERACTIVE,
+    TOOL_LOOP,
+    LLMScheduler,
+    current_priority,
+    llm_call_context,
+    lower_priority,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SchedulerTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = LLMScheduler(
+            max_concurrent=1, max_wait_seconds=10, clock=self.clock
+        )
+        self.order = []
+
+    async def queue_calls(self, *calls):
+        """Start (name, priority, conversation) calls; each queues in turn."""
+        tasks = []
+        for name, priority, conversation_id in calls:
+
+            async def call(name=name, p=priority, c=conversation_id):
+                await self.scheduler.acquire(p, c)
+                self.order.append(name)
+                self.scheduler.release(p)
+
+            tasks.append(asyncio.ensure_future(call()))
+            await asyncio.sleep(0)
+        return tasks
+
+
+class TestLLMScheduler(SchedulerTestCase):
+    async def test_admits_immediately_below_capacity(self):
+        self.scheduler.max_concurrent = 2
+        self.assertEqual(await self.scheduler.acquire(), 0.0)
+        self.assertEqual(await self.scheduler.acquire(TOOL_LOOP), 0.0)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["active"], 2)
+        self.assertEqual(stats["classes"][INTERACTIVE]["admitted"], 1)
+        self.assertEqual(stats["classes"][TOOL_LOOP]["active"], 1)
+
+    async def test_higher_priority_goes_first(self):
+        await self.scheduler.acquire()
+        tasks = await self.queue_calls(
+            ("tool", TOOL_LOOP, "a"),
+            ("chat-1", INTERACTIVE, "b"),
+            ("chat-2", INTERACTIVE, "c"),
+        )
+        stats = self.scheduler.stats()["classes"]
+        self.assertEqual(stats[TOOL_LOOP]["queued"], 1)
+        self.assertEqual(stats[INTERACTIVE]["conversations_waiting"], 2)
+
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.order, ["chat-1", "chat-2", "tool"])
+
+    async def test_conversations_share_fairly(self):
+        await self.scheduler.acquire(INTERACTIVE, "busy")
+        tasks = await self.queue_calls(
+            ("busy-1", INTERACTIVE, "busy"),
+            ("busy-2", INTERACTIVE, "busy"),
+            ("busy-3", INTERACTIVE, "busy"),
+            ("quiet-1", INTERACTIVE, "quiet"),
+        )
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.order, ["quiet-1", "busy-1", "busy-2", "busy-3"])
+
+    async def test_weights_scale_share(self):
+        self.scheduler.set_weight("big", 2)
+        await self.scheduler.acquire(INTERACTIVE, "holder")
+        tasks = await self.queue_calls(
+            ("big-1", INTERACTIVE, "big"),
+            ("big-2", INTERACTIVE, "big"),
+            ("big-3", INTERACTIVE, "big"),
+            ("small-1", INTERACTIVE, "small"),
+            ("small-2", INTERACTIVE, "small"),
+        )
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        self.assertEqual(
+            self.order, ["big-1", "small-1", "big-2", "big-3", "small-2"]
+        )
+        with self.assertRaises(ValueError):
+            self.scheduler.set_weight("big", 0)
+
+    async def test_long_waiting_lower_class_is_promoted(self):
+        await self.scheduler.acquire()
+        tasks = await self.queue_calls(("tool", TOOL_LOOP, None))
+        self.clock.now = 11.0
+        tasks += await self.queue_calls(("chat", INTERACTIVE, None))
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.order, ["tool", "chat"])
+        stats = self.scheduler.stats()["classes"]
+        self.assertEqual(stats[TOOL_LOOP]["promoted"], 1)
+        self.assertEqual(stats[TOOL_LOOP]["max_wait"], 11.0)
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        await self.scheduler.acquire()
+        waiting = asyncio.ensure_future(self.scheduler.acquire())
+        tasks = await self.queue_calls(("next", INTERACTIVE, None))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(
+            self.scheduler.stats()["classes"][INTERACTIVE]["queued"], 1
+        )
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.order, ["next"])
+        self.assertEqual(self.scheduler.stats()["active"], 0)
+
+    async def test_slot_cancelled_after_dispatch_is_released(self):
+        await self.scheduler.acquire()
+        waiting = asyncio.ensure_future(self.scheduler.acquire())
+        await asyncio.sleep(0)
+        self.scheduler.release(INTERACTIVE)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(self.scheduler.stats()["active"], 0)
+
+    async def test_slot_uses_call_context(self):
+        with llm_call_context(TOOL_LOOP, "conversation"):
+            self.assertEqual(current_priority(), TOOL_LOOP)
+            async with self.scheduler.slot():
+                stats = self.scheduler.stats()["classes"]
+                self.assertEqual(stats[TOOL_LOOP]["active"], 1)
+        self.assertEqual(current_priority(), INTERACTIVE)
+        self.assertEqual(self.scheduler.stats()["active"], 0)
+        with self.assertRaises(ValueError):
+            async with self.scheduler.slot("urgent"):
+                pass
+
+    async def test_disabled_scheduler_does_not_queue(self):
+        self.scheduler.enabled = False
+        async with self.scheduler.slot():
+            async with self.scheduler.slot():
+                self.assertEqual(self.scheduler.stats()["active"], 0)
+
+    def test_lower_priority(self):
+        self.assertEqual(lower_priority(INTERACTIVE, TOOL_LOOP), TOOL_LOOP)
+        self.assertEqual(lower_priority(TOOL_LOOP, INTERACTIVE), TOOL_LOOP)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from app.python.helpers.model_rate_limits import (
+    DEFAULT_MODEL_LIMITS,
+    ModelLimits,
+    ModelRateLimiterRegistry,
+    RateLimitedChatModel,
+    admit,
+    estimate_tokens,
+)
+
+
+class FakeResponse:
+    def __init__(self, content, output_tokens=None):
+        self.content = content
+        self.usage_metadata = (
+            {"output_tokens": output_tokens} if output_tokens else None
+        )
+
+
+class FakeClient:
+    model_name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return FakeResponse("x" * 40)
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return FakeResponse("ignored", output_tokens=25)
+
+    async def astream(self, messages):
+        self.calls += 1
+        for word in ("one ", "two ", "three "):
+            yield FakeResponse(word)
+
+    def stream(self, messages):
+        self.calls += 1
+        yield FakeResponse("a" * 8)
+
+
+class TestModelLimitsConfig(unittest.TestCase):
+    def test_defaults_without_overrides(self):
+        registry = ModelRateLimiterRegistry.from_config({})
+        self.assertEqual(registry.limits, DEFAULT_MODEL_LIMITS)
+
+    def test_environment_overrides_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(
+                {
+                    "gpt-4o": {"requests": 7, "input_tokens": 700},
+                    "custom-model": {"requests": 3, "window_seconds": 10},
+                },
+                f,
+            )
+            f.flush()
+            registry = ModelRateLimiterRegistry.from_config(
+                {
+                    "model_rate_limits_file": f.name,
+                    "model_rate_limits": json.dumps(
+                        {"gpt-4o": {"requests": 9}}
+                    ),
+                }
+            )
+        self.assertEqual(registry.limits["gpt-4o"], ModelLimits(9))
+        self.assertEqual(
+            registry.limits["custom-model"], ModelLimits(3, window_seconds=10)
+        )
+        self.assertEqual(
+            registry.limits["gpt-4o-mini"], DEFAULT_MODEL_LIMITS["gpt-4o-mini"]
+        )
+
+
+class TestModelRateLimiterRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ModelRateLimiterRegistry(
+            {"a": ModelLimits(2, 100), "b": ModelLimits(5)}
+        )
+
+    def test_one_limiter_per_model(self):
+        limiter = self.registry.get("a")
+        self.assertIs(self.registry.get("a"), limiter)
+        self.assertIsNot(self.registry.get("b"), limiter)
+        self.assertEqual(limiter.max_calls, 2)
+        self.assertEqual(limiter.max_input_tokens, 100)
+        self.assertIsNone(self.registry.get("unknown"))
+
+    def test_headroom_follows_tightest_limit(self):
+        self.assertEqual(self.registry.headroom("a"), 1.0)
+        self.registry.get("a").limit_call_and_input(75)
+        self.assertAlmostEqual(self.registry.headroom("a"), 0.25)
+        self.assertEqual(self.registry.headroom("unknown"), 1.0)
+        self.assertEqual(self.registry.snapshot()["a"]["headroom"], 0.25)
+
+    def test_configured_limits_win_over_registered(self):
+        limiter = self.registry.get_or_register("a", ModelLimits(50))
+        self.assertEqual(limiter.max_calls, 2)
+        limiter = self.registry.get_or_register("c", ModelLimits(50))
+        self.assertEqual(limiter.max_calls, 50)
+        self.assertIs(self.registry.get("c"), limiter)
+
+    def test_disabled_registry(self):
+        registry = ModelRateLimiterRegistry(
+            {"a": ModelLimits(2)}, enabled=False
+        )
+        self.assertIsNone(registry.get("a"))
+        self.assertEqual(registry.headroom("a"), 1.0)
+        self.assertEqual(
+            registry.get_or_register("a", ModelLimits(9)).max_calls, 2
+        )
+
+
+class TestRateLimitedChatModel(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.registry = ModelRateLimiterRegistry({"fake": ModelLimits(10)})
+        self.limiter = self.registry.get("fake")
+        self.client = FakeClient()
+        self.model = RateLimitedChatModel(self.client, self.limiter)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens("x" * 40), 10)
+        self.assertEqual(
+            estimate_tokens(
+                [{"role": "user", "content": "x" * 8}, ("system", "y" * 4)]
+            ),
+            3,
+        )
+
+    async def test_ainvoke_records_call_and_reported_output(self):
+        await self.model.ainvoke([{"role": "user", "content": "x" * 80}])
+        record = self.limiter.call_records[-1]
+        self.assertEqual(record.input_tokens, 20)
+        self.assertEqual(record.output_tokens, 25)
+
+    async def test_astream_counts_streamed_output(self):
+        chunks = [chunk async for chunk in self.model.astream("hello")]
+        self.assertEqual(len(chunks), 3)
+        # 14 characters, rounded up
+        self.assertEqual(self.limiter.call_records[-1].output_tokens, 4)
+
+    def test_blocking_calls(self):
+        self.model.invoke("x" * 12)
+        self.assertEqual(self.limiter.call_records[-1].output_tokens, 10)
+        list(self.model.stream("x"))
+        self.assertEqual(len(self.limiter.call_records), 2)
+        self.assertEqual(self.limiter.call_records[-1].output_tokens, 2)
+
+    async def test_waits_once_limit_is_used(self):
+        self.model.limiter = ModelRateLimiterRegistry(
+            {"fake": ModelLimits(1)}
+        ).get("fake")
+        await self.model.ainvoke("first")
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.model.ainvoke("second"), 0.05)
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_admit_reserves_the_next_call(self):
+        self.model.limiter = ModelRateLimiterRegistry(
+            {"fake": ModelLimits(1)}
+        ).get("fake")
+        admitted = await admit(self.model, "x" * 40)
+        self.assertEqual(len(self.model.limiter.call_records), 1)
+        self.assertEqual(self.client.calls, 0)
+        await asyncio.wait_for(admitted.ainvoke("x" * 40), 0.05)
+        self.assertEqual(len(self.model.limiter.call_records), 1)
+        self.assertEqual(self.model.limiter.call_records[0].output_tokens, 25)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(admitted.ainvoke("again"), 0.05)
+
+    async def test_admit_passes_unlimited_clients_through(self):
+        self.assertIs(await admit(self.client, "hello"), self.client)
+
+    def test_other_attributes_come_from_client(self):
+        self.assertEqual(self.model.model_name, "fake")
+
+
+if __name__ == "__main__":
+    unittest.main()
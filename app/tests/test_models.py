@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from app import models
+from app.python.helpers.model_rate_limits import RateLimitedChatModel
+from app.models import (
+    clear_chat_model_pool,
+    get_chat_model,
+    get_equivalent_models,
+    get_model_list,
+    get_model_rate_limiters,
+    get_provider,
+    prewarm_chat_models,
+)
+
+
+@patch.dict(
+    os.environ,
+    {"OPENAI_API_KEY": "sk-test", "ANTHROPIC_API_KEY": "sk-ant-test"},
+)
+class TestChatModelPool(unittest.TestCase):
+    def setUp(self):
+        clear_chat_model_pool()
+
+    def tearDown(self):
+        clear_chat_model_pool()
+
+    def test_same_key_reuses_client(self):
+        first = get_chat_model("gpt-4o-mini", 0.5, 256)
+        self.assertIs(get_chat_model("gpt-4o-mini", 0.5, 256), first)
+
+    def test_different_settings_get_own_client(self):
+        base = get_chat_model("gpt-4o-mini", 0.5, 256)
+        self.assertIsNot(get_chat_model("gpt-4o-mini", 0.7, 256), base)
+        self.assertIsNot(get_chat_model("gpt-4o-mini", 0.5, 512), base)
+        self.assertIsNot(get_chat_model("claude-3-haiku-20240307", 0.5), base)
+
+    def test_provider_config_change_creates_new_client(self):
+        first = get_chat_model("gpt-4o-mini")
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-rotated"}):
+            self.assertIsNot(get_chat_model("gpt-4o-mini"), first)
+
+    def test_pool_is_bounded(self):
+        with patch.object(models, "CHAT_MODEL_POOL_SIZE", 2):
+            oldest = get_chat_model("gpt-4o-mini", 0.1)
+            get_chat_model("gpt-4o-mini", 0.2)
+            get_chat_model("gpt-4o-mini", 0.3)
+            self.assertEqual(len(models._chat_model_pool), 2)
+            self.assertIsNot(get_chat_model("gpt-4o-mini", 0.1), oldest)
+
+    def test_concurrent_callers_share_one_client(self):
+        results = []
+
+        def worker():
+            results.append(get_chat_model("gpt-4o-mini", 0.3, 128))
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(model) for model in results}), 1)
+
+    def test_clients_are_scoped_to_their_event_loop(self):
+        async def client():
+            return get_chat_model("gpt-4o-mini", 0.3, 128)
+
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(client())
+        self.assertIs(loop.run_until_complete(client()), first)
+        loop.close()
+        # A new loop must not get clients bound to the closed one
+        second = asyncio.run(client())
+        self.assertIsNot(second, first)
+        self.assertIsNot(get_chat_model("gpt-4o-mini", 0.3, 128), second)
+        self.assertNotIn(first, models._chat_model_pool.values())
+
+    def test_unsupported_model(self):
+        with self.assertRaises(ValueError):
+            get_chat_model("unknown-model")
+
+    def test_prewarm_skips_failures(self):
+        warmed = prewarm_chat_models(
+            [("gpt-4o-mini", 0.7, 256), ("unknown-model", 0.7, None)]
+        )
+        self.assertEqual(warmed, 1)
+        self.assertEqual(len(models._chat_model_pool), 1)
+
+
+class TestEquivalentModels(unittest.TestCase):
+    def test_equivalents_come_from_model_list(self):
+        for model in get_model_list():
+            for equivalent in get_equivalent_models(model):
+                self.assertIn(equivalent, get_model_list())
+                self.assertNotEqual(equivalent, model)
+
+    def test_every_routed_tier_has_another_provider(self):
+        for model in (
+            "llama-3.1-8b-instant",
+            "llama-3.1-70b-versatile",
+            "claude-3-opus-20240229",
+        ):
+            providers = {get_provider(m) for m in get_equivalent_models(model)}
+            self.assertTrue(providers - {get_provider(model)})
+
+    def test_unknown_model_has_no_equivalents(self):
+        self.assertEqual(get_equivalent_models("gpt-unknown"), [])
+
+
+@patch.dict(
+    os.environ,
+    {"OPENAI_API_KEY": "sk-test", "ANTHROPIC_API_KEY": "sk-ant-test"},
+)
+class TestRateLimitedChatModels(unittest.TestCase):
+    def setUp(self):
+        clear_chat_model_pool()
+
+    def tearDown(self):
+        clear_chat_model_pool()
+
+    def test_limited_model_is_wrapped(self):
+        model = get_chat_model("gpt-4o-mini")
+        self.assertIsInstance(model, RateLimitedChatModel)
+        self.assertIs(
+            model.limiter, get_model_rate_limiters().get("gpt-4o-mini")
+        )
+        self.assertEqual(model.model_name, "gpt-4o-mini")
+        self.assertIs(get_chat_model(model), model)
+
+    def test_model_without_limits_is_not_wrapped(self):
+        model = get_chat_model("claude-3-haiku-20240307")
+        self.assertNotIsInstance(model, RateLimitedChatModel)
+
+
+if __name__ == "__main__":
+    unittest.main()
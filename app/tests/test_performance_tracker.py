@@ -0,0 +1,69 @@
+import random
+import unittest
+from app.python.helpers.performance_tracker import (
+    PerformanceTracker,
+    QuantileSketch,
+)
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_percentiles_within_accuracy(self):
+        rng = random.Random(3)
+        values = [rng.lognormvariate(0, 1) for _ in range(10000)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1.0, delta=0.02)
+
+    def test_empty(self):
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+
+class TestPerformanceTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = PerformanceTracker(alpha=0.5, min_samples=5)
+
+    def test_neutral_until_min_samples(self):
+        for _ in range(4):
+            self.tracker.record("model-a", "mid", 1.0)
+        self.assertEqual(self.tracker.get_performance_factors()["mid"], 1.0)
+
+    def test_degraded_tier(self):
+        for _ in range(20):
+            self.tracker.record("model-a", "mid", 1.0)
+        for _ in range(5):
+            self.tracker.record("model-a", "mid", 5.0)
+        self.assertGreater(self.tracker.get_performance_factors()["mid"], 1.2)
+
+    def test_faster_than_usual_is_neutral(self):
+        tracker = PerformanceTracker()
+        rng = random.Random(5)
+        for _ in range(20):
+            tracker.record("claude-3-opus", "high", rng.uniform(15, 25))
+        for _ in range(3):
+            tracker.record("claude-3-opus", "high", 8.0)
+        self.assertEqual(tracker.get_performance_factors()["high"], 1.0)
+
+    def test_errors_raise_factor(self):
+        for _ in range(10):
+            self.tracker.record("model-a", "low", 1.0)
+        for _ in range(3):
+            self.tracker.record("model-a", "low", 1.0, error=True)
+        self.assertGreater(self.tracker.get_performance_factors()["low"], 1.2)
+
+    def test_snapshot(self):
+        self.tracker.record("model-a", "mid", 2.0, output_tokens=100)
+        self.tracker.record_selection("mid", "default", count=3)
+        snapshot = self.tracker.snapshot()
+        model = snapshot["models"]["model-a"]
+        self.assertEqual(model["requests"], 1)
+        self.assertAlmostEqual(model["tokens_per_second"], 50.0)
+        self.assertAlmostEqual(model["p50"], 2.0, delta=0.05)
+        self.assertEqual(snapshot["tier_selections"]["mid"]["default"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+from app.python.helpers import query_features
+from app.python.helpers.query_features import (
+    QueryFeatureCache,
+    extract_query_features,
+)
+
+
+class TestQueryFeatures(unittest.TestCase):
+    def test_complexity_in_range(self):
+        features = extract_query_features(
+            "Compare the time complexity of quicksort and mergesort in 2024!"
+        )
+        self.assertTrue(0 <= features.complexity <= 1)
+        self.assertGreater(features.token_count, 0)
+        self.assertGreater(features.number_density, 0)
+
+    def test_stopwords_removed(self):
+        features = extract_query_features("What is the capital of France?")
+        self.assertNotIn("the", features.tokens)
+        self.assertIn("capital", features.tokens)
+
+    def test_empty_query(self):
+        features = extract_query_features("")
+        self.assertEqual(features.complexity, 0)
+        self.assertEqual(features.task_type, "general")
+
+    def test_task_and_question_type(self):
+        features = extract_query_features("Why does my code crash?")
+        self.assertEqual(features.task_type, "coding")
+        self.assertEqual(features.question_type, "problem_solving")
+
+    def test_cache_computes_once(self):
+        cache = QueryFeatureCache(max_size=2)
+        with patch.object(
+            query_features,
+            "extract_query_features",
+            wraps=extract_query_features,
+        ) as mock_extract:
+            first = cache.get("Explain recursion")
+            second = cache.get("Explain recursion")
+        self.assertIs(first, second)
+        mock_extract.assert_called_once()
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_cache_is_bounded(self):
+        cache = QueryFeatureCache(max_size=2)
+        for query in ["one", "two", "three"]:
+            cache.get(query)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(cache._key("one"), cache._entries)
+
+
+if __name__ == "__main__":
+    unittest.main()
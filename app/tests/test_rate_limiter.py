@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from app.python.helpers.rate_limiter import RateLimiter
+
+WINDOW = 0.2
+
+
+class TestAsyncRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_admits_up_to_max_calls_then_waits(self):
+        limiter = RateLimiter(2, 0, 0, WINDOW)
+        start = time.monotonic()
+        await limiter.acquire()
+        await limiter.acquire()
+        self.assertLess(time.monotonic() - start, WINDOW / 2)
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, WINDOW * 0.9)
+
+    async def test_waiting_does_not_block_the_loop(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        ticks = 0
+        while not waiter.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        self.assertGreater(ticks, 5)
+
+    async def test_waiters_are_served_in_order(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW / 4)
+        await limiter.acquire()
+        order = []
+
+        async def call(name):
+            await limiter.acquire()
+            order.append(name)
+
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.ensure_future(call(name)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, list("abcd"))
+
+    async def test_input_and_output_tokens(self):
+        limiter = RateLimiter(0, 100, 50, WINDOW)
+        first = await limiter.acquire(60)
+        # Too many input tokens for what is left of the window
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(60), WINDOW / 4)
+        await limiter.acquire(40)
+
+        limiter = RateLimiter(0, 0, 50, WINDOW)
+        record = await limiter.acquire()
+        limiter.release(50, record)
+        self.assertEqual(record.output_tokens, 50)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(), WINDOW / 4)
+        self.assertEqual(first.input_tokens, 60)
+
+    async def test_oversized_call_is_admitted_into_empty_window(self):
+        limiter = RateLimiter(0, 100, 0, WINDOW)
+        record = await asyncio.wait_for(limiter.acquire(500), WINDOW / 4)
+        self.assertEqual(record.input_tokens, 500)
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW)
+        await limiter.acquire()
+        head = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        head.cancel()
+        await asyncio.wait_for(second, WINDOW * 2)
+        self.assertEqual(len(limiter._waiters), 0)
+
+    async def test_async_context_manager(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW)
+        async with limiter as record:
+            self.assertEqual(record.input_tokens, 0)
+        self.assertEqual(len(limiter.call_records), 1)
+
+    async def test_blocking_facade_refuses_event_loop(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW)
+        with self.assertRaises(RuntimeError):
+            limiter.limit_call_and_input(0)
+        # From a worker thread it is fine
+        await asyncio.to_thread(limiter.limit_call_and_input, 0)
+
+
+class TestBlockingRateLimiter(unittest.TestCase):
+    def test_context_manager_across_threads(self):
+        limiter = RateLimiter(3, 0, 0, WINDOW)
+        admitted = []
+
+        def call():
+            with limiter:
+                admitted.append(time.monotonic())
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        admitted.sort()
+        self.assertLess(admitted[2] - start, WINDOW / 2)
+        self.assertGreaterEqual(admitted[3] - start, WINDOW * 0.9)
+
+    def test_thread_and_coroutine_share_the_queue(self):
+        limiter = RateLimiter(1, 0, 0, WINDOW)
+        limiter.limit_call_and_input(0)
+
+        async def acquire():
+            return await limiter.acquire()
+
+        start = time.monotonic()
+        asyncio.run(acquire())
+        limiter.limit_call_and_input(0)
+        self.assertGreaterEqual(time.monotonic() - start, WINDOW * 1.8)
+
+
+class TestWindowAccounting(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.limiter = RateLimiter(3, 100, 50, 10)
+        self.limiter.clock = lambda: self.now
+
+    def call(self, input_tokens, output_tokens=0, at=None):
+        if at is not None:
+            self.now = at
+        record = self.limiter.limit_call_and_input(input_tokens)
+        self.limiter.release(output_tokens, record)
+        return record
+
+    def test_running_totals_follow_the_window(self):
+        first = self.call(10, 5, at=100.0)
+        self.call(20, 6, at=101.0)
+        self.assertEqual(self.limiter._get_counts(), (2, 30, 11))
+        self.now = 110.0
+        self.limiter._clean_old_records(self.now)
+        self.assertEqual(self.limiter._get_counts(), (1, 20, 6))
+        # Output reported for a call that already left the window
+        self.limiter.release(7, first)
+        self.assertEqual(self.limiter._get_counts(), (1, 20, 6))
+        self.now = 111.0
+        self.limiter._clean_old_records(self.now)
+        self.assertEqual(self.limiter._get_counts(), (0, 0, 0))
+
+    def test_exact_wait_for_calls(self):
+        self.call(1, at=100.0)
+        self.call(1, at=102.0)
+        self.call(1, at=104.0)
+        self.assertAlmostEqual(self.limiter._wait_time(105.0, 1), 5.0)
+
+    def test_exact_wait_for_input_tokens(self):
+        self.call(40, at=100.0)
+        self.call(40, at=102.0)
+        # 80 + 70 needs 50 freed: both calls have to expire
+        self.assertAlmostEqual(self.limiter._wait_time(103.0, 70), 9.0)
+        self.assertAlmostEqual(self.limiter._wait_time(103.0, 30), 7.0)
+        self.assertEqual(self.limiter._wait_time(103.0, 20), 0.0)
+
+    def test_exact_wait_for_output_tokens(self):
+        self.call(1, 30, at=100.0)
+        second = self.call(1, 0, at=101.0)
+        self.call(1, 0, at=102.0)
+        self.limiter.release(30, second)
+        self.limiter.max_calls = 0
+        self.assertAlmostEqual(self.limiter._wait_time(103.0, 1), 7.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from app.python.helpers.adaptive_rate_limiter import AdaptiveRateLimiter
+from app.python.helpers.rate_limiter import RateLimiter, create_rate_limiter
+
+try:
+    import fakeredis
+
+    from app.python.helpers.redis_rate_limiter import RedisRateLimiter
+except ImportError:  # fakeredis is a dev dependency
+    fakeredis = None
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class TestRedisRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+
+    def limiter(self, max_calls=3, max_input=0, max_output=0, window=10):
+        return RedisRateLimiter(
+            fakeredis.FakeRedis(server=self.server),
+            "test",
+            max_calls,
+            max_input,
+            max_output,
+            window,
+            retry_seconds=0.2,
+        )
+
+    def test_window_is_shared_between_workers(self):
+        first, second = self.limiter(), self.limiter()
+        first.limit_call_and_input(0)
+        second.limit_call_and_input(0)
+        first.limit_call_and_input(0)
+        record, wait_time = second._admit(second.clock(), 0)
+        self.assertIsNone(record)
+        self.assertGreater(wait_time, 9)
+        self.assertLessEqual(wait_time, 10)
+
+    def test_atomic_under_concurrency(self):
+        limiters = [self.limiter(max_calls=5) for _ in range(4)]
+        admitted = []
+        barrier = threading.Barrier(20)
+
+        def attempt(limiter):
+            barrier.wait()
+            record, _ = limiter._admit(limiter.clock(), 0)
+            if record is not None:
+                admitted.append(record.call_id)
+
+        threads = [
+            threading.Thread(target=attempt, args=(limiters[i % 4],))
+            for i in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), 5)
+        self.assertEqual(len(set(admitted)), 5)
+
+    def test_tokens_are_shared(self):
+        first = self.limiter(max_calls=0, max_input=100, max_output=50)
+        second = self.limiter(max_calls=0, max_input=100, max_output=50)
+        record = first.limit_call_and_input(60)
+        self.assertIsNone(second._admit(second.clock(), 60)[0])
+        self.assertIsNotNone(second._admit(second.clock(), 40)[0])
+
+        first.release(50, record)
+        self.assertEqual(record.output_tokens, 50)
+        self.assertIsNone(second._admit(second.clock(), 0)[0])
+
+    def test_calls_expire(self):
+        limiter = self.limiter(max_calls=2, max_input=100, window=0.3)
+        limiter.limit_call_and_input(80)
+        time.sleep(0.1)
+        limiter.limit_call_and_input(10)
+        start = time.monotonic()
+        limiter.limit_call_and_input(50)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        client = fakeredis.FakeRedis(server=self.server)
+        # Only the oldest call had to expire
+        self.assertEqual(client.zcard(limiter.keys[0]), 2)
+        self.assertEqual(int(client.hget(limiter.keys[2], "input")), 60)
+
+    def test_async_acquire(self):
+        limiter = self.limiter(max_calls=1, window=0.2)
+
+        async def acquire_twice():
+            await limiter.acquire(5)
+            start = time.monotonic()
+            record = await limiter.acquire(5)
+            return record, time.monotonic() - start
+
+        record, waited = asyncio.run(acquire_twice())
+        self.assertIsNotNone(record.call_id)
+        self.assertGreaterEqual(waited, 0.15)
+
+    def test_async_release_runs_off_the_loop(self):
+        limiter = self.limiter(max_calls=0, max_output=50)
+        record = limiter.limit_call_and_input(0)
+        loop_thread = threading.get_ident()
+        script_threads = []
+        release_script = limiter._release_script
+
+        def release(*args, **kwargs):
+            script_threads.append(threading.get_ident())
+            return release_script(*args, **kwargs)
+
+        limiter._release_script = release
+        asyncio.run(limiter.arelease(50, record))
+        self.assertEqual(record.output_tokens, 50)
+        self.assertNotIn(loop_thread, script_threads)
+        other = self.limiter(max_calls=0, max_output=50)
+        self.assertIsNone(other._admit(other.clock(), 0)[0])
+
+    def test_headroom_is_cached(self):
+        limiter = self.limiter(max_calls=4)
+        limiter.headroom_ttl = 60
+        self.assertEqual(limiter.headroom(), 1.0)
+        self.limiter(max_calls=4).limit_call_and_input(0)
+        self.assertEqual(limiter.headroom(), 1.0)
+        limiter._headroom_read_at -= 60
+        self.assertEqual(limiter.headroom(), 0.75)
+
+    def test_routing_never_waits_for_headroom(self):
+        limiter = self.limiter(max_calls=4)
+        limiter.headroom()
+        self.limiter(max_calls=4).limit_call_and_input(0)
+        limiter._headroom_read_at -= limiter.headroom_ttl
+        usage_script = limiter._usage_script
+        script_threads = []
+
+        def usage(*args, **kwargs):
+            script_threads.append(threading.get_ident())
+            return usage_script(*args, **kwargs)
+
+        limiter._usage_script = usage
+
+        async def read():
+            # The stale reading answers now; a worker thread refreshes it
+            stale = limiter.headroom()
+            while limiter._headroom_refreshing.locked():
+                await asyncio.sleep(0.01)
+            return stale, threading.get_ident()
+
+        stale, loop_thread = asyncio.run(read())
+        self.assertEqual(stale, 1.0)
+        self.assertEqual(len(script_threads), 1)
+        self.assertNotEqual(script_threads[0], loop_thread)
+        self.assertEqual(limiter.headroom(), 0.75)
+
+    def test_falls_back_to_local_window(self):
+        limiter = self.limiter(max_calls=1)
+        self.server.connected = False
+        record = limiter.limit_call_and_input(0)
+        self.assertIsNone(record.call_id)
+        self.assertFalse(limiter.using_redis)
+        # The local window still enforces the limits
+        self.assertIsNone(limiter._admit(limiter.clock(), 0)[0])
+
+        self.server.connected = True
+        time.sleep(0.25)
+        record = limiter.limit_call_and_input(0)
+        self.assertIsNotNone(record.call_id)
+
+    def test_factory(self):
+        config = {
+            "rate_limit_backend": "redis",
+            "rate_limit_redis_url": "redis://localhost:1/0",
+        }
+        limiter = create_rate_limiter(config, "router", 1, 0, 0, 60)
+        self.assertIsInstance(limiter, RedisRateLimiter)
+        self.assertEqual(limiter.keys[0], "rate_limit:{router}:calls")
+        # Nothing listens there: the call is limited locally instead
+        self.assertIsNone(limiter.limit_call_and_input(0).call_id)
+
+
+class TestCreateRateLimiter(unittest.TestCase):
+    def test_local_by_default(self):
+        limiter = create_rate_limiter({}, "router", 1, 2, 3, 60)
+        self.assertIs(type(limiter), AdaptiveRateLimiter)
+        self.assertEqual(limiter.max_output_tokens, 3)
+
+    def test_fixed_limits_when_not_adaptive(self):
+        limiter = create_rate_limiter(
+            {"rate_limit_adaptive": False}, "router", 1, 2, 3, 60
+        )
+        self.assertIs(type(limiter), RateLimiter)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+from app.python.helpers.response_cache import ResponseCache, normalize_messages
+
+
+class FakeRedisCache:
+    store = {}
+
+    @classmethod
+    def set(cls, key, value, expiration=3600):
+        cls.store[key] = value
+
+    @classmethod
+    def get(cls, key):
+        return cls.store.get(key)
+
+
+CONFIG = {
+    "model": "llama-3.1-70b-versatile",
+    "temperature": 0.5,
+    "max_tokens": 512,
+    "response_strategy": "direct_answer",
+}
+MESSAGES = [{"role": "user", "content": "What is the capital of France?"}]
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        FakeRedisCache.store = {}
+        patcher = patch(
+            "app.python.helpers.response_cache.RedisCache", FakeRedisCache
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache()
+
+    def test_key_ignores_whitespace(self):
+        spaced = [
+            {"role": "user", "content": "  What is the  capital of\nFrance? "}
+        ]
+        self.assertEqual(
+            self.cache.key(CONFIG, MESSAGES), self.cache.key(CONFIG, spaced)
+        )
+
+    def test_key_depends_on_model_settings(self):
+        key = self.cache.key(CONFIG, MESSAGES)
+        for change in (
+            {"model": "llama-3.1-8b-instant"},
+            {"temperature": 0.3},
+            {"max_tokens": 256},
+        ):
+            self.assertNotEqual(
+                key, self.cache.key({**CONFIG, **change}, MESSAGES)
+            )
+
+    def test_opt_in_per_strategy_and_temperature(self):
+        self.assertTrue(self.cache.accepts(CONFIG))
+        self.assertFalse(
+            self.cache.accepts(
+                {**CONFIG, "response_strategy": "open_discussion"}
+            )
+        )
+        self.assertFalse(self.cache.accepts({**CONFIG, "temperature": 0.9}))
+        self.assertFalse(ResponseCache(enabled=False).accepts(CONFIG))
+        self.assertEqual(self.cache.stats()["bypasses"], 2)
+
+    def test_round_trip_and_stats(self):
+        key = self.cache.key(CONFIG, MESSAGES)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, {"content": "Paris", "model_used": "m"})
+        self.assertEqual(self.cache.get(key)["content"], "Paris")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_normalize_messages(self):
+        self.assertEqual(
+            normalize_messages([{"role": "assistant", "content": " a\t b "}]),
+            [["assistant", "a b"]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import random
+import unittest
+from unittest.mock import MagicMock
+from app.advanced_router import AdvancedRouter
+
+
+class TestRouteMany(unittest.TestCase):
+    def setUp(self):
+        self.router = AdvancedRouter(
+            {"ROUTER_THRESHOLD": 0.7}, MagicMock(), MagicMock()
+        )
+        rng = random.Random(7)
+        words = (
+            "analyze code the hi what is please explain compare 2024 $x "
+            "function quantum entanglement today news write hello"
+        ).split()
+        self.queries = [
+            " ".join(rng.choices(words, k=rng.randint(1, 40)))
+            for _ in range(200)
+        ]
+        self.histories = [
+            [
+                {
+                    "role": "user",
+                    "content": " ".join(
+                        rng.choices(words, k=rng.randint(1, 12))
+                    ),
+                }
+                for _ in range(rng.randint(0, 8))
+            ]
+            for _ in self.queries
+        ]
+        self.histories[0].append({"role": "user", "content": "x" * 4500})
+
+    def test_matches_route(self):
+        result = self.router.route_many(self.queries, self.histories)
+
+        async def route_all():
+            return [
+                await self.router.route(query, history)
+                for query, history in zip(self.queries, self.histories)
+            ]
+
+        expected = asyncio.run(route_all())
+        self.assertEqual(result["configs"], expected)
+
+    def test_tier_histogram(self):
+        result = self.router.route_many(self.queries, self.histories)
+        histogram = result["tier_histogram"]
+        self.assertEqual(sum(histogram.values()), len(self.queries))
+        self.assertEqual(
+            histogram["high"],
+            sum(config["tier"] == "high" for config in result["configs"]),
+        )
+
+    def test_fast_high_tier_does_not_attract_traffic(self):
+        rng = random.Random(5)
+        tracker = self.router.performance_tracker
+        for _ in range(20):
+            tracker.record("claude-3-opus", "high", rng.uniform(15, 25))
+        for _ in range(3):
+            tracker.record("claude-3-opus", "high", 8.0)
+        query = "Summarize the meeting notes"
+        config = asyncio.run(self.router.route(query, []))
+        self.assertEqual(config["tier"], "mid")
+        result = self.router.route_many([query], [[]])
+        self.assertEqual(result["configs"], [config])
+
+    def test_empty_and_mismatched(self):
+        self.assertEqual(self.router.route_many([])["configs"], [])
+        with self.assertRaises(ValueError):
+            self.router.route_many(["hi"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
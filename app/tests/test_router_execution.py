@@ -0,0 +1,565 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.advanced_router import AdvancedRouter
+from app.python.helpers.history_window import HistoryWindow
+from app.python.helpers.llm_scheduler import LLMScheduler
+from app.python.helpers.model_rate_limits import (
+    ModelLimits,
+    ModelRateLimiterRegistry,
+    RateLimitedChatModel,
+)
+from app.python.helpers.semantic_cache import SemanticCache
+from app.tests.test_semantic_cache import bag_of_words
+
+
+class FakeChunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChatModel:
+    def __init__(self, name, first_token_delay=0.0, reply=None, fail=False):
+        self.name = name
+        self.first_token_delay = first_token_delay
+        self.reply = reply or f"answer from {name}"
+        self.fail = fail
+        self.cancelled = False
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        await asyncio.sleep(self.first_token_delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return FakeChunk(self.reply)
+
+    async def astream(self, messages):
+        self.prompts.append(messages)
+        try:
+            await asyncio.sleep(self.first_token_delay)
+            if self.fail:
+                raise RuntimeError(f"{self.name} failed")
+            for word in self.reply.split(" "):
+                yield FakeChunk(word + " ")
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class RouterExecutionTestCase(unittest.IsolatedAsyncioTestCase):
+    config = {"ROUTER_THRESHOLD": 0.7}
+
+    def setUp(self):
+        self.router = AdvancedRouter(self.config, MagicMock(), MagicMock())
+        self.models = {}
+
+    def use_models(self, **models):
+        self.models = {
+            self.router.model_tiers[tier]: model
+            for tier, model in models.items()
+        }
+        patcher = patch(
+            "app.advanced_router.get_chat_model",
+            side_effect=lambda name, *args, **kwargs: self.models[name],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route_as(
+        self, complexity, tier="mid", response_strategy="open_discussion"
+    ):
+        config = {
+            "model": self.router.model_tiers[tier],
+            "tier": tier,
+            "max_tokens": 512,
+            "temperature": 0.7,
+            "task_type": "general",
+            "question_type": "open_ended",
+            "response_strategy": response_strategy,
+            "task_complexity": complexity,
+        }
+
+        async def route(query, history):
+            return dict(config)
+
+        self.router.route = route
+
+
+class TestHedgedExecution(RouterExecutionTestCase):
+    config = {
+        "ROUTER_THRESHOLD": 0.7,
+        "router_hedging_enabled": True,
+        "router_hedge_margin": 0.1,
+        "router_hedge_delay": 0.05,
+    }
+
+    async def test_primary_answers_before_delay(self):
+        self.use_models(
+            mid=FakeChatModel("mid", first_token_delay=0.0),
+            high=FakeChatModel("high"),
+        )
+        self.route_as(0.65)
+        result = await self.router.process("query", {})
+        self.assertFalse(result["hedge"]["hedged"])
+        self.assertEqual(result["hedge"]["winner"], "primary")
+        self.assertEqual(result["model_used"], self.router.model_tiers["mid"])
+
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        slow = FakeChatModel("mid", first_token_delay=1.0)
+        self.use_models(mid=slow, high=FakeChatModel("high"))
+        self.route_as(0.68)
+        result = await self.router.process("query", {})
+        self.assertTrue(result["hedge"]["hedged"])
+        self.assertEqual(result["hedge"]["winner"], "hedge")
+        self.assertEqual(result["model_used"], self.router.model_tiers["high"])
+        self.assertTrue(slow.cancelled)
+
+    async def test_failed_primary_falls_back_to_hedge(self):
+        self.use_models(
+            mid=FakeChatModel("mid", fail=True), high=FakeChatModel("high")
+        )
+        self.route_as(0.72, tier="high")
+        result = await self.router.process("query", {})
+        self.assertEqual(result["hedge"]["winner"], "hedge")
+
+    async def test_not_borderline(self):
+        self.use_models(low=FakeChatModel("low"), mid=FakeChatModel("mid"))
+        self.route_as(0.3)
+        result = await self.router.process("query", {})
+        self.assertNotIn("hedge", result)
+
+
+class TestCascadeExecution(RouterExecutionTestCase):
+    config = {"ROUTER_THRESHOLD": 0.7, "router_cascade_enabled": True}
+
+    async def test_confident_low_tier_answer(self):
+        self.use_models(
+            low=FakeChatModel("low", reply="Paris is the capital of France.")
+        )
+        self.route_as(0.4)
+        result = await self.router.process("Capital of France?", {})
+        self.assertEqual(result["model_used"], self.router.model_tiers["low"])
+        self.assertFalse(result["cascade"]["escalated"])
+
+    async def test_escalates_on_refusal(self):
+        self.use_models(
+            low=FakeChatModel(
+                "low", reply="I'm sorry, I cannot help with that."
+            ),
+            mid=FakeChatModel("mid", reply="I don't know."),
+            high=FakeChatModel("high", reply="Here is a detailed answer."),
+        )
+        self.route_as(0.4)
+        result = await self.router.process("Explain quantum tunnelling", {})
+        path = result["cascade"]["path"]
+        self.assertEqual([leg["tier"] for leg in path], ["low", "mid", "high"])
+        self.assertIn("refusal", path[0]["reasons"])
+        self.assertIn("uncertain", path[1]["reasons"])
+        self.assertEqual(result["model_used"], self.router.model_tiers["high"])
+
+    async def test_history_is_windowed_per_tier(self):
+        models = {
+            tier: FakeChatModel(tier, reply="I don't know.")
+            for tier in ("low", "mid", "high")
+        }
+        self.use_models(**models)
+        self.route_as(0.4)
+        small = self.router.model_tiers["low"]
+        self.router.history_window = HistoryWindow(keep_start=1, keep_end=2)
+        self.router.history_window.budget_for = lambda model: (
+            800 if model == small else 100000
+        )
+        history = [
+            {"role": role, "content": f"message {i} " + "word " * 100}
+            for i, role in enumerate(["user", "assistant"] * 5)
+        ]
+        query = "Explain quantum tunnelling"
+        await self.router.process(
+            query,
+            {
+                "conversation_history": history
+                + [{"role": "user", "content": query}]
+            },
+        )
+        low_prompt = models["low"].prompts[0]
+        self.assertEqual(len(low_prompt), 5)
+        self.assertEqual(low_prompt[1]["role"], "system")
+        self.assertTrue(low_prompt[1]["content"].startswith("Summary of 7"))
+        # The roomier tiers get the whole history, the question only once
+        for tier in ("mid", "high"):
+            prompt = models[tier].prompts[0]
+            self.assertEqual(len(prompt), 11)
+            self.assertEqual(prompt[-1], {"role": "user", "content": query})
+            self.assertNotEqual(prompt[-2]["content"], query)
+
+
+class TestStreamingExecution(RouterExecutionTestCase):
+    async def collect(self, query="query"):
+        return [
+            event async for event in self.router.astream_process(query, {})
+        ]
+
+    async def test_tokens_then_done(self):
+        self.use_models(mid=FakeChatModel("mid", reply="one two three"))
+        self.route_as(0.5)
+        events = await self.collect()
+        tokens = [e["content"] for e in events if e["event"] == "token"]
+        self.assertEqual(tokens, ["one ", "two ", "three "])
+        done = events[-1]
+        self.assertEqual(done["event"], "done")
+        self.assertEqual(done["content"], "one two three ")
+        self.assertEqual(done["model_used"], self.router.model_tiers["mid"])
+        self.assertLessEqual(
+            done["time_to_first_token"], done["processing_time"]
+        )
+
+    async def test_records_time_to_first_token(self):
+        self.use_models(mid=FakeChatModel("mid", first_token_delay=0.05))
+        self.route_as(0.5)
+        await self.collect()
+        stats = self.router.get_performance_stats()["models"]
+        self.assertGreaterEqual(
+            stats[self.router.model_tiers["mid"]]["ttft_p95"], 0.04
+        )
+
+    async def test_model_error_propagates(self):
+        self.use_models(mid=FakeChatModel("mid", fail=True))
+        self.route_as(0.5)
+        with self.assertRaises(RuntimeError):
+            await self.collect()
+        stats = self.router.get_performance_stats()["models"]
+        self.assertEqual(stats[self.router.model_tiers["mid"]]["errors"], 1)
+
+
+class TestResponseCaching(RouterExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        store = {}
+        patcher = patch(
+            "app.python.helpers.response_cache.RedisCache",
+            **{
+                "get.side_effect": store.get,
+                "set.side_effect": lambda key, value, expiration: (
+                    store.__setitem__(key, value)
+                ),
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_repeat_is_served_from_cache(self):
+        model = FakeChatModel("mid")
+        model.ainvoke = MagicMock(wraps=model.ainvoke)
+        self.use_models(mid=model)
+        self.route_as(0.5, response_strategy="direct_answer")
+        first = await self.router.process("Capital of France?", {})
+        second = await self.router.process("Capital of France?", {})
+        self.assertEqual(first["response_cache"], "miss")
+        self.assertEqual(second["response_cache"], "hit")
+        self.assertEqual(second["content"], first["content"])
+        model.ainvoke.assert_called_once()
+
+    async def test_other_strategies_bypass(self):
+        self.use_models(mid=FakeChatModel("mid"))
+        self.route_as(0.5)
+        result = await self.router.process("Tell me a story", {})
+        self.assertEqual(result["response_cache"], "bypass")
+
+    async def test_paraphrase_is_served_from_semantic_cache(self):
+        self.router.semantic_cache = SemanticCache(bag_of_words, threshold=0.9)
+        model = FakeChatModel("mid")
+        model.ainvoke = MagicMock(wraps=model.ainvoke)
+        self.use_models(mid=model)
+        self.route_as(0.5, response_strategy="direct_answer")
+        await self.router.process("what is the capital of france", {})
+        result = await self.router.process(
+            "What is the capital of France?", {}
+        )
+        self.assertEqual(result["response_cache"], "semantic_hit")
+        self.assertGreaterEqual(result["cache_similarity"], 0.9)
+        model.ainvoke.assert_called_once()
+
+    async def test_semantic_cache_serves_endpoint_requests(self):
+        self.router.semantic_cache = SemanticCache(bag_of_words, threshold=0.9)
+        model = FakeChatModel("mid")
+        model.ainvoke = MagicMock(wraps=model.ainvoke)
+        self.use_models(mid=model)
+        self.route_as(0.5, response_strategy="direct_answer")
+        for query in (
+            "what is the capital of france",
+            "What is the capital of France?",
+        ):
+            # The history shape /query sends: just the current question
+            result = await self.router.process(
+                query,
+                {"conversation_history": [{"role": "user", "content": query}]},
+            )
+        self.assertEqual(result["response_cache"], "semantic_hit")
+        model.ainvoke.assert_called_once()
+
+    async def test_semantic_cache_skips_conversations(self):
+        self.router.semantic_cache = SemanticCache(bag_of_words, threshold=0.9)
+        self.use_models(mid=FakeChatModel("mid"))
+        self.route_as(0.5, response_strategy="direct_answer")
+        await self.router.process("what is the capital of france", {})
+        history = [{"role": "user", "content": "Talking about Texas"}]
+        result = await self.router.process(
+            "What is the capital of France?",
+            {"conversation_history": history},
+        )
+        self.assertEqual(result["response_cache"], "miss")
+
+    async def test_slow_redis_does_not_block_the_loop(self):
+        self.use_models(mid=FakeChatModel("mid"))
+        self.route_as(0.5, response_strategy="direct_answer")
+        slow = patch(
+            "app.python.helpers.response_cache.RedisCache.get",
+            side_effect=lambda key: time.sleep(0.2),
+        )
+        slow.start()
+        self.addCleanup(slow.stop)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        await self.router.process("Capital of France?", {})
+        ticker.cancel()
+        self.assertGreater(ticks, 10)
+
+
+class TestRequestCoalescing(RouterExecutionTestCase):
+    async def test_identical_concurrent_queries_share_one_call(self):
+        model = FakeChatModel("mid", first_token_delay=0.05)
+        model.ainvoke = MagicMock(wraps=model.ainvoke)
+        self.use_models(mid=model)
+        self.route_as(0.5)
+        results = await asyncio.gather(
+            *(self.router.process("Same question", {}) for _ in range(5))
+        )
+        self.assertEqual(len({r["content"] for r in results}), 1)
+        model.ainvoke.assert_called_once()
+        self.assertEqual(self.router.single_flight.stats()["saved_calls"], 4)
+
+    async def test_different_histories_are_not_coalesced(self):
+        model = FakeChatModel("mid", first_token_delay=0.05)
+        model.ainvoke = MagicMock(wraps=model.ainvoke)
+        self.use_models(mid=model)
+        self.route_as(0.5)
+        await asyncio.gather(
+            self.router.process("Same question", {}),
+            self.router.process(
+                "Same question",
+                {"conversation_history": [{"role": "user", "content": "x"}]},
+            ),
+        )
+        self.assertEqual(model.ainvoke.call_count, 2)
+
+
+class TestCircuitBreakerFailover(RouterExecutionTestCase):
+    config = {"ROUTER_THRESHOLD": 0.7, "circuit_breaker_min_calls": 2}
+
+    async def test_failing_provider_is_replaced(self):
+        self.use_models(mid=FakeChatModel("groq", fail=True))
+        self.models["gpt-4o"] = FakeChatModel("openai")
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                await self.router.process("tell me about rivers", {})
+
+        stats = self.router.get_circuit_breaker_stats()
+        self.assertEqual(stats["groq"]["state"], "open")
+        config = await self.router.route("tell me about rivers", [])
+        self.assertEqual(config["model"], "gpt-4o")
+        self.assertEqual(
+            config["failover_from"], self.router.model_tiers["mid"]
+        )
+
+        result = await self.router.process("tell me about rivers", {})
+        self.assertEqual(result["content"], "answer from openai")
+        self.assertEqual(result["model_used"], "gpt-4o")
+
+    async def test_route_many_substitutes_too(self):
+        self.router.circuit_breakers.record("groq", 1.0, error=True)
+        self.router.circuit_breakers.record("groq", 1.0, error=True)
+        queries = ["tell me about rivers", "hi"]
+        configs = self.router.route_many(queries)["configs"]
+        expected = [await self.router.route(query, []) for query in queries]
+        self.assertEqual(configs, expected)
+        self.assertNotIn("groq", {c["model"].split("-")[0] for c in configs})
+
+    async def test_keeps_model_without_healthy_substitute(self):
+        for provider in ("groq", "openai", "anthropic"):
+            for _ in range(2):
+                self.router.circuit_breakers.record(provider, 1.0, error=True)
+        config = await self.router.route("tell me about rivers", [])
+        self.assertEqual(config["model"], self.router.model_tiers["mid"])
+        self.assertNotIn("failover_from", config)
+
+
+class TestRateLimitFailover(RouterExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mid = self.router.model_tiers["mid"]
+        self.router.model_rate_limiters = ModelRateLimiterRegistry(
+            {self.mid: ModelLimits(1), "gpt-4o": ModelLimits(1)}
+        )
+
+    async def test_exhausted_model_is_replaced(self):
+        await self.router.model_rate_limiters.get(self.mid).acquire()
+        config = await self.router.route("tell me about rivers", [])
+        self.assertEqual(config["model"], "gpt-4o")
+        self.assertEqual(config["failover_from"], self.mid)
+        self.assertEqual(
+            self.router.get_model_headroom([self.mid, "gpt-4o"]),
+            {self.mid: 0.0, "gpt-4o": 1.0},
+        )
+
+    async def test_skips_exhausted_substitutes(self):
+        await self.router.model_rate_limiters.get(self.mid).acquire()
+        await self.router.model_rate_limiters.get("gpt-4o").acquire()
+        config = await self.router.route("tell me about rivers", [])
+        self.assertEqual(config["model"], "claude-3-5-sonnet-20240620")
+
+    async def test_model_with_headroom_is_kept(self):
+        config = await self.router.route("tell me about rivers", [])
+        self.assertEqual(config["model"], self.mid)
+        self.assertNotIn("failover_from", config)
+
+
+class TestScheduledModelCalls(RouterExecutionTestCase):
+    async def test_model_calls_hold_a_slot(self):
+        self.router.llm_scheduler = LLMScheduler(max_concurrent=1)
+        self.use_models(mid=FakeChatModel("mid", first_token_delay=0.05))
+        params = {"conversation_id": "c1"}
+        first = asyncio.ensure_future(
+            self.router.process("tell me about rivers", params)
+        )
+        await asyncio.sleep(0.01)
+        stats = self.router.llm_scheduler.stats()
+        self.assertEqual(stats["active"], 1)
+
+        events = [
+            event
+            async for event in self.router.astream_process(
+                "tell me about lakes", {"conversation_id": "c2"}
+            )
+        ]
+        await first
+        self.assertEqual(events[-1]["event"], "done")
+        stats = self.router.llm_scheduler.stats()
+        self.assertEqual(stats["active"], 0)
+        self.assertEqual(stats["classes"]["interactive"]["admitted"], 2)
+        self.assertGreater(stats["classes"]["interactive"]["max_wait"], 0)
+
+
+class TestChatModelAccounting(RouterExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.record = object()
+        self.router.rate_limiter = MagicMock()
+        self.router.rate_limiter.acquire = AsyncMock(return_value=self.record)
+        self.router.rate_limiter.arelease = AsyncMock()
+
+    async def test_output_tokens_are_released(self):
+        self.router.agent.chat_model = FakeChatModel("agent", reply="x" * 40)
+        await self.router.process_chat_model("hello", {})
+        self.router.rate_limiter.arelease.assert_awaited_once_with(
+            10, self.record
+        )
+
+    async def test_failed_call_still_releases(self):
+        self.router.agent.chat_model = FakeChatModel("agent", fail=True)
+        with self.assertRaises(RuntimeError):
+            await self.router.process_chat_model("hello", {})
+        self.router.rate_limiter.arelease.assert_awaited_once_with(
+            0, self.record
+        )
+
+
+class TestQuotaWaits(RouterExecutionTestCase):
+    async def test_quota_wait_is_not_model_latency(self):
+        self.router.llm_scheduler = LLMScheduler(max_concurrent=1)
+        limiter = ModelRateLimiterRegistry(
+            {"mid": ModelLimits(1, window_seconds=0.2)}
+        ).get("mid")
+        await limiter.acquire()
+        self.use_models(
+            mid=RateLimitedChatModel(
+                FakeChatModel("mid", first_token_delay=0.02), limiter
+            )
+        )
+        mid = self.router.model_tiers["mid"]
+        start = time.monotonic()
+        call = asyncio.ensure_future(
+            self.router.process("tell me about rivers", {})
+        )
+        await asyncio.sleep(0.05)
+        # Waiting for quota does not hold a scheduler slot
+        self.assertEqual(self.router.llm_scheduler.stats()["active"], 0)
+        result = await call
+        self.assertGreater(time.monotonic() - start, 0.15)
+        self.assertLess(result["processing_time"], 0.1)
+        stats = self.router.performance_tracker.get_model_stats(mid)
+        self.assertLess(stats.ewma_latency, 0.1)
+
+
+class EchoChatModel:
+    """Answers with the question; "slow" questions take longer."""
+
+    async def ainvoke(self, messages):
+        question = str(messages[-1])
+        if "broken" in question:
+            raise RuntimeError("model failed")
+        await asyncio.sleep(0.1 if "slow" in question else 0.02)
+        return FakeChunk(f"answer to {question}")
+
+
+class TestBatchExecution(RouterExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_models(
+            **{tier: EchoChatModel() for tier in ("low", "mid", "high")}
+        )
+
+    async def test_answers_concurrently_as_they_finish(self):
+        queries = ["slow question", "fast question", "broken question"]
+        start = asyncio.get_running_loop().time()
+        finished = [
+            (index, result)
+            async for index, result in self.router.process_many(
+                [(query, {"conversation_id": "c1"}) for query in queries]
+            )
+        ]
+        elapsed = asyncio.get_running_loop().time() - start
+
+        self.assertLess(elapsed, 0.2)
+        self.assertEqual([index for index, _ in finished], [2, 1, 0])
+        results = dict(finished)
+        self.assertIn("slow question", results[0]["content"])
+        self.assertIn("fast question", results[1]["content"])
+        self.assertIsInstance(results[2], RuntimeError)
+
+    async def test_uses_route_many_configs(self):
+        self.router.route = MagicMock(side_effect=AssertionError)
+        items = [("hi", {}), ("explain quantum tunneling in depth", {})]
+        configs = self.router.route_many([query for query, _ in items])
+        finished = dict(
+            [pair async for pair in self.router.process_many(items)]
+        )
+        for index, config in enumerate(configs["configs"]):
+            self.assertEqual(finished[index]["model_used"], config["model"])
+
+    async def test_empty_batch(self):
+        self.assertEqual(
+            [pair async for pair in self.router.process_many([])], []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
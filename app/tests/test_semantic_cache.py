@@ -0,0 +1,88 @@
+import hashlib
+import re
+import unittest
+from unittest.mock import patch
+from app.python.helpers.semantic_cache import (
+    SemanticCache,
+    invalidate_semantic_caches,
+)
+
+DIMENSION = 64
+
+
+def bag_of_words(text):
+    """Deterministic stand-in for an embedding model."""
+    vector = [0.0] * DIMENSION
+    for word in re.findall(r"\w+", text.lower()):
+        bucket = hashlib.md5(word.encode()).digest()[0] % DIMENSION
+        vector[bucket] += 1.0
+    return vector
+
+
+class TestSemanticCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticCache(bag_of_words, threshold=0.9, ttl=60)
+
+    def test_paraphrase_hits(self):
+        first = self.cache.lookup("what is the capital of france")
+        self.assertFalse(first.hit)
+        self.cache.store("what is the capital of france", "Paris", first)
+        hit = self.cache.lookup("What is the capital of France?")
+        self.assertTrue(hit.hit)
+        self.assertEqual(hit.answer, "Paris")
+        self.assertGreaterEqual(hit.similarity, 0.9)
+
+    def test_different_question_misses(self):
+        self.cache.store("what is the capital of france", "Paris")
+        self.assertFalse(self.cache.lookup("how do I sort a list").hit)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_expired_entries_are_dropped(self):
+        self.cache.store("what is the capital of france", "Paris")
+        with patch(
+            "app.python.helpers.semantic_cache.time.time",
+            return_value=10**10,
+        ):
+            self.assertFalse(
+                self.cache.lookup("what is the capital of france").hit
+            )
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(bag_of_words, threshold=0.99, max_entries=2)
+        cache.store("alpha beta", "1")
+        cache.store("gamma delta", "2")
+        # Touch the oldest entry so the second one is evicted instead
+        self.assertTrue(cache.lookup("alpha beta").hit)
+        cache.store("epsilon zeta", "3")
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.lookup("alpha beta").hit)
+        self.assertFalse(cache.lookup("gamma delta").hit)
+        self.assertEqual(cache.index.ntotal, 2)
+
+    def test_invalidated_by_ingestion(self):
+        self.cache.store("what is the capital of france", "Paris")
+        invalidate_semantic_caches()
+        self.assertFalse(
+            self.cache.lookup("what is the capital of france").hit
+        )
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_answer_from_before_invalidation_is_not_stored(self):
+        miss = self.cache.lookup("what is the capital of france")
+        invalidate_semantic_caches()
+        self.cache.store("what is the capital of france", "Paris", miss)
+        self.assertEqual(len(self.cache), 0)
+        self.assertFalse(
+            self.cache.lookup("what is the capital of france").hit
+        )
+
+    def test_answer_from_before_flush_is_not_stored(self):
+        miss = self.cache.lookup("what is the capital of france")
+        self.cache.invalidate()
+        self.cache.store("what is the capital of france", "Paris", miss)
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
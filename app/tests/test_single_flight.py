@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+import unittest
+from app.python.helpers.single_flight import (
+    SingleFlight,
+    coalesce_key,
+    get_single_flight,
+    single_flight_stats,
+)
+
+
+class TestCoalesceKey(unittest.TestCase):
+    def test_normalized_query(self):
+        self.assertEqual(
+            coalesce_key("What is  Python?"), coalesce_key(" what is python? ")
+        )
+
+    def test_extra_arguments(self):
+        self.assertNotEqual(coalesce_key("q", 5), coalesce_key("q", 10))
+        self.assertEqual(
+            coalesce_key("q", [{"role": "user", "content": "hi"}]),
+            coalesce_key("q", [{"content": "hi", "role": "user"}]),
+        )
+
+
+class TestSingleFlightSync(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        group = SingleFlight("test")
+        calls = []
+        started = threading.Event()
+
+        def work():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return "result"
+
+        results = []
+
+        def caller():
+            results.append(group.do("key", work))
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(group.stats()["saved_calls"], 7)
+        self.assertEqual(group.stats()["in_flight"], 0)
+
+    def test_errors_are_shared_and_not_remembered(self):
+        group = SingleFlight("test")
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            group.do("key", fail)
+        self.assertEqual(group.do("key", lambda: "ok"), "ok")
+
+    def test_named_groups_are_shared(self):
+        group = get_single_flight("test-shared")
+        self.assertIs(get_single_flight("test-shared"), group)
+        group.do("key", lambda: None)
+        self.assertEqual(single_flight_stats()["test-shared"]["executions"], 1)
+
+
+class TestSingleFlightAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        group = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(
+            *(group.do_async("key", work) for _ in range(10))
+        )
+        self.assertEqual(results, ["result"] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(group.stats()["saved_calls"], 9)
+
+    async def test_cancelled_waiter_does_not_cancel_work(self):
+        group = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.ensure_future(group.do_async("key", work))
+        second = asyncio.ensure_future(group.do_async("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "result")
+
+    async def test_exception_reaches_every_waiter(self):
+        group = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            group.do_async("key", fail),
+            group.do_async("key", fail),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+Train the learned router from logged routing outcomes.
+
+Reads the JSON lines AdvancedRouter writes when ROUTER_LOG_FILE is set (one
+record per answered tier: query, context_length, tier, latency, quality),
+labels every query with the cheapest tier that answered well enough, fits
+a softmax regression over the query features and saves it as NumPy weights
+for ROUTER_MODEL_FILE. A held-out split is used to report how the learned
+router compares with the heuristic one before the final model is fitted on
+all records.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app.python.helpers.keyword_classifier import (  # noqa: E402
+    load_keyword_classifier,
+)
+from app.python.helpers.learned_router import (  # noqa: E402
+    TIERS,
+    LearnedRouter,
+    featurize_many,
+    label_records,
+    train_router,
+)
+from app.python.helpers.query_features import (  # noqa: E402
+    QueryFeatureCache,
+    feature_cache,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def load_route_log(file_path: str) -> List[Dict[str, Any]]:
+    """Load routing outcome records from a JSON lines file."""
+    records = []
+    with open(file_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping invalid JSON on line {line_number}")
+    return records
+
+
+def evaluate(
+    model: LearnedRouter,
+    rows: np.ndarray,
+    examples: List[Dict[str, Any]],
+    min_confidence: float,
+) -> Dict[str, Any]:
+    """Compare learned (with heuristic fallback) and heuristic routing."""
+    rank = {tier: i for i, tier in enumerate(TIERS)}
+    proba = model.predict_proba(rows)
+    predicted = [model.tiers[i] for i in proba.argmax(axis=1)]
+    confident = proba.max(axis=1) >= min_confidence
+    routed = [
+        (
+            tier
+            if sure or not example.get("routed_tier")
+            else example["routed_tier"]
+        )
+        for tier, sure, example in zip(predicted, confident, examples)
+    ]
+    labels = [example["label"] for example in examples]
+
+    # Mean observed latency per tier, for a rough latency estimate
+    observed: Dict[str, List[float]] = {tier: [] for tier in TIERS}
+    for example in examples:
+        for tier, latency in example["latencies"].items():
+            observed[tier].append(latency)
+    tier_latency = {
+        tier: float(np.mean(values)) if values else None
+        for tier, values in observed.items()
+    }
+
+    def summary(tiers: List[str]) -> Dict[str, Any]:
+        latencies = [tier_latency[t] for t in tiers if tier_latency[t]]
+        return {
+            "tier_share": {
+                tier: tiers.count(tier) / len(tiers) for tier in TIERS
+            },
+            "under_routed": sum(
+                rank[t] < rank[label] for t, label in zip(tiers, labels)
+            )
+            / len(tiers),
+            "estimated_latency": (
+                float(np.mean(latencies)) if latencies else None
+            ),
+        }
+
+    heuristic = [
+        example.get("routed_tier") or example["label"] for example in examples
+    ]
+    return {
+        "examples": len(examples),
+        "accuracy": float(
+            np.mean([p == label for p, label in zip(predicted, labels)])
+        ),
+        "confident": float(confident.mean()),
+        "labels": summary(labels),
+        "heuristic": summary(heuristic),
+        "learned": summary(routed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the learned router from logged routing outcomes"
+    )
+    parser.add_argument(
+        "--log",
+        type=str,
+        required=True,
+        help="JSON lines file written by the router (ROUTER_LOG_FILE)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="router_model.npz",
+        help="Where to save the model weights (default: router_model.npz)",
+    )
+    parser.add_argument(
+        "--quality-threshold",
+        type=float,
+        default=0.6,
+        help="Minimum quality score of an acceptable answer (default: 0.6)",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=0.5,
+        help="Confidence below which the heuristic router decides "
+        "(default: 0.5)",
+    )
+    parser.add_argument(
+        "--keywords-file",
+        type=str,
+        default=os.getenv("ROUTER_KEYWORDS_FILE"),
+        help="Keyword tables the router uses (default: ROUTER_KEYWORDS_FILE)",
+    )
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--l2", type=float, default=1e-3)
+    parser.add_argument(
+        "--test-fraction",
+        type=float,
+        default=0.2,
+        help="Share of queries held out for evaluation (default: 0.2)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    examples = label_records(load_route_log(args.log), args.quality_threshold)
+    if len(examples) < 10:
+        logger.error(
+            f"Only {len(examples)} labelled queries, need at least 10"
+        )
+        sys.exit(1)
+
+    cache = (
+        QueryFeatureCache(
+            classifier=load_keyword_classifier(args.keywords_file)
+        )
+        if args.keywords_file
+        else feature_cache
+    )
+    rows = featurize_many(
+        [cache.get(example["query"]) for example in examples],
+        [example["context_length"] for example in examples],
+    )
+    labels = [example["label"] for example in examples]
+
+    order = np.random.default_rng(args.seed).permutation(len(examples))
+    test_size = max(1, int(len(examples) * args.test_fraction))
+    test, train = order[:test_size], order[test_size:]
+
+    model = train_router(
+        rows[train],
+        [labels[i] for i in train],
+        l2=args.l2,
+        epochs=args.epochs,
+    )
+    report = evaluate(
+        model,
+        rows[test],
+        [examples[i] for i in test],
+        args.min_confidence,
+    )
+    logger.info(f"Held-out evaluation:\n{json.dumps(report, indent=2)}")
+
+    model = train_router(rows, labels, l2=args.l2, epochs=args.epochs)
+    model.save(args.output)
+    logger.info(
+        f"Router model trained on {len(examples)} queries saved to "
+        f"{args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Load test of /query on the Flask (app/main.py) and ASGI (app/asgi.py) apps.
+
+Both apps get the same fake backends: a router whose process() waits
+`--latency` seconds like a model call would, and an in-memory conversation
+store. The Flask app is driven from a pool of `--threads` threads, the
+request threads a WSGI server would have; the ASGI app is driven from one
+event loop with `--concurrency` requests in flight.
+
+    python benchmarks/bench_asgi.py [-n 2000] [--concurrency 200]
+        [--threads 32] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+
+class FakeRouter:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def process(self, query, params):
+        await asyncio.sleep(self.latency)
+        return {
+            "content": f"echo: {query}",
+            "model_used": "fake",
+            "task_type": "general",
+            "task_complexity": "low",
+        }
+
+    def tier_model_configs(self):
+        return []
+
+
+class FakeRAGSystem:
+    def add_blocks(self, blocks, doc_id, metadata=None, progress=None):
+        for _ in blocks:
+            pass
+
+
+class FakeRedisCache:
+    store = {}
+
+    @classmethod
+    def get(cls, key):
+        return cls.store.get(key)
+
+    @classmethod
+    def set(cls, key, value, expiration=3600):
+        cls.store[key] = value
+
+
+def install_fake_backends(latency):
+    """Replace the modules that connect to Redis/Pinecone on import."""
+    fakes = {
+        "app.python.helpers.redis_cache": {"RedisCache": FakeRedisCache},
+        "app.python.helpers.rag_system": {"RAGSystem": FakeRAGSystem},
+        "app.advanced_router": {
+            "AdvancedRouter": lambda config, agent, rag: FakeRouter(latency)
+        },
+    }
+    for name, attrs in fakes.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+def bench_flask(requests, threads):
+    with patch("app.bootstrap.download_nltk_data"), patch(
+        "app.bootstrap.create_agent"
+    ):
+        from app import main
+
+    client = main.app.test_client()
+
+    def send(i):
+        response = client.post(
+            "/query", json={"query": f"q{i}", "conversation_id": f"c{i}"}
+        )
+        assert response.status_code == 200, response.data
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(send, range(requests)))
+    return time.perf_counter() - start
+
+
+async def bench_asgi(requests, concurrency, latency):
+    from app.asgi import create_app
+
+    app = create_app(
+        router=FakeRouter(latency),
+        rag_system=FakeRAGSystem(),
+        manage_backends=False,
+    )
+    client = app.test_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i):
+        async with semaphore:
+            response = await client.post(
+                "/query", json={"query": f"q{i}", "conversation_id": f"c{i}"}
+            )
+            assert response.status_code == 200, await response.get_data()
+
+    async with app.test_app():
+        start = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    install_fake_backends(args.latency)
+
+    for name, elapsed in (
+        (
+            f"flask ({args.threads} threads)",
+            bench_flask(args.n, args.threads),
+        ),
+        (
+            f"asgi ({args.concurrency} in flight)",
+            asyncio.run(bench_asgi(args.n, args.concurrency, args.latency)),
+        ),
+    ):
+        print(
+            f"{name:<24} {args.n} requests in {elapsed:.2f}s "
+            f"({args.n / elapsed:.0f} req/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
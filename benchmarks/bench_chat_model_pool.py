@@ -0,0 +1,130 @@
+"""
+Benchmark pooled chat-model clients against creating a client per request.
+
+Runs a local OpenAI-compatible HTTP server that answers every chat
+completion instantly, so the measured time is client construction and
+connection setup. The server counts accepted TCP connections to show how
+many requests reused a keep-alive connection (recent langchain-openai
+releases share one HTTP pool per base URL, so there the saving is mostly
+client construction).
+
+    python benchmarks/bench_chat_model_pool.py [-n 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app import models  # noqa: E402
+
+MODEL = "gpt-4o-mini"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        body = json.dumps(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "ok"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 5,
+                    "completion_tokens": 1,
+                    "total_tokens": 6,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(get_model, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        await get_model().ainvoke("ping")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "sk-bench"
+
+    def fresh():
+        return models._create_chat_model(MODEL, "openai", 0.7, 256)
+
+    def pooled():
+        return models.get_chat_model(MODEL, 0.7, 256)
+
+    async def compare():
+        # One event loop for both runs: async HTTP clients are bound to it
+        results = {}
+        for name, get_model in (("per-request", fresh), ("pooled", pooled)):
+            # A fresh server per run so connection counts are comparable
+            server = start_server()
+            os.environ["OPENAI_BASE_URL"] = (
+                f"http://127.0.0.1:{server.server_address[1]}/v1"
+            )
+            models.clear_chat_model_pool()
+            elapsed = await run(get_model, args.n)
+            results[name] = (elapsed, server.connections)
+            server.shutdown()
+        return results
+
+    results = asyncio.run(compare())
+
+    print(f"requests:     {args.n}")
+    for name, (elapsed, connections) in results.items():
+        print(
+            f"{name:12}  {elapsed / args.n * 1000:.2f} ms/request, "
+            f"{connections} connections"
+        )
+    print(
+        "speedup:      "
+        f"{results['per-request'][0] / results['pooled'][0]:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
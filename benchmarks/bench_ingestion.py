@@ -0,0 +1,113 @@
+"""
+Benchmark document ingestion throughput in chunks per second.
+
+Chunks a generated document (or --file) with chunk_text and ingests it
+with fake embedding and upsert calls that cost a fixed latency per request
+plus a small cost per item, the way remote APIs do. Compares one embedding
+and one upsert request per chunk with ingest_chunks' batched, concurrent
+pipeline.
+
+    python benchmarks/bench_ingestion.py [--file doc.txt] [--words 200000]
+        [--request-latency 0.05] [--batch 64] [--concurrency 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app.python.helpers.chunked_ingestion import (  # noqa: E402
+    chunk_text,
+    ingest_chunks,
+)
+
+WORDS = (
+    "routing model latency token budget vector index embedding query "
+    "document page paragraph cache throughput worker queue batch stream"
+).split()
+
+
+def generate_document(words, seed=42):
+    rng = random.Random(seed)
+    sentences = [
+        " ".join(rng.choices(WORDS, k=rng.randint(8, 20))).capitalize() + "."
+        for _ in range(words // 14)
+    ]
+    paragraphs = []
+    while sentences:
+        count = rng.randint(3, 8)
+        paragraphs.append(" ".join(sentences[:count]))
+        del sentences[:count]
+    return "\n\n".join(paragraphs)
+
+
+class FakeBackend:
+    def __init__(self, request_latency, item_latency=0.0005):
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+
+    def embed(self, texts):
+        time.sleep(self.request_latency + self.item_latency * len(texts))
+        return [[0.0] * 8 for _ in texts]
+
+    def upsert(self, vectors):
+        time.sleep(self.request_latency + self.item_latency * len(vectors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file", type=str, default=None)
+    parser.add_argument("--words", type=int, default=200000)
+    parser.add_argument("--request-latency", type=float, default=0.05)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--upsert-batch", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = generate_document(args.words)
+
+    start = time.perf_counter()
+    chunks = list(chunk_text(text))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(text)} characters -> {len(chunks)} chunks "
+        f"({len(chunks) / elapsed:.0f} chunks/s chunking)"
+    )
+
+    backend = FakeBackend(args.request_latency)
+    sample = chunks[: max(len(chunks) // 10, 1)]
+    start = time.perf_counter()
+    for chunk in sample:
+        backend.upsert(
+            [{"id": str(chunk.index), "values": backend.embed([chunk.text])}]
+        )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'one request per chunk':<28} {len(sample) / elapsed:8.1f} chunks/s"
+        f" (sample of {len(sample)})"
+    )
+
+    start = time.perf_counter()
+    count = ingest_chunks(
+        chunks,
+        backend.embed,
+        backend.upsert,
+        "doc_bench",
+        embed_batch_size=args.batch,
+        embed_concurrency=args.concurrency,
+        upsert_batch_size=args.upsert_batch,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"{'ingest_chunks':<28} {count / elapsed:8.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark for KeywordClassifier.
+
+Times classification of a fixed query set while the keyword tables grow,
+alongside the old substring scan for comparison. The compiled classifier
+should stay flat; the substring scan grows linearly with the tables.
+
+    python benchmarks/bench_keyword_classifier.py
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app.python.helpers.keyword_classifier import (  # noqa: E402
+    DEFAULT_QUESTION_TYPE_RULES,
+    DEFAULT_TASK_TYPE_RULES,
+    KeywordClassifier,
+    KeywordRule,
+)
+
+QUERIES = [
+    "Hi there!",
+    "What is the capital of France?",
+    "Can you debug this Python function that keeps crashing on empty input?",
+    "Analyze the impact of artificial intelligence on job markets in the "
+    "next decade, comparing manufacturing and services.",
+    "Write a short story about a lighthouse keeper who discovers a map.",
+    "What are the latest news about the Mars mission today?",
+]
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+
+def grow_rules(base, extra_per_rule, rng):
+    return [
+        KeywordRule(
+            rule.label,
+            rule.keywords
+            + tuple(random_word(rng) for _ in range(extra_per_rule)),
+            rule.leading_only,
+        )
+        for rule in base
+    ]
+
+
+def substring_scan(rules, query_lower):
+    for rule in rules:
+        if any(word in query_lower for word in rule.keywords):
+            return rule.label
+    return None
+
+
+def main():
+    rng = random.Random(42)
+    queries = [query.lower() for query in QUERIES]
+    number = 2000
+
+    print(
+        f"{'keywords':>10} {'compiled us/query':>18} "
+        f"{'substring us/query':>19}"
+    )
+    for extra in (0, 10, 100, 1000):
+        task_rules = grow_rules(DEFAULT_TASK_TYPE_RULES, extra, rng)
+        question_rules = grow_rules(DEFAULT_QUESTION_TYPE_RULES, extra, rng)
+        classifier = KeywordClassifier(task_rules, question_rules)
+        keyword_count = sum(
+            len(rule.keywords) for rule in task_rules + question_rules
+        )
+
+        compiled = timeit.timeit(
+            lambda: [classifier.classify(query) for query in queries],
+            number=number,
+        )
+        scan = timeit.timeit(
+            lambda: [
+                (
+                    substring_scan(task_rules, query),
+                    substring_scan(question_rules, query),
+                )
+                for query in queries
+            ],
+            number=number // 10,
+        )
+
+        per_query = 1e6 / (number * len(queries))
+        per_query_scan = 1e6 / (number // 10 * len(queries))
+        print(
+            f"{keyword_count:>10} {compiled * per_query:>18.2f} "
+            f"{scan * per_query_scan:>19.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
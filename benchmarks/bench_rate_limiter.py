@@ -0,0 +1,65 @@
+"""
+Benchmark RateLimiter admission cost against the number of calls in the
+window.
+
+Fills the window with N calls, then times further admissions. The
+"summing" variant recomputes the window totals on every check the way the
+limiter used to, for comparison with the running totals.
+
+    python benchmarks/bench_rate_limiter.py [--sizes 100,1000,10000] [-n 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app.python.helpers.rate_limiter import RateLimiter  # noqa: E402
+
+
+class SummingRateLimiter(RateLimiter):
+    def _get_counts(self):
+        return (
+            len(self.call_records),
+            sum(record.input_tokens for record in self.call_records),
+            sum(record.output_tokens for record in self.call_records),
+        )
+
+
+def admission_time(limiter_class, window_size, admissions):
+    """Mean seconds per admission with `window_size` calls in the window."""
+    limiter = limiter_class(
+        max_calls=window_size + admissions + 1,
+        max_input_tokens=10**12,
+        max_output_tokens=10**12,
+        window_seconds=3600,
+    )
+    for _ in range(window_size):
+        record = limiter.limit_call_and_input(100)
+        limiter.release(50, record)
+
+    start = time.perf_counter()
+    for _ in range(admissions):
+        record = limiter.limit_call_and_input(100)
+        limiter.release(50, record)
+    return (time.perf_counter() - start) / admissions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=str, default="100,1000,10000")
+    parser.add_argument("-n", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'calls in window':>16} {'running totals':>16} {'summing':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        running = admission_time(RateLimiter, size, args.n)
+        summing = admission_time(SummingRateLimiter, size, args.n)
+        print(f"{size:>16} {running * 1e6:>14.1f}us {summing * 1e6:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark AdvancedRouter.route_many against calling route() in a loop.
+
+Replays logged queries from a JSON lines file ({"query": ..., "history":
+[...]} per line) or, without one, a synthetic log with the repetition
+profile of our traffic.
+
+    python benchmarks/bench_route_many.py [--log queries.jsonl] [-n 100000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from unittest.mock import MagicMock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from app.advanced_router import AdvancedRouter  # noqa: E402
+from app.config import load_config  # noqa: E402
+
+WORDS = (
+    "analyze code the hi what is please explain compare 2024 function "
+    "quantum today news write hello python capital france debug latest "
+    "why how does market impact $x % error stack trace"
+).split()
+
+
+def synthetic_log(size, distinct=5000, seed=42):
+    rng = random.Random(seed)
+    queries = [
+        " ".join(rng.choices(WORDS, k=rng.randint(1, 40)))
+        for _ in range(distinct)
+    ]
+    histories = [
+        [
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": " ".join(rng.choices(WORDS, k=rng.randint(1, 30))),
+            }
+            for i in range(rng.randint(0, 10))
+        ]
+        for _ in range(distinct)
+    ]
+    # Some conversations carry a pasted document
+    for history in histories[: distinct // 20]:
+        history.append({"role": "user", "content": "lorem ipsum " * 400})
+    # Popular queries repeat, histories are per conversation
+    picks = [int(rng.paretovariate(1.2)) % distinct for _ in range(size)]
+    return (
+        [queries[p] for p in picks],
+        [histories[rng.randrange(distinct)] for _ in range(size)],
+    )
+
+
+def load_log(path, size):
+    queries, histories = [], []
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            queries.append(record["query"])
+            histories.append(record.get("history", []))
+            if len(queries) >= size:
+                break
+    return queries, histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--log", type=str, default=None)
+    parser.add_argument("-n", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.log:
+        queries, histories = load_log(args.log, args.n)
+    else:
+        queries, histories = synthetic_log(args.n)
+
+    router = AdvancedRouter(load_config(), MagicMock(), MagicMock())
+
+    start = time.perf_counter()
+    result = router.route_many(queries, histories)
+    batch_time = time.perf_counter() - start
+
+    async def route_loop():
+        for query, history in zip(queries, histories):
+            await router.route(query, history)
+
+    router.feature_cache.clear()
+    start = time.perf_counter()
+    asyncio.run(route_loop())
+    loop_time = time.perf_counter() - start
+
+    print(f"queries:        {len(queries)}")
+    print(f"route() loop:   {loop_time:.2f}s")
+    print(f"route_many():   {batch_time:.2f}s")
+    print(f"speedup:        {loop_time / batch_time:.1f}x")
+    print(f"tier histogram: {result['tier_histogram']}")
+
+
+if __name__ == "__main__":
+    main()